@@ -3,15 +3,18 @@ import shutil
 import asyncio
 import logging
 import uuid
+import json
+import time
 import random
+import numpy as np
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict
 
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, File, UploadFile, Query
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks, File, UploadFile, Query, Header, Response
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session, joinedload
-from sqlalchemy import or_, func, and_, desc
+from sqlalchemy import or_, func, and_, desc, text
 from pydantic import BaseModel 
 from fpdf import FPDF 
 
@@ -22,9 +25,17 @@ os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
 # Importy modułów wewnętrznych
 from . import models, schemas, database
 from .services.simulator import simulator
-from .services.ai_search import ai_search
 from .services.contract_parser import contract_parser
 from .services.anomaly_detector import anomaly_detector
+from .services.monte_carlo import what_if_engine, ForkedState, shutdown_pool
+from .services.scenarios import scenario_runner, ScenarioBranch
+from .services.model_retrainer import model_retrainer
+from .services.feature_store import feature_store, SCOPES as FEATURE_SCOPES
+from .services.health import start_warm_up, readiness
+from .services.product_search import ensure_fts, fts_ready, hybrid_search, encode_id_cursor, decode_id_cursor
+from .services.ai_search import ai_search
+from .services.predictions import get_predictions
+from .services.kpi_rollups import ensure_rollups, read_totals, growing_products, COST_ORDER_TYPES
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("ProcurementAPI")
@@ -42,6 +53,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 def get_db():
@@ -53,6 +65,12 @@ def get_db():
 @app.on_event("startup")
 async def startup_event():
     models.Base.metadata.create_all(bind=database.engine)
+    # Indeksy dodane do istniejących tabel (create_all tworzy je tylko razem z nową tabelą)
+    for table in models.Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=database.engine, checkfirst=True)
+    ensure_fts(database.engine)
+    ensure_rollups(database.engine)
     db = database.SessionLocal()
     try:
         # --- NOWOŚĆ: SANACJA BAZY (Sprzątanie Ghost Deliveries) ---
@@ -69,12 +87,10 @@ async def startup_event():
         if stale_orders:
             logger.info(f"✅ [SYSTEM] Oczyszczono {len(stale_orders)} rekordów z przeszłości.")
 
-        logger.info("🧠 [SYSTEM] Inicjalizacja modułów AI...")
-        products = db.query(models.Product).all()
-        if products: 
-            ai_search.index_products(products)
-        
-        asyncio.create_task(simulator.run_simulation_loop())
+        # Modele AI ładowane w tle - endpointy bez AI działają od razu (stan: /health/ready)
+        start_warm_up()
+        simulator.start()
+        model_retrainer.start()
         logger.info("✅ [SYSTEM] Startup zakończony pomyślnie. Symulator JIT w gotowości!")
     except Exception as e:
         logger.error(f"❌ [CRITICAL] Błąd startupu: {e}")
@@ -82,6 +98,22 @@ async def startup_event():
     finally:
         db.close()
 
+@app.on_event("shutdown")
+def shutdown_event():
+    simulator.stop()
+    model_retrainer.stop()
+    shutdown_pool()
+
+# --- HEALTH CHECK ---
+@app.get("/health/live")
+def health_live():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def health_ready():
+    report = readiness(simulator)
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
 # --- GENERATOR DOKUMENTACJI PDF ---
 class PDFOrderReport(FPDF):
     def header(self):
@@ -113,24 +145,89 @@ class PDFOrderReport(FPDF):
             self.cell(0, 8, str(row[1]), 0, 1)
 
 # --- ENDPOINTY: PRODUKTY ---
-@app.get("/products", response_model=List[schemas.Product])
-def read_products(skip: int = 0, limit: int = 100, search: Optional[str] = None, category: Optional[str] = None, db: Session = Depends(get_db)):
-    query = db.query(models.Product)
-    if search: query = query.filter(models.Product.name.ilike(f"%{search}%"))
-    if category: query = query.filter(models.Product.category == category)
-    raw_products = query.offset(skip).limit(limit).all()
+def with_active_contracts(db: Session, products: list) -> list:
+    """
+    Schematy produktów z aktywnymi kontraktami: jedno zapytanie o kontrakty całej strony
+    (z dostawcami w JOIN) i składanie w pamięci - zamiast zapytania per produkt i per dostawca.
+    """
+    by_product = {}
+    if products:
+        contracts = db.query(models.Contract).options(joinedload(models.Contract.supplier)).filter(
+            models.Contract.product_id.in_([p.id for p in products]), models.Contract.is_active == True
+        ).order_by(models.Contract.id).all()
+        for c in contracts:
+            by_product.setdefault(c.product_id, []).append(schemas.ContractInfo(
+                id=c.id, supplier_name=c.supplier.name if c.supplier else "Nieznany", price=c.price,
+                valid_until=c.end_date, payment_terms_days=c.payment_terms_days))
 
     final_results = []
-    for prod in raw_products:
+    for prod in products:
         p_schema = schemas.Product.model_validate(prod)
-        contracts = db.query(models.Contract).filter(and_(models.Contract.product_id == prod.id, models.Contract.is_active == True)).all()
-        p_schema.active_contracts = [
-            schemas.ContractInfo(id=c.id, supplier_name=c.supplier.name if c.supplier else "Nieznany", price=c.price, valid_until=c.end_date, payment_terms_days=c.payment_terms_days)
-            for c in contracts
-        ]
+        p_schema.active_contracts = by_product.get(prod.id, [])
         final_results.append(p_schema)
     return final_results
 
+@app.get("/products", response_model=List[schemas.Product])
+def read_products(response: Response, skip: int = Query(0, deprecated=True), limit: int = Query(100, ge=1), search: Optional[str] = None,
+                  category: Optional[str] = None, cursor: Optional[str] = None, db: Session = Depends(get_db)):
+    # Kolejna strona: nagłówek X-Next-Cursor (keyset - koszt strony nie rośnie z jej numerem)
+    query = db.query(models.Product).options(joinedload(models.Product.supplier))
+    if search and search.strip() and fts_ready():
+        # Wyszukiwanie hybrydowe: BM25 (FTS5) + semantyka, ranking RRF
+        try:
+            page_ids, next_cursor = hybrid_search(db, search, limit, cursor=cursor, category=category)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        by_id = {p.id: p for p in query.filter(models.Product.id.in_(page_ids))}
+        raw_products = [by_id[pid] for pid in page_ids if pid in by_id]
+    else:
+        if search: query = query.filter(models.Product.name.ilike(f"%{search}%"))
+        if category: query = query.filter(models.Product.category == category)
+        query = query.order_by(models.Product.id)
+        if cursor:
+            try:
+                query = query.filter(models.Product.id > decode_id_cursor(cursor))
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        elif skip:
+            query = query.offset(skip)   # zgodność wsteczna; nowi klienci stronicują kursorem
+        # limit + 1: czy istnieje następna strona, bez osobnego COUNT
+        raw_products = query.limit(limit + 1).all()
+        next_cursor = encode_id_cursor(raw_products[limit - 1].id) if len(raw_products) > limit else None
+        raw_products = raw_products[:limit]
+
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return with_active_contracts(db, raw_products)
+
+# Zapisy produktów aktualizują indeks semantyczny po commicie (hook sesji w ai_search)
+@app.post("/products", response_model=schemas.Product)
+def create_product(product_in: schemas.ProductCreate, db: Session = Depends(get_db)):
+    product = models.Product(**product_in.model_dump(exclude={"min_stock_level"}))
+    db.add(product)
+    db.commit()
+    db.refresh(product)
+    return product
+
+@app.put("/products/{product_id}", response_model=schemas.Product)
+def update_product(product_id: int, product_in: schemas.ProductBase, db: Session = Depends(get_db)):
+    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    if not product: raise HTTPException(404, detail="Produkt nie istnieje")
+    for field, value in product_in.model_dump(exclude={"min_stock_level"}, exclude_unset=True).items():
+        setattr(product, field, value)
+    db.commit()
+    db.refresh(product)
+    return product
+
+@app.get("/products/{product_id}/alternatives", response_model=List[schemas.Product])
+def get_product_alternatives(product_id: int, top_k: int = Query(3, ge=1, le=50), db: Session = Depends(get_db)):
+    # Zamienniki z grafu sąsiedztwa (liczony przy indeksowaniu) - bez kodowania zapytania
+    product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    if not product: raise HTTPException(404, detail="Produkt nie istnieje")
+    alt_ids = [e.id for e in ai_search.find_alternatives(product.name, product.category, top_k=top_k, product_id=product.id)]
+    by_id = {p.id: p for p in db.query(models.Product).options(joinedload(models.Product.supplier)).filter(models.Product.id.in_(alt_ids))}
+    return with_active_contracts(db, [by_id[pid] for pid in alt_ids if pid in by_id])
+
 # --- ENDPOINTY: ZAMÓWIENIA I DECYZJE ---
 @app.post("/orders", response_model=schemas.Order)
 def create_order(order_in: schemas.OrderCreate, db: Session = Depends(get_db)):
@@ -141,7 +238,7 @@ def create_order(order_in: schemas.OrderCreate, db: Session = Depends(get_db)):
     final_price = best_contract.price if best_contract else p.unit_cost
     total_value = final_price * order_in.quantity
 
-    is_anomaly = anomaly_detector.is_anomaly(float(order_in.quantity), float(total_value), float(best_contract.price) if best_contract else None)
+    is_anomaly = anomaly_detector.is_anomaly(float(order_in.quantity), float(total_value), float(best_contract.price) if best_contract else None, product_id=p.id)
     order_status = "pending_approval" if is_anomaly or total_value > 15000 else "ordered"
 
     new_order = models.Order(
@@ -162,9 +259,59 @@ def create_order(order_in: schemas.OrderCreate, db: Session = Depends(get_db)):
         pass
 
     db.add(new_order)
-    db.commit(); db.refresh(new_order)
+    feature_store.record(db, [{"product_id": new_order.product_id, "supplier_id": new_order.supplier_id,
+                               "quantity": new_order.quantity, "total_price": new_order.total_price}])
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        feature_store.invalidate()
+        raise
+    db.refresh(new_order)
+    simulator.track_order(new_order)
     return new_order
 
+@app.post("/orders/score", response_model=schemas.OrderScoreResult)
+def score_orders(req: schemas.OrderScoreRequest, db: Session = Depends(get_db)):
+    # Audyt wsadowy: jedna macierz cech i jedno wywołanie modelu dla całej paczki
+    started = time.perf_counter()
+    lines = req.lines
+    if any(l.total_price is None and l.unit_price is None for l in lines):
+        raise HTTPException(status_code=422, detail="Każda pozycja wymaga total_price lub unit_price")
+
+    # Ceny kontraktowe: jedno zapytanie grupujące dla wszystkich produktów bez podanej ceny
+    product_ids = {l.product_id for l in lines if l.contract_price is None and l.product_id is not None}
+    contract_prices = {}
+    if product_ids:
+        contract_prices = dict(db.query(models.Contract.product_id, func.min(models.Contract.price)).filter(
+            models.Contract.product_id.in_(product_ids), models.Contract.is_active == True
+        ).group_by(models.Contract.product_id).all())
+
+    quantity = np.fromiter((l.quantity for l in lines), dtype=float, count=len(lines))
+    total_price = np.fromiter((l.total_price if l.total_price is not None else l.unit_price * l.quantity for l in lines),
+                              dtype=float, count=len(lines))
+    contract_price = np.fromiter((l.contract_price if l.contract_price is not None else contract_prices.get(l.product_id, np.nan)
+                                  for l in lines), dtype=float, count=len(lines))
+
+    scored = anomaly_detector.score_batch(quantity, total_price, contract_price, [l.product_id for l in lines])
+    scores = np.round(scored["score"], 6)
+    unit_prices = np.round(scored["unit_price"], 4)
+    product_z = np.round(scored["product_z"], 3)
+    results = [
+        schemas.OrderScore(line=i, is_anomaly=flag, score=None if score != score else score, rule=rule, unit_price=up,
+                           product_z_quantity=zq, product_z_unit_price=zup)
+        for i, (flag, score, rule, up, (zq, zup)) in enumerate(zip(scored["is_anomaly"].tolist(), scores.tolist(),
+                                                                   scored["rule"].tolist(), unit_prices.tolist(),
+                                                                   product_z.tolist()))
+    ]
+    return schemas.OrderScoreResult(
+        count=len(results),
+        anomalies=int(scored["is_anomaly"].sum()),
+        model_trained=anomaly_detector.is_trained,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 1),
+        results=results,
+    )
+
 @app.get("/orders", response_model=List[schemas.Order])
 def read_orders(status: Optional[str] = None, db: Session = Depends(get_db)):
     query = db.query(models.Order).options(joinedload(models.Order.product), joinedload(models.Order.supplier))
@@ -177,6 +324,7 @@ def approve_order(order_id: str, db: Session = Depends(get_db)):
     if not order: raise HTTPException(404)
     order.status = "ordered"
     db.commit()
+    simulator.track_order(order)
     return {"status": "success"}
 
 @app.put("/orders/{order_id}/reject")
@@ -185,29 +333,37 @@ def reject_order(order_id: str, db: Session = Depends(get_db)):
     if not order: raise HTTPException(404)
     order.status = "cancelled"
     db.commit()
+    simulator.untrack_order(order.id)
     return {"status": "success"}
 
 # --- DASHBOARD & SMART WALLET ---
 @app.get("/analytics/dashboard")
 def get_dashboard_data(db: Session = Depends(get_db)):
-    all_orders = db.query(models.Order).options(joinedload(models.Order.product)).all()
-    
+    # Portfel, bezpieczeństwo i statystyki zakupów z tabeli agregatów (kpi_rollups) - bez ładowania historii
+    kpi = read_totals(db)
+
     total_budget = 1000000.0 
-    spent = sum(o.total_price for o in all_orders if o.status == "delivered")
-    committed = sum(o.total_price for o in all_orders if o.status in ["ordered", "pending_approval"])
-    blocked_orders = [o for o in all_orders if o.status == "pending_approval"]
-    blocked_val = sum(o.total_price for o in blocked_orders)
+    spent = kpi.total("status", "delivered")
+    committed = kpi.total("status", "ordered", "pending_approval")
+    blocked_val = kpi.total("status", "pending_approval")
+    blocked_count = kpi.count("status", "pending_approval")
+    orders_count = kpi.count("status", *kpi.keys("status"))
 
-    emergency_orders = [o for o in all_orders if getattr(o, 'order_type', '') == "EMERGENCY"]
-    emergency_premium = sum(o.total_price - (o.total_price / 1.5) for o in emergency_orders)
+    emergency_total = kpi.total("order_type", "EMERGENCY")
+    emergency_premium = emergency_total - (emergency_total / 1.5)
 
-    cost_opt = len([o for o in all_orders if getattr(o, 'order_type', 'KOSZT/JIT') in ["KOSZT", "KOSZT/JIT"] or o.order_type is None])
-    time_opt = len(emergency_orders)
+    cost_opt = kpi.count("order_type", *COST_ORDER_TYPES)
+    time_opt = kpi.count("order_type", "EMERGENCY")
 
-    prods = db.query(models.Product).all()
-    inventory_val = sum(p.current_stock * p.unit_cost for p in prods)
-    
-    low_stock = sum(1 for p in prods if (p.current_stock / max(p.average_daily_consumption or 0.5, 0.5)) <= max(1.5, (p.lead_time_days or 7) * 0.3))
+    inventory_val = kpi.total("inventory", "value")
+    low_stock = kpi.count("inventory", "low_stock")
+
+    # Interwencje: tylko 10 najnowszych z każdej grupy (remisy dat - kolejność zapisu, jak w historii)
+    def latest(condition):
+        return db.query(models.Order).options(joinedload(models.Order.product)).filter(condition).order_by(
+            models.Order.created_at.desc(), text("orders.rowid")).limit(10).all()
+    emergency_orders = latest(models.Order.order_type == "EMERGENCY")
+    blocked_orders = latest(models.Order.status == "pending_approval")
 
     interventions = []
     
@@ -270,21 +426,21 @@ def get_dashboard_data(db: Session = Depends(get_db)):
     recent_date = sim_date - timedelta(days=30)
     past_date = sim_date - timedelta(days=60)
 
-    for p in prods:
-        recent_vol = sum(o.quantity for o in all_orders if o.product_id == p.id and o.created_at and o.created_at >= recent_date)
-        past_vol = sum(o.quantity for o in all_orders if o.product_id == p.id and o.created_at and past_date <= o.created_at < recent_date)
-        
-        if past_vol > 50 and recent_vol > (past_vol * 1.15):
-            growth = int(((recent_vol / past_vol) - 1) * 100)
-            negotiations.append({
-                "product_name": p.name,
-                "growth_percent": growth,
-                "recent_volume": int(recent_vol),
-                "suggestion": f"Zidentyfikowano stały {growth}% wzrost konsumpcji w ujęciu 30-dniowym. System rekomenduje zawarcie stałego kontraktu kwartalnego w celu stabilizacji kosztów."
-            })
+    # Wolumeny 30/60 dni: suma okien po dziennych agregatach per produkt (product_daily_volume)
+    volumes = growing_products(db, recent_date, past_date, min_past=50, growth=1.15)
+
+    for name, recent_vol, past_vol in volumes:
+        growth = int(((recent_vol / past_vol) - 1) * 100)
+        negotiations.append({
+            "product_name": name,
+            "growth_percent": growth,
+            "recent_volume": int(recent_vol),
+            "suggestion": f"Zidentyfikowano stały {growth}% wzrost konsumpcji w ujęciu 30-dniowym. System rekomenduje zawarcie stałego kontraktu kwartalnego w celu stabilizacji kosztów."
+        })
     
-    if not negotiations and len(prods) > 0:
-        top_prod = max(prods, key=lambda x: x.average_daily_consumption or 0)
+    top_prod = None if negotiations else db.query(models.Product).order_by(
+        func.coalesce(models.Product.average_daily_consumption, 0).desc(), models.Product.id).first()
+    if top_prod is not None:
         if (top_prod.average_daily_consumption or 0) > 0.5:
             negotiations.append({
                 "product_name": top_prod.name,
@@ -309,75 +465,29 @@ def get_dashboard_data(db: Session = Depends(get_db)):
         "security": {
             "approved_value": round(spent + committed, 2),
             "blocked_value": round(blocked_val, 2),
-            "fraud_rate": round((len(blocked_orders) / len(all_orders) * 100), 1) if all_orders else 0
+            "fraud_rate": round((blocked_count / orders_count * 100), 1) if orders_count else 0
         },
         "sourcing_stats": [
             {"name": "Optymalizacja Kosztów", "value": cost_opt},
             {"name": "Zarządzanie Ryzykiem", "value": time_opt}
         ],
-        "inventory": sorted([{"name": p.name, "value": round(p.current_stock * p.unit_cost, 2)} for p in prods if p.current_stock > 0], key=lambda x: x["value"], reverse=True)[:5],
+        "inventory": [{"name": name, "value": round(value, 2)} for name, value in db.query(
+            models.Product.name, models.Product.current_stock * models.Product.unit_cost
+        ).filter(models.Product.current_stock > 0).order_by(
+            func.round(models.Product.current_stock * models.Product.unit_cost, 2).desc(), models.Product.id
+        ).limit(5)],
         
         "ai_interventions": [{k: v for k, v in i.items() if k != "raw_date"} for i in interventions[:10]],
-        "emergency_count": len(emergency_orders),
+        "emergency_count": time_opt,
         "emergency_premium_cost": round(emergency_premium, 2),
         "ai_negotiations": negotiations[:3]
     }
 
 # --- MRP & PREDICTIONS (DYNAMICZNE PROGI AI) ---
 @app.get("/analytics/predictions") 
-def get_ai_predictions(limit: int = 100, db: Session = Depends(get_db)):
-    products = db.query(models.Product).all()
-    results = []
-    active_orders = db.query(models.Order).filter(
-        models.Order.status.in_(["ordered", "pending_approval"])
-    ).all()
-
-    for p in products:
-        burn_rate = max(p.average_daily_consumption or 0.5, 0.5)
-        days_left = round(p.current_stock / burn_rate, 1)
-        
-        product_orders = [o for o in active_orders if o.product_id == p.id]
-        incoming_qty = sum(o.quantity for o in product_orders)
-        
-        # --- AKTUALIZACJA: WYCIĄGANIE DNI OPÓŹNIENIA ---
-        next_delivery = None
-        delay_days = 0
-        if product_orders:
-            # Szukamy najwcześniejszej nadchodzącej dostawy
-            earliest_order = min(product_orders, key=lambda o: o.estimated_delivery if o.estimated_delivery else datetime.max)
-            if earliest_order.estimated_delivery:
-                next_delivery = earliest_order.estimated_delivery.strftime("%Y-%m-%d")
-                delay_days = getattr(earliest_order, 'delay_days', 0)
-
-        lead_time = p.lead_time_days or 7
-        
-        dynamic_safety_buffer = lead_time * 0.5  
-        warning_threshold = lead_time + dynamic_safety_buffer
-        emergency_threshold = max(1.5, lead_time * 0.3) 
-
-        status = "safe"
-        
-        if days_left <= lead_time:
-            status = "critical" if incoming_qty == 0 else "incoming"
-        elif days_left <= warning_threshold:
-            status = "warning"
-
-        results.append({
-            "id": p.id, 
-            "product_name": p.name, 
-            "current_stock": int(p.current_stock),
-            "burn_rate": round(burn_rate, 2), 
-            "days_left": days_left,
-            "status": status,
-            "restock_recommended": (days_left <= warning_threshold and incoming_qty == 0),
-            "incoming_stock": int(incoming_qty),
-            "next_delivery_date": next_delivery,
-            "delay_days": delay_days, # Przesyłamy pole do frontendu
-            "ai_supplier_advice": "Tryb Express" if days_left <= emergency_threshold else "Optymalny koszt"
-        })
-    
-    results.sort(key=lambda x: x['days_left'] if isinstance(x['days_left'], float) else 9999)
-    return results[:limit]
+def get_ai_predictions(limit: int = Query(100, ge=1), db: Session = Depends(get_db)):
+    # Liczone raz na wersję danych (tick symulatora / zapis z API) - kolejne odpytania z cache
+    return get_predictions(db, limit)
 
 @app.get("/analytics/history")
 def get_analytics_history(db: Session = Depends(get_db)):
@@ -395,17 +505,64 @@ def get_analytics_history(db: Session = Depends(get_db)):
         return []
 
 @app.get("/analytics/what-if")
-def simulation_what_if(delay_days: int = 0, demand_spike: float = 0.0):
-    days = []
-    base_stock = 100
-    for i in range(1, 15):
-        consumption = 8 * (1.0 + demand_spike/100)
-        delivery = 50 if (i == 7 + delay_days) else 0
-        stock_val = max(0, int(base_stock - (i * consumption) + delivery))
-        baseline_val = max(0, int(base_stock - (i * 8) + (50 if i == 7 else 0)))
-        
-        days.append({"day": f"Dzień {i}", "stock": stock_val, "baseline": baseline_val})
-    return days
+def simulation_what_if(
+    delay_days: int = Query(0, ge=0, le=60),
+    demand_spike: float = Query(0.0, ge=-90, le=500),
+    replications: int = Query(1000, ge=100, le=20000),
+    horizon: int = Query(14, ge=1, le=120),
+    db: Session = Depends(get_db)
+):
+    # Rozwidlenie bieżącego stanu bliźniaka i replikacje Monte Carlo (P5/P50/P95)
+    state = ForkedState.from_db(db, simulator.current_date)
+    if not len(state):
+        return {"days": [], "products": [], "summary": {"replications": 0, "horizon_days": horizon}}
+    return what_if_engine.run(state, delay_days=delay_days, demand_spike=demand_spike, replications=replications, horizon=horizon)
+
+# --- ENDPOINTY: WERSJE MODELU ANOMALII ---
+@app.get("/ai/models", response_model=schemas.ModelStatus)
+def get_model_versions():
+    return model_retrainer.status()
+
+@app.post("/ai/models/retrain", status_code=202, response_model=schemas.ModelStatus)
+def retrain_model():
+    # Trening w osobnym procesie - odpowiedź natychmiast, podmiana po zakończeniu
+    if not model_retrainer.trigger("manual"):
+        raise HTTPException(status_code=409, detail="Retrening już trwa")
+    return model_retrainer.status()
+
+@app.post("/ai/models/rollback", response_model=schemas.ModelStatus)
+def rollback_model():
+    try:
+        anomaly_detector.rollback()
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return model_retrainer.status()
+
+@app.post("/ai/models/{version}/activate", response_model=schemas.ModelStatus)
+def activate_model(version: int):
+    try:
+        # Wybór operatora - retrening w tle nie podmieni tej wersji automatycznie
+        anomaly_detector.activate(version, pinned=True)
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(status_code=404, detail=f"Brak wersji modelu: {version}")
+    return model_retrainer.status()
+
+@app.get("/ai/alternatives")
+def get_alternatives_map(product_ids: Optional[List[int]] = Query(None), top_k: int = Query(3, ge=1, le=50)):
+    # Zamienniki hurtowo (domyślnie cały katalog): id produktu -> [(id zamiennika, podobieństwo)]
+    alternatives = ai_search.alternatives_map(product_ids, top_k)
+    return {pid: [{"id": e.id, "score": round(score, 4)} for e, score in alts] for pid, alts in alternatives.items()}
+
+@app.get("/ai/features/{scope}")
+def get_feature_stats(scope: str, key: Optional[int] = None):
+    # Statystyki magazynu cech (per produkt / dostawca) - bez skanowania tabeli orders
+    if scope not in FEATURE_SCOPES:
+        raise HTTPException(status_code=404, detail=f"Nieznany zakres: {scope}")
+    if key is not None:
+        stats = feature_store.get(scope, key)
+        if stats is None: raise HTTPException(404)
+        return {key: stats}
+    return feature_store.all(scope)
 
 @app.get("/orders/{order_id}/pdf")
 async def download_order_pdf(order_id: str, db: Session = Depends(get_db)):
@@ -427,13 +584,80 @@ async def upload_contract_ai(file: UploadFile = File(...), db: Session = Depends
 
 @app.get("/simulation/status", response_model=schemas.SimulationStatus)
 def get_sim_info():
-    status = simulator.get_status()
-    return schemas.SimulationStatus(current_date=status["current_date"], is_running=status["is_running"], events=status["events"])
+    return schemas.SimulationStatus(**simulator.get_status())
+
+@app.get("/simulation/stream")
+async def stream_sim_events(last_event_id: Optional[int] = Header(None), since: Optional[int] = Query(None, ge=0)):
+    """
+    Strumień SSE: zdarzenia symulatora, punkty KPI każdego ticku i zmiany statusu.
+    Wznowienie od nagłówka Last-Event-ID (lub ?since=); bez kursora - tylko nowe wpisy.
+    Gdy kursor wypadł z bufora, klient dostaje `reset` i powinien pobrać /simulation/status.
+    """
+    cursor = last_event_id if last_event_id is not None else since
+    if cursor is None:
+        cursor = simulator.event_log.last_id
+
+    async def event_stream():
+        nonlocal cursor
+        yield "retry: 3000\n\n"
+        while True:
+            entries, gap = simulator.event_log.since(cursor)
+            if gap:
+                yield f"event: reset\ndata: {json.dumps({'last_event_id': simulator.event_log.last_id})}\n\n"
+                # Kursor z poprzedniego uruchomienia (nowszy niż dziennik) - dalej od bieżącej numeracji
+                cursor = min(cursor, entries[0]["id"] - 1 if entries else simulator.event_log.last_id)
+            for entry in entries:
+                cursor = entry["id"]
+                yield f"id: {entry['id']}\nevent: {entry['kind']}\ndata: {json.dumps(entry['data'], ensure_ascii=False)}\n\n"
+            if not await simulator.event_log.wait(cursor, timeout=15):
+                yield ": ping\n\n"
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/simulation/profile", response_model=schemas.TickProfile)
+def get_sim_profile():
+    # Kroczące histogramy faz ticku (czas, zapytania SQL, wiersze) + rozbicie ostatniego ticku
+    return simulator.profiler.report()
+
+@app.post("/simulation/fast-forward", response_model=schemas.FastForwardResult)
+def fast_forward_sim(days: int = Query(30, ge=1, le=3650), db: Session = Depends(get_db)):
+    start_date = simulator.current_date.strftime("%Y-%m-%d")
+    trajectory = simulator.fast_forward(db, days)
+    return schemas.FastForwardResult(start_date=start_date, end_date=simulator.current_date.strftime("%Y-%m-%d"), days=days, trajectory=trajectory)
 
 @app.post("/simulation/toggle")
 async def control_sim():
-    simulator.is_running = not simulator.is_running
-    return {"status": "success", "current_state": "uruchomiona" if simulator.is_running else "zatrzymana"}
+    is_running = await asyncio.wait_for(asyncio.wrap_future(simulator.control("toggle")), timeout=5)
+    return {"status": "success", "current_state": "uruchomiona" if is_running else "zatrzymana"}
+
+@app.post("/simulation/tick-rate")
+async def set_tick_rate(seconds: float = Query(..., gt=0, le=60)):
+    interval = await asyncio.wait_for(asyncio.wrap_future(simulator.control("tick_interval", seconds)), timeout=5)
+    return {"status": "success", "tick_interval": interval}
+
+@app.post("/simulation/snapshot", response_model=schemas.SnapshotInfo)
+def save_sim_snapshot(db: Session = Depends(get_db)):
+    snapshot = simulator.save_snapshot(db)
+    return schemas.SnapshotInfo(**snapshot.info())
+
+@app.get("/simulation/snapshots", response_model=List[schemas.SnapshotInfo])
+def list_sim_snapshots():
+    return [schemas.SnapshotInfo(**info) for info in simulator.snapshots.list()]
+
+@app.post("/simulation/scenarios", response_model=schemas.ScenarioComparison)
+def run_sim_scenarios(req: schemas.ScenarioRequest, stream: bool = False, db: Session = Depends(get_db)):
+    # Gałęzie startują z migawki bieżącego stanu - działają w pamięci, bez zapisu do bazy
+    if len({b.name for b in req.branches}) != len(req.branches):
+        raise HTTPException(status_code=400, detail="Nazwy gałęzi muszą być unikalne")
+    snapshot = simulator.fork(db)
+    branches = [ScenarioBranch(b.name, b.rop_multiplier, b.emergency_threshold) for b in req.branches]
+    if stream:
+        # NDJSON: jedna linia na gałąź, w kolejności ukończenia
+        lines = (schemas.ScenarioBranchResult(**r).model_dump_json() + "\n"
+                 for r in scenario_runner.iter_results(snapshot, branches, req.days, req.seed))
+        return StreamingResponse(lines, media_type="application/x-ndjson")
+    return scenario_runner.run(snapshot, branches, req.days, req.seed)
 
 class UserMessage(BaseModel): message: str
 @app.post("/assistant/chat")
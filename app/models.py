@@ -50,7 +50,7 @@ class Contract(Base):
     __tablename__ = "contracts"
 
     id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey("products.id"))
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     supplier_id = Column(Integer, ForeignKey("suppliers.id"))
     
     price = Column(Float)
@@ -91,4 +91,37 @@ class DailyStats(Base):
     id = Column(Integer, primary_key=True, index=True)
     date = Column(Date, index=True)
     total_inventory_value = Column(Float)
-    total_orders_count = Column(Integer)
\ No newline at end of file
+    total_orders_count = Column(Integer)
+
+class OrderFeatureStat(Base):
+    """Bieżące statystyki zamówień (Welford) per produkt / dostawca - magazyn cech detektora."""
+    __tablename__ = "order_feature_stats"
+
+    scope = Column(String, primary_key=True)   # "product" | "supplier"
+    key = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0)
+    mean_quantity = Column(Float, default=0.0)
+    m2_quantity = Column(Float, default=0.0)
+    mean_unit_price = Column(Float, default=0.0)
+    m2_unit_price = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class KpiRollup(Base):
+    """Agregaty KPI dashboardu: (metryka, klucz) -> liczba, suma (w 1/10000 PLN). Utrzymywane przyrostowo (kpi_rollups)."""
+    __tablename__ = "kpi_rollups"
+
+    metric = Column(String, primary_key=True)   # "status" | "order_type" | "inventory"
+    key = Column(String, primary_key=True)
+    count = Column(Integer, default=0)
+    total = Column(Integer, default=0)
+
+class ProductDailyVolume(Base):
+    """Dzienny wolumen zamówień per produkt (okna trendów bez skanowania `orders`)."""
+    __tablename__ = "product_daily_volume"
+    # Klucz (produkt, dzień) jest zarazem układem tabeli - sumy okien czytają ją sekwencyjnie
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    product_id = Column(Integer, primary_key=True)
+    day = Column(Date, primary_key=True)
+    quantity = Column(Integer, default=0)
+    orders = Column(Integer, default=0)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional, Any
+from typing import List, Optional, Any, Dict
 from datetime import datetime
 
 # --- MODELE POMOCNICZE (CONTRACT INFO) ---
@@ -73,6 +73,33 @@ class OrderBase(BaseModel):
 class OrderCreate(OrderBase):
     pass
 
+# Audyt wsadowy pozycji zakupowych (POST /orders/score)
+class OrderScoreLine(BaseModel):
+    quantity: float = Field(..., gt=0)
+    total_price: Optional[float] = None
+    unit_price: Optional[float] = None
+    product_id: Optional[int] = None
+    contract_price: Optional[float] = None  # brak = najtańszy aktywny kontrakt produktu
+
+class OrderScoreRequest(BaseModel):
+    lines: List[OrderScoreLine] = Field(..., min_length=1, max_length=100000)
+
+class OrderScore(BaseModel):
+    line: int
+    is_anomaly: bool
+    score: Optional[float] = None
+    rule: Optional[str] = None  # "contract_overpricing" | "statistical_outlier"
+    unit_price: float
+    product_z_quantity: float = 0.0
+    product_z_unit_price: float = 0.0
+
+class OrderScoreResult(BaseModel):
+    count: int
+    anomalies: int
+    model_trained: bool
+    elapsed_ms: float
+    results: List[OrderScore] = []
+
 class Order(OrderBase):
     id: str # String (np. "ORD-123")
     created_at: datetime
@@ -129,10 +156,109 @@ class SimulationEvent(BaseModel):
     type: str
     icon: str
 
+class TickMetrics(BaseModel):
+    ticks: int = 0
+    last_tick_ms: float = 0.0
+    avg_tick_ms: float = 0.0
+    max_tick_ms: float = 0.0
+    lag_ms: float = 0.0
+
+class PhaseProfile(BaseModel):
+    count: int
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    sql_statements_avg: float
+    rows_avg: float
+    histogram: Dict[str, int] = {}
+
+class TickProfile(BaseModel):
+    window: int
+    phases: Dict[str, PhaseProfile] = {}
+    last_tick: Optional[Dict[str, Any]] = None
+
 class SimulationStatus(BaseModel):
     current_date: str
     is_running: bool
     events: List[SimulationEvent] = []
+    last_event_id: int = 0
+    worker_alive: bool = False
+    tick_interval: Optional[float] = None
+    metrics: Optional[TickMetrics] = None
+
+class TrajectoryPoint(BaseModel):
+    date: str
+    inventory_value: float
+    consumption: int
+    stockouts: int
+    emergency_premium: float = 0.0
+    deliveries: int
+    delays: int
+    orders_created: int
+    emergency_orders: int
+    blocked_orders: int
+
+class FastForwardResult(BaseModel):
+    start_date: str
+    end_date: str
+    days: int
+    trajectory: List[TrajectoryPoint] = []
+
+class SnapshotInfo(BaseModel):
+    tick: int
+    current_date: str
+    created_at: str
+    products: int
+    in_transit: int
+    file: Optional[str] = None
+
+class ScenarioBranchSpec(BaseModel):
+    name: str = Field(..., min_length=1, max_length=60)
+    rop_multiplier: float = Field(1.3, ge=0, le=10)
+    emergency_threshold: float = Field(1.2, ge=0, le=30)
+
+class ScenarioRequest(BaseModel):
+    days: int = Field(30, ge=1, le=730)
+    branches: List[ScenarioBranchSpec] = Field(..., min_length=1, max_length=8)
+    seed: Optional[int] = None
+
+class ScenarioTotals(BaseModel):
+    stockouts: int
+    emergency_premium: float
+    emergency_orders: int
+    avg_inventory_value: float
+    end_inventory_value: float
+
+class ScenarioBranchResult(BaseModel):
+    name: str
+    params: Dict[str, float]
+    series: List[TrajectoryPoint] = []
+    totals: ScenarioTotals
+    elapsed_ms: float
+
+class ScenarioComparison(BaseModel):
+    start_date: str
+    days: int
+    branches: List[ScenarioBranchResult] = []
+
+# --- WERSJE MODELU ANOMALII ---
+class ModelVersionInfo(BaseModel):
+    version: int
+    trained_at: Optional[str] = None
+    training_rows: Optional[int] = None
+    trigger: Optional[str] = None
+    active: bool = False
+
+class ModelStatus(BaseModel):
+    active_version: Optional[int] = None
+    compiled_evaluator: bool = False
+    pinned: bool = False
+    training: bool = False
+    last_trained_at: Optional[str] = None
+    last_error: Optional[str] = None
+    versions: List[ModelVersionInfo] = []
 
 # --- MODELE PREDYKCJI (AI) ---
 # Niezbędne dla endpointu /analytics/predictions
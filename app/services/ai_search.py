@@ -1,78 +1,406 @@
-from sentence_transformers import SentenceTransformer, util
+import os
+import queue
 import logging
+import threading
+import numpy as np
+from collections import namedtuple
+from itertools import islice
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import models
+from app.services.embedding_cache import EmbeddingCache
+from app.services.vector_index import create_index, ExactIndex
+from app.services.query_encoder import QueryEncoder
 
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = 'all-MiniLM-L6-v2'
+MIN_SCORE = 0.25   # Próg trafności (żeby nie pokazywać śmieci)
+
+# IVF trenowany na N wierszach jest przebudowywany, gdy katalog urośnie ponad N * ten współczynnik
+INDEX_REBUILD_GROWTH = 4
+# Liczba zamienników przechowywanych w grafie sąsiedztwa dla każdego produktu
+ALTERNATIVES_K = int(os.getenv("AI_SEARCH_ALTERNATIVES_K", "10"))
+
+# Wpis indeksu - lekka kopia pól produktu (bez odłączonych obiektów ORM z zamkniętych sesji)
+IndexEntry = namedtuple("IndexEntry", "id name category")
+
+
+def describe(name, category) -> str:
+    # Opis do wektoryzacji: "Laptop Dell XPS elektronika biurowa"
+    return f"{name} {category}"
+
+
 class AISearchService:
+    """
+    Wyszukiwanie semantyczne. Model NLP ładowany jest leniwie (rozgrzewka w tle przy starcie),
+    a do tego czasu wyszukiwanie zwraca puste wyniki zamiast blokować endpointy.
+    Indeks jest aktualizowany przyrostowo (upsert/delete po id produktu) - zapisy produktów
+    trafiają tu przez hook sesji SQLAlchemy po commicie i są nakładane przez wątek w tle
+    (kodowanie opisów nie wydłuża żądania, które zapisało produkt).
+    """
+
     def __init__(self):
-        # Pobieramy lekki i szybki model NLP (działa na CPU)
-        try:
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
-            logger.info("🧠 [AI SEARCH] Model NLP załadowany poprawnie.")
-        except Exception as e:
-            logger.error(f"❌ [AI SEARCH] Błąd ładowania modelu: {e}")
-            self.model = None
+        self.model = None
+        self.state = "cold"   # cold | loading | ready | failed
+        self.error = None
+        self._lock = threading.Lock()
+
+        self.products_cache = []   # IndexEntry dla każdego wiersza macierzy
+        self.embeddings = None     # widok [:n] bufora _matrix
+        self._matrix = None        # bufor z zapasem - dopisywanie bez kopiowania całości
+        self._rows = {}            # id produktu -> wiersz
+        self._ids = None           # wiersz -> id produktu (bufor jak _matrix)
+        # Graf zamienników: dla każdego wiersza id ALTERNATIVES_K najbliższych produktów (-1 = brak)
+        self._alt_ids = None
+        self._alt_scores = None
+        self._vindex = ExactIndex()  # struktura wyszukiwania (dokładna lub ANN, vector_index)
+        self._vindex_size = 0        # rozmiar katalogu przy budowie indeksu
+        # Wyszukiwanie czyta macierz pod _index_lock; zapisy są szeregowane przez _write_lock,
+        # a kodowanie (wolne) odbywa się poza _index_lock
+        self._index_lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._indexed = False
+        self._pending = {}         # zmiany sprzed zbudowania indeksu: id -> IndexEntry | None
+        # Zmiany po commicie czekające na wątek aktualizacji indeksu
+        self._changes = queue.Queue()
+        self._changes_worker = None
+        self._changes_lock = threading.Lock()   # nie _lock - ten trzyma ładowanie modelu
+        # Wektory katalogu z dysku - przy starcie kodujemy tylko nowe/zmienione produkty
+        self.embedding_cache = EmbeddingCache(MODEL_NAME)
+        # Zapytania: LRU + mikro-paczki (jedno encode dla zapytań współbieżnych)
+        self.query_encoder = QueryEncoder(self._encode)
 
-        self.products_cache = []
-        self.embeddings = None
+    @property
+    def ready(self) -> bool:
+        return self.model is not None and self.embeddings is not None
+
+    def load(self):
+        """Import sentence-transformers i pobranie lekkiego modelu NLP (działa na CPU)."""
+        with self._lock:
+            if self.model is not None:
+                return
+            self.state = "loading"
+            try:
+                from sentence_transformers import SentenceTransformer
+                self.model = SentenceTransformer(MODEL_NAME)
+                logger.info("🧠 [AI SEARCH] Model NLP załadowany poprawnie.")
+            except Exception as e:
+                logger.error(f"❌ [AI SEARCH] Błąd ładowania modelu: {e}")
+                self.state = "failed"
+                self.error = str(e)
+
+    def warm_up(self, products: list):
+        """Rozgrzewka w tle: model + indeks katalogu."""
+        self.load()
+        self.index_products(products)
+        if self.model is not None:
+            self.state = "ready"
 
     def index_products(self, products: list):
-        """Tworzy wektory (embeddings) dla wszystkich produktów przy starcie"""
-        if not self.model or not products:
+        """Tworzy wektory (embeddings) dla wszystkich produktów (pełna przebudowa indeksu)."""
+        if not self.model:
             return
-        
-        self.products_cache = products
-        # Tworzymy opisy do wektoryzacji: "Laptop Dell XPS elektronika biurowa"
-        descriptions = [f"{p.name} {p.category}" for p in products]
-        
-        logger.info(f"🧠 [AI SEARCH] Tworzenie wektorów dla {len(products)} produktów...")
-        self.embeddings = self.model.encode(descriptions, convert_to_tensor=True)
+
+        with self._write_lock:
+            # Zmiany zapisane w trakcie przebudowy czekają w kolejce - nie zgubi ich podmiana macierzy
+            self._indexed = False
+        entries = [IndexEntry(p.id, p.name, p.category) for p in products]
+        logger.info(f"🧠 [AI SEARCH] Tworzenie wektorów dla {len(entries)} produktów...")
+        vectors = self._embed([describe(e.name, e.category) for e in entries], complete=True)
+        vindex = self._build_index(vectors)
+        ids = np.fromiter((e.id for e in entries), dtype=np.int64, count=len(entries))
+        alt_ids, alt_scores = self._neighbours(vindex, vectors, ids)
+
+        with self._write_lock:
+            with self._index_lock:
+                self._vindex, self._vindex_size = vindex, len(vectors)
+                self._matrix = vectors
+                self.embeddings = vectors
+                self.products_cache = entries
+                self._rows = {e.id: i for i, e in enumerate(entries)}
+                self._ids = ids
+                self._alt_ids, self._alt_scores = alt_ids, alt_scores
+                self._indexed = True
+            pending, self._pending = self._pending, {}
+        if pending:
+            self.apply_changes(pending)
         logger.info("✅ [AI SEARCH] Indeksowanie zakończone.")
 
+    def _build_index(self, vectors: np.ndarray):
+        vindex = create_index(len(vectors))
+        vindex.build(vectors)
+        if vindex.kind != "exact":
+            logger.info(f"🧭 [AI SEARCH] Indeks ANN zbudowany: {vindex.stats()}")
+        return vindex
+
+    @staticmethod
+    def _neighbours(vindex, vectors: np.ndarray, ids: np.ndarray, rows=None):
+        """Sąsiedzi wierszy z indeksu wektorowego, zamienieni na id produktów."""
+        found, scores = vindex.neighbours(vectors, ALTERNATIVES_K, rows)
+        return np.where(found >= 0, ids[found], -1), scores
+
+    def _encode(self, texts: list):
+        return self.model.encode(texts, convert_to_numpy=True)
+
+    def _embed(self, texts: list, complete: bool) -> np.ndarray:
+        try:
+            return self.embedding_cache.embed(texts, self._encode, complete=complete)
+        except OSError as e:
+            # Magazyn niedostępny (np. katalog tylko do odczytu) - kodujemy w pamięci
+            logger.warning(f"⚠️ [AI SEARCH] Magazyn wektorów niedostępny ({e}).")
+            return np.asarray(self._encode(texts), dtype=np.float32).reshape(len(texts), -1)
+
+    # --- AKTUALIZACJE PRZYROSTOWE ---
+    def submit_changes(self, changes: dict):
+        """Zmiany z hooka po commicie - do kolejki; indeks aktualizuje wątek w tle."""
+        self._changes.put(changes)
+        with self._changes_lock:
+            if self._changes_worker is None or not self._changes_worker.is_alive():
+                self._changes_worker = threading.Thread(target=self._run_changes, name="ai-index-updates", daemon=True)
+                self._changes_worker.start()
+
+    def wait_for_changes(self):
+        """Blokuje do nałożenia wszystkich zgłoszonych zmian (skrypty, testy)."""
+        self._changes.join()
+
+    def _run_changes(self):
+        while True:
+            batches = [self._changes.get()]
+            # Zmiany zgłoszone w międzyczasie - jedna aktualizacja, późniejszy stan produktu wygrywa
+            while True:
+                try:
+                    batches.append(self._changes.get_nowait())
+                except queue.Empty:
+                    break
+            changes = {}
+            for batch in batches:
+                changes.update(batch)
+            try:
+                self.apply_changes(changes)
+            except Exception as e:
+                # Indeks nie może zatrzymać wątku - zmiana wróci przy pełnej przebudowie
+                logger.error(f"❌ [AI SEARCH] Błąd aktualizacji indeksu: {e}")
+            finally:
+                for _ in batches:
+                    self._changes.task_done()
+
+    def apply_changes(self, changes: dict):
+        """Zmiany po id produktu: IndexEntry (upsert) albo None (usunięcie)."""
+        upserts = [e for e in changes.values() if e is not None]
+        deletes = [pid for pid, e in changes.items() if e is None]
+        if upserts:
+            self.upsert(upserts)
+        if deletes:
+            self.delete(deletes)
+
+    def upsert(self, products: list):
+        """Dodaje lub aktualizuje produkty - kodowane są tylko wiersze ze zmienionym opisem."""
+        entries = [IndexEntry(p.id, p.name, p.category) for p in products]
+        with self._write_lock:
+            if not self._indexed or self.model is None:
+                for e in entries:
+                    self._pending[e.id] = e
+                return
+            changed = []
+            for e in entries:
+                row = self._rows.get(e.id)
+                current = self.products_cache[row] if row is not None else None
+                if current is None or describe(current.name, current.category) != describe(e.name, e.category):
+                    changed.append(e)
+                elif current != e:
+                    with self._index_lock:
+                        self.products_cache[row] = e
+            if not changed:
+                return
+            vectors = self._embed([describe(e.name, e.category) for e in changed], complete=False)
+
+            with self._index_lock:
+                size = len(self.products_cache)
+                appended = sum(1 for e in changed if e.id not in self._rows)
+                if size + appended > len(self._matrix):
+                    # Wzrost geometryczny - kolejne dopisania trafiają do istniejącego bufora
+                    capacity = max(2 * len(self._matrix), size + appended, 16)
+                    self._matrix = self._grown(self._matrix, size, (capacity, vectors.shape[1]), 0)
+                    self._ids = self._grown(self._ids, size, capacity, -1)
+                    self._alt_ids = self._grown(self._alt_ids, size, (capacity, ALTERNATIVES_K), -1)
+                    self._alt_scores = self._grown(self._alt_scores, size, (capacity, ALTERNATIVES_K), -np.inf)
+                rows = []
+                for e, vector in zip(changed, vectors):
+                    row = self._rows.get(e.id)
+                    if row is None:
+                        row = self._rows[e.id] = len(self.products_cache)
+                        self.products_cache.append(e)
+                    else:
+                        self.products_cache[row] = e
+                    self._matrix[row] = vector
+                    self._ids[row] = e.id
+                    rows.append(row)
+                self.embeddings = self._matrix[:len(self.products_cache)]
+                self._vindex.set(rows, vectors)
+            self._maybe_rebuild_index()
+            # Graf: zmienione wiersze + wiersze, do których top-k wchodzi nowy wektor lub z których wypada stary
+            n = len(self.products_cache)
+            stale = self._vindex.reached(self.embeddings, vectors, self._alt_scores[:n, -1])
+            stale |= np.isin(self._alt_ids[:n], [e.id for e in changed]).any(axis=1)
+            stale[rows] = True
+            self._refresh_alternatives(np.flatnonzero(stale))
+        logger.info(f"🧠 [AI SEARCH] Indeks zaktualizowany: {len(changed)} produktów.")
+
+    def delete(self, product_ids: list):
+        """Usuwa produkty z indeksu (ostatni wiersz przenoszony na miejsce usuniętego)."""
+        with self._write_lock:
+            if not self._indexed:
+                for pid in product_ids:
+                    self._pending[pid] = None
+                return
+            with self._index_lock:
+                for pid in product_ids:
+                    row = self._rows.pop(pid, None)
+                    if row is None:
+                        continue
+                    last = len(self.products_cache) - 1
+                    self._vindex.remove(row, last)
+                    if row != last:
+                        moved = self.products_cache[last]
+                        for buffer in (self._matrix, self._ids, self._alt_ids, self._alt_scores):
+                            buffer[row] = buffer[last]
+                        self.products_cache[row] = moved
+                        self._rows[moved.id] = row
+                    self.products_cache.pop()
+                self.embeddings = self._matrix[:len(self.products_cache)]
+            self._maybe_rebuild_index()
+            # Wiersze, w których grafie był usunięty produkt, dostają nowych sąsiadów
+            n = len(self.products_cache)
+            self._refresh_alternatives(np.flatnonzero(np.isin(self._alt_ids[:n], product_ids).any(axis=1)))
+
+    @staticmethod
+    def _grown(buffer: np.ndarray, size: int, shape, fill) -> np.ndarray:
+        grown = np.full(shape, fill, dtype=buffer.dtype)
+        if size:
+            grown[:size] = buffer[:size]
+        return grown
+
+    def _refresh_alternatives(self, rows: np.ndarray):
+        """Przeliczenie sąsiadów wskazanych wierszy (pod _write_lock; zapis grafu pod _index_lock)."""
+        if not len(rows):
+            return
+        alt_ids, alt_scores = self._neighbours(self._vindex, self.embeddings, self._ids, rows)
+        with self._index_lock:
+            self._alt_ids[rows], self._alt_scores[rows] = alt_ids, alt_scores
+
+    def _maybe_rebuild_index(self):
+        """
+        Wywoływane pod _write_lock: zmiana typu indeksu (próg ANN) lub duży przyrost katalogu
+        od treningu IVF. Budowa na bieżącej macierzy poza _index_lock - wyszukiwania działają dalej.
+        """
+        size = len(self.products_cache)
+        wanted = create_index(size).kind
+        if wanted == self._vindex.kind and not (
+                wanted != "exact" and size > INDEX_REBUILD_GROWTH * max(self._vindex_size, 1)):
+            return
+        vindex = self._build_index(self.embeddings)
+        with self._index_lock:
+            self._vindex, self._vindex_size = vindex, size
+
+    def index_stats(self) -> dict:
+        return dict(self._vindex.stats(), size=len(self.products_cache), alternatives_k=ALTERNATIVES_K,
+                    pending_changes=self._changes.unfinished_tasks)
+
+    # --- WYSZUKIWANIE ---
+    def _hits(self, query: str, top_k: int):
+        # Zamień zapytanie użytkownika na wektor (poza blokadą indeksu; cache + mikro-paczki)
+        query_embedding = self.query_encoder.encode(query)
+        with self._index_lock:
+            # Podobieństwo kosinusowe: dokładne (mały katalog) lub ANN (vector_index)
+            rows, scores = self._vindex.search(self.embeddings, query_embedding, top_k)
+            return [(self.products_cache[row], score) for row, score in zip(rows.tolist(), scores.tolist())]
+
+    def search_scored(self, query: str, top_k: int = 5, min_score: float = MIN_SCORE):
+        """Pary (wpis indeksu, podobieństwo) powyżej progu trafności - np. do fuzji z BM25."""
+        if not self.ready:
+            return []
+        return [(product, score) for product, score in self._hits(query, top_k) if score > min_score]
+
     def search(self, query: str, top_k: int = 5):
         """Wyszukuje produkty na podstawie zapytania tekstowego"""
-        if self.model is None or self.embeddings is None:
-            return []
+        # Zwróć pasujące produkty (wpisy indeksu: id, nazwa, kategoria)
+        return [product for product, _ in self.search_scored(query, top_k)]
 
-        # Zamień zapytanie użytkownika na wektor
-        query_embedding = self.model.encode(query, convert_to_tensor=True)
-
-        # Oblicz podobieństwo (Cosine Similarity)
-        hits = util.semantic_search(query_embedding, self.embeddings, top_k=top_k)
-        
-        # Zwróć pasujące obiekty produktów
-        results = []
-        for hit in hits[0]:
-            if hit['score'] > 0.25: # Próg trafności (żeby nie pokazywać śmieci)
-                product = self.products_cache[hit['corpus_id']]
-                results.append(product)
-        
-        return results
-
-    def find_alternatives(self, product_name: str, category: str, top_k: int = 3):
+    def alternatives(self, product_id: int, top_k: int = 3) -> list:
+        """Zamienniki produktu z grafu sąsiedztwa: pary (wpis indeksu, podobieństwo), bez kodowania."""
+        return self.alternatives_map([product_id], top_k).get(product_id, [])
+
+    def alternatives_map(self, product_ids=None, top_k: int = 3) -> dict:
+        """Zamienniki wielu produktów naraz (domyślnie całego katalogu): id -> [(wpis, podobieństwo)]."""
+        if not self.ready:
+            return {}
+        top_k = min(top_k, ALTERNATIVES_K)
+        with self._index_lock:
+            if product_ids is None:
+                product_ids = [e.id for e in self.products_cache]
+            result = {}
+            for pid in product_ids:
+                row = self._rows.get(pid)
+                if row is None:
+                    continue
+                # Usunięty sąsiad może jeszcze tkwić w grafie (odświeżenie po delete() idzie poza _index_lock) -
+                # pomijamy go, a brakujące miejsce zajmuje kolejny z zapasowych sąsiadów wiersza
+                found = ((self.products_cache[self._rows[alt]], score)
+                         for alt, score in zip(self._alt_ids[row].tolist(), self._alt_scores[row].tolist())
+                         if alt in self._rows)
+                result[pid] = list(islice(found, top_k))
+            return result
+
+    def find_alternatives(self, product_name: str, category: str, top_k: int = 3, product_id: int = None):
         """
         Szuka zamienników dla danego produktu.
-        To jest ta metoda, której brakowało i powodowała błąd 500!
+        Produkt z katalogu (product_id) - odczyt z grafu sąsiedztwa; opis spoza katalogu - wyszukiwanie.
         """
-        if self.model is None or self.embeddings is None:
+        if not self.ready:
             return []
+        if product_id is not None and product_id in self._rows:
+            return [entry for entry, _ in self.alternatives(product_id, top_k)]
 
-        # Tworzymy zapytanie bazujące na nazwie szukanego produktu
-        query = f"{product_name} {category}"
-        query_embedding = self.model.encode(query, convert_to_tensor=True)
-
-        # Szukamy podobnych (pobieramy k+1, bo pierwszym wynikiem będzie ten sam produkt)
-        hits = util.semantic_search(query_embedding, self.embeddings, top_k=top_k + 1)
-        
-        alternatives = []
-        for hit in hits[0]:
-            found_product = self.products_cache[hit['corpus_id']]
-            # Ignoruj produkt o tej samej nazwie (nie chcemy polecać tego samego jako zamiennika)
-            if found_product.name != product_name:
-                alternatives.append(found_product)
-        
-        # Zwracamy tylko top_k wyników
+        # Szukamy podobnych (pobieramy k+1, bo pierwszym wynikiem może być ten sam produkt)
+        hits = self._hits(describe(product_name, category), top_k + 1)
+        # Ignoruj sam produkt (po id, gdy znany; nazwy produktów mogą się powtarzać)
+        alternatives = [found for found, _ in hits
+                        if (found.id != product_id if product_id is not None else found.name != product_name)]
         return alternatives[:top_k]
 
 # Singleton
-ai_search = AISearchService()
\ No newline at end of file
+ai_search = AISearchService()
+
+
+# --- HOOK ZAPISÓW PRODUKTÓW ---
+@event.listens_for(Session, "after_flush")
+def _track_product_changes(session, flush_context):
+    """Zbiera zmiany nazwy/kategorii produktów w transakcji (stan sprzed flush jest jeszcze dostępny)."""
+    for obj in session.new:
+        if isinstance(obj, models.Product):
+            changes = session.info.setdefault("ai_index_changes", {})
+            changes[obj.id] = IndexEntry(obj.id, obj.name, obj.category)
+    for obj in session.dirty:
+        if isinstance(obj, models.Product):
+            attrs = inspect(obj).attrs
+            if attrs.name.history.has_changes() or attrs.category.history.has_changes():
+                changes = session.info.setdefault("ai_index_changes", {})
+                changes[obj.id] = IndexEntry(obj.id, obj.name, obj.category)
+    for obj in session.deleted:
+        if isinstance(obj, models.Product):
+            changes = session.info.setdefault("ai_index_changes", {})
+            changes[obj.id] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_product_changes(session):
+    changes = session.info.pop("ai_index_changes", None)
+    if changes:
+        # Kodowanie w tle - commit produktu nie czeka na model NLP
+        ai_search.submit_changes(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_product_changes(session):
+    session.info.pop("ai_index_changes", None)
@@ -0,0 +1,90 @@
+import threading
+from itertools import chain
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app import models
+
+# Tabele, od których zależą wyniki analityki (predykcje MRP)
+_TRACKED = (models.Product, models.Order)
+MAX_ENTRIES = 16
+
+
+class DataVersion:
+    """
+    Wersja danych analityki: rośnie po każdym zatwierdzonym zapisie produktów lub zamówień
+    (tick symulatora, zamówienia i edycje z API). Odczyt to jedno pole - bez zapytań do bazy.
+    """
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def bump(self):
+        with self._lock:
+            self.value += 1
+
+
+class VersionedCache:
+    """Wyniki liczone raz na wersję danych (klucz = parametry zapytania, np. limit)."""
+
+    def __init__(self, version: DataVersion, max_entries: int = MAX_ENTRIES):
+        self._version = version
+        self.max_entries = max_entries
+        self._entries = {}
+        self._entries_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key, compute):
+        # Wersja czytana przed obliczeniem - zapis w trakcie liczenia unieważni wynik przy kolejnym odczycie
+        version = self._version.value
+        with self._lock:
+            if self._entries_version == version and key in self._entries:
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        result = compute()
+        with self._lock:
+            if self._version.value == version:
+                if self._entries_version != version:
+                    self._entries, self._entries_version = {}, version
+                if len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+                self._entries[key] = result
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"version": self._entries_version, "size": len(self._entries),
+                    "hit_rate": round(self.hits / total, 3) if total else None}
+
+
+# Singleton
+data_version = DataVersion()
+
+
+# --- HOOK ZAPISÓW (ORM flush i zbiorcze INSERT/UPDATE symulatora) ---
+@event.listens_for(Session, "after_flush")
+def _track_flush(session, flush_context):
+    if any(isinstance(obj, _TRACKED) for obj in chain(session.new, session.dirty, session.deleted)):
+        session.info["analytics_dirty"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_bulk(orm_execute_state):
+    mapper = orm_execute_state.bind_mapper
+    if not orm_execute_state.is_select and mapper is not None and mapper.class_ in _TRACKED:
+        orm_execute_state.session.info["analytics_dirty"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_version(session):
+    if session.info.pop("analytics_dirty", False):
+        data_version.bump()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session):
+    session.info.pop("analytics_dirty", None)
@@ -1,9 +1,14 @@
 import numpy as np
 import logging
 import os
+import time
+import threading
 import joblib
-from sklearn.ensemble import IsolationForest
+from datetime import datetime
 from app import models
+from app.services.model_registry import ModelRegistry
+from app.services.feature_store import feature_store
+from app.services.forest_eval import compile_forest
 from typing import Optional
 
 # Konfiguracja logowania
@@ -14,61 +19,224 @@ MODEL_PATH = "anomaly_model.pkl"
 MIN_SAMPLES_FOR_TRAINING = 10
 ANOMALY_CONTAMINATION = 0.05 
 
+BASE_FEATURES = ("quantity", "total_price", "unit_price")
+PRODUCT_FEATURES = ("product_z_quantity", "product_z_unit_price")
+# Wersja definicji cech zapisywana w metadanych modelu. v2: cena jednostkowa przy inferencji
+# to total / ilość (jak w treningu); v1 (modele bez tego pola, anomaly_model.pkl) oceniały
+# ilość / total - takie artefakty są nieaktualne i retrener wymienia je przy pierwszym sprawdzeniu.
+FEATURE_VERSION = 2
+
+
+def feature_matrix(quantity, total_price, product_ids=None, per_product: bool = False, store=None) -> np.ndarray:
+    """
+    Cechy modelu (wspólne dla treningu i inferencji): [Ilość, Cena Całkowita, Cena Jednostkowa],
+    opcjonalnie z-score ilości i ceny względem historii danego produktu (magazyn cech;
+    domyślnie współdzielony `feature_store`, dla kopii odłączonej - zamrożony).
+    """
+    q = np.asarray(quantity, dtype=float)
+    tp = np.asarray(total_price, dtype=float)
+    up = np.divide(tp, q, out=np.zeros(len(q)), where=q > 0)
+    if not per_product:
+        return np.column_stack([q, tp, up])
+    return np.column_stack([q, tp, up, (store or feature_store).zscores(product_ids, q, up)])
+
+
+def model_features(model) -> tuple:
+    """Lista cech, na których wytrenowano model (starsze modele - tylko cechy globalne)."""
+    if getattr(model, "n_features_in_", len(BASE_FEATURES)) == len(BASE_FEATURES) + len(PRODUCT_FEATURES):
+        return BASE_FEATURES + PRODUCT_FEATURES
+    return BASE_FEATURES
+
+
+def fit_model(X: np.ndarray):
+    """Trening nowej instancji - działający model nie jest modyfikowany w miejscu."""
+    from sklearn.ensemble import IsolationForest
+    model = IsolationForest(contamination=ANOMALY_CONTAMINATION, random_state=42, n_jobs=-1)
+    model.fit(X)
+    return model
+
+
+def feature_stats(X: np.ndarray) -> dict:
+    names = (BASE_FEATURES + PRODUCT_FEATURES)[:X.shape[1]]
+    return {
+        name: {
+            "mean": round(float(X[:, i].mean()), 4),
+            "std": round(float(X[:, i].std()), 4),
+            "min": round(float(X[:, i].min()), 4),
+            "p50": round(float(np.percentile(X[:, i], 50)), 4),
+            "p99": round(float(np.percentile(X[:, i], 99)), 4),
+            "max": round(float(X[:, i].max()), 4),
+        }
+        for i, name in enumerate(names)
+    }
+
+
+def training_metadata(X: np.ndarray, started: float, **extra) -> dict:
+    return dict(
+        training_rows=len(X),
+        features=list((BASE_FEATURES + PRODUCT_FEATURES)[:X.shape[1]]),
+        feature_version=FEATURE_VERSION,
+        feature_stats=feature_stats(X),
+        contamination=ANOMALY_CONTAMINATION,
+        trained_at=datetime.now().isoformat(timespec="seconds"),
+        training_seconds=round(time.perf_counter() - started, 3),
+        **extra,
+    )
+
+
 class AnomalyDetector:
     """
     Serwis realizujący audyt bezpieczeństwa procesów zakupowych przy użyciu Isolation Forest.
+    Model pochodzi z rejestru wersji; podmiana to jedno przypisanie referencji,
+    więc trwające wywołania zawsze widzą kompletny model (stary albo nowy).
+    Ładowanie jest leniwe (rozgrzewka w tle lub pierwsze użycie) - import modułu nic nie wczytuje.
+    Inferencja idzie przez skompilowany ewaluator lasu (forest_eval), a sklearn jest rezerwą.
     """
 
-    def __init__(self):
-        self.model = IsolationForest(
-            contamination=ANOMALY_CONTAMINATION,
-            random_state=42,
-            n_jobs=-1
-        )
-        self.is_trained = False
-        self._load_model_if_exists()
+    def __init__(self, registry: Optional[ModelRegistry] = None):
+        self.registry = registry or ModelRegistry()
+        # (model sklearn, skompilowany ewaluator lub None) - podmieniane jednym przypisaniem
+        self._active = (None, None)
+        self._loaded = False
+        self.version = None
+        self.metadata = {}
+        # Magazyn cech per produkt (None = współdzielony feature_store)
+        self.features = None
+        self._swap_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_swap_lock"], state["_load_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._swap_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def detached(self) -> "AnomalyDetector":
+        """
+        Kopia do obliczeń poza procesem API (gałęzie scenariuszy w puli): bieżący model
+        i zamrożone statystyki magazynu cech. Nie czyta ani nie zapisuje bazy.
+        """
+        model, compiled = self._scorer()
+        copy = AnomalyDetector(self.registry)
+        copy._active, copy._loaded = (model, compiled), True
+        copy.version, copy.metadata = self.version, self.metadata
+        if model is not None and len(model_features(model)) > len(BASE_FEATURES):
+            copy.features = (self.features or feature_store).frozen()
+        return copy
+
+    @property
+    def model(self):
+        return self._scorer()[0]
+
+    @property
+    def compiled(self) -> bool:
+        return self._scorer()[1] is not None
+
+    def _scorer(self) -> tuple:
+        """Para (model, ewaluator) z jednego odczytu - spójna także podczas podmiany."""
+        if not self._loaded:
+            self.ensure_loaded()
+        return self._active
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded
+
+    @property
+    def stale_features(self) -> bool:
+        """Aktywny model wytrenowany na starszej definicji cech (wymaga retreningu)."""
+        return self.model is not None and self.metadata.get("feature_version", 1) < FEATURE_VERSION
+
+    @property
+    def is_trained(self) -> bool:
+        return self.model is not None
+
+    def ensure_loaded(self):
+        with self._load_lock:
+            if not self._loaded:
+                self._load_model_if_exists()
+                self._loaded = True
 
     def _load_model_if_exists(self):
-        """Ładowanie modelu z dysku."""
+        """Ładowanie aktywnej wersji z rejestru (lub starszego pliku anomaly_model.pkl)."""
+        try:
+            version = self.registry.current_version()
+            if version is not None:
+                self._swap(*self.registry.load(version))
+                logger.info(f"✅ [AI SECURITY] Model detekcji v{version} załadowany.")
+                self._warn_if_stale()
+                return
+        except Exception as e:
+            logger.error(f"❌ [AI SECURITY] Błąd ładowania z rejestru: {e}")
+
         if os.path.exists(MODEL_PATH):
             try:
-                self.model = joblib.load(MODEL_PATH)
-                self.is_trained = True
+                self._swap(joblib.load(MODEL_PATH), {"source": MODEL_PATH})
                 logger.info(f"✅ [AI SECURITY] Model detekcji załadowany.")
+                self._warn_if_stale()
             except Exception as e:
                 logger.error(f"❌ [AI SECURITY] Błąd ładowania: {e}")
         else:
             logger.warning("⚠️ [AI SECURITY] Brak modelu. Wymagany trening.")
 
+    def _warn_if_stale(self):
+        if self.metadata.get("feature_version", 1) < FEATURE_VERSION:
+            logger.warning(f"⚠️ [AI SECURITY] Model na cechach v{self.metadata.get('feature_version', 1)} "
+                           f"(aktualne: v{FEATURE_VERSION}) - zostanie wytrenowany ponownie.")
+
+    def _swap(self, model, metadata: dict):
+        # Eksport do tablic przed blokadą - wywołania w toku dalej używają starej pary
+        compiled = compile_forest(model) if model is not None else None
+        with self._swap_lock:
+            self.metadata = metadata
+            self.version = metadata.get("version")
+            self._active = (model, compiled)
+            self._loaded = True
+
+    def activate(self, version: int, pinned: bool = False):
+        """Atomowa podmiana modelu na wskazaną wersję z rejestru (pinned - wybór operatora, bez automatycznych podmian)."""
+        model, metadata = self.registry.load(version)
+        self.registry.activate(version, pinned=pinned)
+        self._swap(model, metadata)
+        logger.info(f"🔁 [AI SECURITY] Aktywny model: v{version} ({metadata.get('training_rows')} próbek).")
+
+    def rollback(self) -> int:
+        version = self.registry.previous_version()
+        if version is None:
+            raise ValueError("Brak wcześniejszej wersji modelu")
+        self.activate(version, pinned=True)
+        return version
+
     def train(self, orders: list[models.Order]):
         """
-        Trenuje model na danych historycznych.
-        Cechy: [Ilość, Cena Całkowita, Cena Jednostkowa]
+        Trenuje model na danych historycznych (synchronicznie - dla skryptów).
+        Cechy: [Ilość, Cena Całkowita, Cena Jednostkowa] + z-score względem historii produktu.
+        W API używaj retreningu w tle (ModelRetrainer).
         """
         if not orders or len(orders) < MIN_SAMPLES_FOR_TRAINING:
-            logger.warning(f"⚠️ [AI SECURITY] Za mało danych ({len(orders)}).")
+            logger.warning(f"⚠️ [AI SECURITY] Za mało danych ({len(orders) if orders else 0}).")
             return
 
         try:
-            data = []
-            for o in orders:
-                # Obliczanie ceny jednostkowej jako kluczowej cechy
-                unit_price = float(o.total_price / o.quantity) if o.quantity and o.quantity > 0 else 0.0
-                data.append([float(o.quantity), float(o.total_price), unit_price])
-            
-            X = np.array(data)
+            started = time.perf_counter()
+            X = feature_matrix([float(o.quantity or 0) for o in orders], [float(o.total_price or 0) for o in orders],
+                               [o.product_id for o in orders], per_product=True)
 
             logger.info(f"🔄 [AI SECURITY] Trening na {len(X)} próbkach...")
-            self.model.fit(X)
-            self.is_trained = True
-
-            joblib.dump(self.model, MODEL_PATH)
+            model = fit_model(X)
+            version = self.registry.save(model, training_metadata(X, started, trigger="manual"))
+            self.activate(version)
             logger.info(f"✅ [AI SECURITY] Trening zakończony.")
 
         except Exception as e:
             logger.error(f"❌ [AI SECURITY] Błąd treningu: {e}")
 
-    def is_anomaly(self, quantity: float, total_price: float, contract_price: Optional[float] = None) -> bool:
+    def is_anomaly(self, quantity: float, total_price: float, contract_price: Optional[float] = None,
+                   product_id: Optional[int] = None) -> bool:
         """
         Weryfikacja zamówienia. 
         UWAGA: Argumenty muszą być przekazywane zgodnie z sygnaturą w main.py.
@@ -77,7 +245,8 @@ class AnomalyDetector:
             # 1. Konwersja na float, aby uniknąć błędów typów
             q = float(quantity)
             tp = float(total_price)
-            up = q / tp if q > 0 else 0.0
+            # Cena jednostkowa jak w treningu (total / ilość)
+            up = tp / q if q > 0 else 0.0
 
             # 2. Walidacja Kontraktowa (Deterministyczna)
             if contract_price is not None:
@@ -87,16 +256,18 @@ class AnomalyDetector:
                     return True
 
             # 3. Analiza Statystyczna (Isolation Forest)
-            if not self.is_trained:
+            model, compiled = self._scorer()
+            if model is None:
                 return False
 
-            # Przygotowanie danych (reshape(-1, 3) gwarantuje poprawny format macierzy)
-            features = np.array([[q, tp, up]]).reshape(1, -1)
+            # Przygotowanie danych (cechy per produkt, jeśli model był na nich trenowany)
+            features = feature_matrix([q], [tp], [product_id], per_product=len(model_features(model)) > len(BASE_FEATURES),
+                                      store=self.features)
             
-            prediction = self.model.predict(features)
+            # predict() Isolation Forest to próg decision_function < 0 - liczymy raz
+            score = (compiled or model).decision_function(features)[0]
             
-            if prediction[0] == -1:
-                score = self.model.decision_function(features)[0]
+            if score < 0:
                 logger.warning(f"🚨 [AI SECURITY] ANOMALIA STATYSTYCZNA! Score: {score:.4f}")
                 return True
             
@@ -106,5 +277,59 @@ class AnomalyDetector:
             logger.error(f"❌ [AI SECURITY] Błąd inferencji: {e}")
             return False
 
+    def score_batch(self, quantity, total_price, contract_price=None, product_ids=None) -> dict:
+        """
+        Ocena wielu pozycji naraz: jedna macierz cech i jedno wywołanie decision_function.
+        Zwraca tablice: werdykt, score modelu (NaN bez modelu) i regułę, która zadziałała.
+        `contract_price` może zawierać NaN dla pozycji bez kontraktu; `product_ids` włącza
+        cechy per produkt z magazynu cech (dla modeli trenowanych z tymi cechami).
+        """
+        X = feature_matrix(quantity, total_price)
+        n = len(X)
+        up = X[:, 2]
+
+        # 1. Walidacja Kontraktowa (maska na tablicach)
+        overpriced = np.zeros(n, dtype=bool)
+        if contract_price is not None:
+            cp = np.asarray(contract_price, dtype=float)
+            overpriced = ~np.isnan(cp) & (up > cp * 1.15)
+
+        # 2. Analiza Statystyczna - jedno wywołanie modelu dla całej paczki
+        scores = np.full(n, np.nan)
+        z = np.zeros((n, 2))
+        model, compiled = self._scorer()
+        if model is not None and n:
+            try:
+                if len(model_features(model)) > len(BASE_FEATURES):
+                    X = feature_matrix(quantity, total_price, product_ids, per_product=True, store=self.features)
+                    z = X[:, len(BASE_FEATURES):]
+                # predict() Isolation Forest to próg decision_function < 0 - liczymy raz
+                scores = (compiled or model).decision_function(X)
+            except Exception as e:
+                logger.error(f"❌ [AI SECURITY] Błąd inferencji: {e}")
+        outlier = scores < 0
+
+        rule = np.full(n, None, dtype=object)
+        rule[outlier] = "statistical_outlier"
+        rule[overpriced] = "contract_overpricing"
+        return {
+            "is_anomaly": overpriced | outlier,
+            "score": scores,
+            "unit_price": up,
+            "product_z": z,
+            "rule": rule,
+        }
+
+    def is_anomaly_batch(self, quantity, total_price, contract_price=None, product_ids=None) -> np.ndarray:
+        """Wektorowa wersja `is_anomaly` dla wielu zamówień naraz (np. tick symulatora)."""
+        result = self.score_batch(quantity, total_price, contract_price, product_ids)
+        cp = np.asarray(contract_price, dtype=float) if contract_price is not None else None
+        for i in np.flatnonzero(result["is_anomaly"]).tolist():
+            if result["rule"][i] == "contract_overpricing":
+                logger.warning(f"🚨 [AI SECURITY] PRZEPŁACENIE: {result['unit_price'][i]:.2f} vs Kontrakt: {cp[i]:.2f}")
+            else:
+                logger.warning(f"🚨 [AI SECURITY] ANOMALIA STATYSTYCZNA! Score: {result['score'][i]:.4f}")
+        return result["is_anomaly"]
+
 # Singleton
 anomaly_detector = AnomalyDetector()
\ No newline at end of file
@@ -0,0 +1,176 @@
+import heapq
+import math
+import random
+import itertools
+import logging
+import numpy as np
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy.orm import Session
+from app import models
+
+logger = logging.getLogger(__name__)
+
+# Dzienna szansa zatoru na trasie i jego długość (dni)
+DELAY_PROBABILITY = 0.15
+DELAY_RANGE = (3, 6)
+
+
+class ScheduledDelivery:
+    """Zamówienie w drodze (status 'ordered') przechowywane w harmonogramie."""
+
+    __slots__ = ("order_id", "product_id", "quantity", "eta", "delay_days", "is_emergency", "version")
+
+    def __init__(self, order_id: str, product_id: int, quantity: int, eta: Optional[datetime],
+                 delay_days: int = 0, is_emergency: bool = False):
+        self.order_id = order_id
+        self.product_id = product_id
+        self.quantity = quantity
+        self.eta = eta
+        self.delay_days = delay_days
+        self.is_emergency = is_emergency
+        self.version = None
+
+
+class DeliverySchedule:
+    """
+    Kolejka priorytetowa dostaw w drodze kluczowana `estimated_delivery`.
+    Opóźnienie to ponowne wstawienie z nowym kluczem (stare wpisy są pomijane leniwie),
+    a tick zdejmuje tylko zdarzenia faktycznie przypadające na dany dzień.
+    """
+
+    def __init__(self):
+        self._arrivals = []     # (eta, version, order_id)
+        self._delays = []       # (dzień zatoru, seq, order_id)
+        self._by_product = {}   # product_id -> kopiec (eta, version, order_id)
+        self._orders = {}       # order_id -> ScheduledDelivery
+        self._incoming = {}     # product_id -> suma ilości w drodze
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._orders)
+
+    def __contains__(self, order_id: str):
+        return order_id in self._orders
+
+    @classmethod
+    def from_db(cls, db: Session, start: datetime, rng=random) -> "DeliverySchedule":
+        """Odbudowa harmonogramu z tabeli `orders` (np. przy starcie aplikacji)."""
+        schedule = cls()
+        rows = db.query(
+            models.Order.id, models.Order.product_id, models.Order.quantity,
+            models.Order.estimated_delivery, models.Order.delay_days, models.Order.order_type
+        ).filter(models.Order.status == "ordered").order_by(models.Order.id).all()
+        for order_id, product_id, quantity, eta, delay_days, order_type in rows:
+            schedule.add(order_id, product_id, quantity or 0, eta, delay_days or 0,
+                         order_type == "EMERGENCY", start=start, rng=rng)
+        logger.info(f"🗓️ [SCHEDULER] Odbudowano harmonogram: {len(schedule)} dostaw w drodze.")
+        return schedule
+
+    def add(self, order_id: str, product_id: int, quantity: int, eta: Optional[datetime],
+            delay_days: int = 0, is_emergency: bool = False, start: Optional[datetime] = None, rng=random):
+        """
+        Dodaje zamówienie do harmonogramu. Dla transportów bez zapisanego opóźnienia
+        losuje dzień ewentualnego zatoru (rozkład geometryczny = codzienna szansa 15%).
+        """
+        if order_id in self._orders:
+            self.remove(order_id)
+        delivery = ScheduledDelivery(order_id, product_id, quantity, eta, delay_days, is_emergency)
+        self._orders[order_id] = delivery
+        self._incoming[product_id] = self._incoming.get(product_id, 0) + quantity
+        self._push(delivery)
+
+        if eta is not None and delay_days == 0 and not is_emergency and start is not None:
+            days = 1 + int(math.log(1.0 - rng.random()) / math.log(1.0 - DELAY_PROBABILITY))
+            heapq.heappush(self._delays, (start + timedelta(days=days), next(self._seq), order_id))
+
+    def remove(self, order_id: str) -> Optional[ScheduledDelivery]:
+        """Usuwa zamówienie (np. anulowane) - wpisy w kopcach wygasają leniwie."""
+        delivery = self._orders.pop(order_id, None)
+        if delivery is not None:
+            self._incoming[delivery.product_id] -= delivery.quantity
+            if not self._incoming[delivery.product_id]:
+                del self._incoming[delivery.product_id]
+        return delivery
+
+    def pop_delays(self, today: datetime, rng=random) -> list:
+        """Zatory przypadające na dziś: (dostawa, dni opóźnienia). Dostawa dostaje nowy klucz."""
+        delayed = []
+        while self._delays and self._delays[0][0] <= today:
+            _, _, order_id = heapq.heappop(self._delays)
+            delivery = self._orders.get(order_id)
+            if delivery is None or delivery.delay_days:
+                continue
+            delay = rng.randint(*DELAY_RANGE)
+            delivery.delay_days = delay
+            delivery.eta += timedelta(days=delay)
+            self._push(delivery)
+            delayed.append((delivery, delay))
+        return delayed
+
+    def pop_due(self, today: datetime) -> list:
+        """Zdejmuje dostawy z `estimated_delivery <= today` (również spóźnione)."""
+        due = []
+        while self._arrivals and self._arrivals[0][0] <= today:
+            _, version, order_id = heapq.heappop(self._arrivals)
+            delivery = self._orders.get(order_id)
+            if delivery is None or delivery.version != version:
+                continue
+            self.remove(order_id)
+            self.next_delivery(delivery.product_id)
+            due.append(delivery)
+        return due
+
+    def next_delivery(self, product_id: int) -> Optional[datetime]:
+        """Najbliższa dostawa produktu - O(1) po leniwym oczyszczeniu wierzchołka kopca."""
+        heap = self._by_product.get(product_id)
+        while heap:
+            eta, version, order_id = heap[0]
+            delivery = self._orders.get(order_id)
+            if delivery is not None and delivery.version == version:
+                return eta
+            heapq.heappop(heap)
+        return None
+
+    def incoming(self) -> dict:
+        """Ilości w drodze per produkt (utrzymywane przyrostowo)."""
+        return self._incoming
+
+    def export(self) -> dict:
+        """Stan harmonogramu jako tablice NumPy (migawki stanu symulatora)."""
+        orders = list(self._orders.values())
+        pending_delays = [(at, order_id) for at, _, order_id in sorted(self._delays) if order_id in self._orders]
+        return {
+            "order_id": np.array([d.order_id for d in orders], dtype=str),
+            "product_id": np.array([d.product_id for d in orders], dtype=np.int64),
+            "quantity": np.array([d.quantity for d in orders], dtype=np.int64),
+            "eta": np.array([d.eta for d in orders], dtype="datetime64[us]"),
+            "delay_days": np.array([d.delay_days for d in orders], dtype=np.int64),
+            "is_emergency": np.array([d.is_emergency for d in orders], dtype=bool),
+            "delay_at": np.array([at for at, _ in pending_delays], dtype="datetime64[us]"),
+            "delay_order_id": np.array([order_id for _, order_id in pending_delays], dtype=str),
+        }
+
+    @classmethod
+    def restore(cls, data: dict) -> "DeliverySchedule":
+        """Odtworzenie harmonogramu z `export()` - bez ponownych losowań i bez zapytań do bazy."""
+        schedule = cls()
+        etas = data["eta"].astype(object).tolist()
+        for order_id, product_id, quantity, eta, delay_days, is_emergency in zip(
+            data["order_id"].tolist(), data["product_id"].tolist(), data["quantity"].tolist(),
+            etas, data["delay_days"].tolist(), data["is_emergency"].tolist()
+        ):
+            schedule.add(order_id, product_id, quantity, eta, delay_days, is_emergency)
+        for at, order_id in zip(data["delay_at"].astype(object).tolist(), data["delay_order_id"].tolist()):
+            schedule._delays.append((at, next(schedule._seq), order_id))
+        heapq.heapify(schedule._delays)
+        return schedule
+
+    def _push(self, delivery: ScheduledDelivery):
+        # Każde wstawienie dostaje nową wersję - wcześniejsze wpisy tej dostawy stają się nieaktualne
+        delivery.version = next(self._seq)
+        if delivery.eta is None:
+            return
+        entry = (delivery.eta, delivery.version, delivery.order_id)
+        heapq.heappush(self._arrivals, entry)
+        heapq.heappush(self._by_product.setdefault(delivery.product_id, []), entry)
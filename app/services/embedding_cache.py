@@ -0,0 +1,247 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+import numpy as np
+from contextlib import contextmanager
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:  # Windows - bez blokad międzyprocesowych (jeden worker API)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", os.path.join("data", "embeddings"))
+CACHE_FORMAT = 1
+# Kompaktowanie, gdy nieużywane wiersze (usunięte/zmienione produkty) przekroczą ten udział
+COMPACT_RATIO = 0.5
+
+KEY_DTYPE = np.dtype("S40")   # sha1(model + tekst) hex - bajty NUL byłyby obcinane przez dtype "S"
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class EmbeddingCache:
+    """
+    Trwały magazyn wektorów katalogu, kluczowany hashem (nazwa modelu + kodowany tekst).
+    Pliki w katalogu modelu: vectors.<gen>.f32 (macierz float32 mapowana w pamięci),
+    keys.<gen>.bin (tablica kluczy) i meta.json (wymiar, liczba wierszy, generacja).
+    Nowe wektory są dopisywane na końcu plików; meta.json zapisywany jako ostatni,
+    więc przerwany zapis zostawia poprawny (krótszy) magazyn.
+    Kilka procesów (workery uvicorn) współdzieli katalog: zapisy pod wyłączną blokadą pliku `lock`,
+    odczyt meta.json i otwarcie plików generacji pod współdzieloną.
+    """
+
+    def __init__(self, model_name: str, directory: str = CACHE_DIR):
+        self.model_name = model_name
+        self.directory = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        self._lock = threading.Lock()
+        # Słownik klucz -> wiersz i memmap bieżącej generacji; ważne, dopóki meta.json ma tę samą sygnaturę
+        self._key_rows = {}
+        self._vectors = None
+        self._signature = None
+        self.hits = 0
+        self.misses = 0
+
+    # --- PLIKI ---
+    def _path(self, name: str, generation: int, ext: str) -> str:
+        return os.path.join(self.directory, f"{name}.{generation}.{ext}")
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "lock"), "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _read_meta(self) -> dict:
+        path = os.path.join(self.directory, "meta.json")
+        if not os.path.exists(path):
+            return {}
+        with open(path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") != CACHE_FORMAT or meta.get("model") != self.model_name:
+            return {}
+        return meta
+
+    def _write_meta(self, generation: int, rows: int, dim: int):
+        meta = {"format": CACHE_FORMAT, "model": self.model_name, "generation": generation,
+                "rows": rows, "dim": dim}
+        _write_atomic(os.path.join(self.directory, "meta.json"), json.dumps(meta).encode("utf-8"))
+
+    def _open(self, meta: dict):
+        """Klucze (do słownika) i macierz wektorów jako memmap - bez wczytywania całości."""
+        if not meta["rows"]:
+            return np.empty(0, dtype=KEY_DTYPE), self._open_vectors(meta)
+        keys = np.fromfile(self._path("keys", meta["generation"], "bin"), dtype=KEY_DTYPE, count=meta["rows"])
+        return keys, self._open_vectors(meta)
+
+    def _index(self, meta: dict) -> tuple:
+        """
+        Słownik klucz -> wiersz i macierz wektorów. Pliki czytane ponownie tylko, gdy meta.json zmienił się
+        poza tym obiektem (kompaktowanie lub dopisanie przez inny proces) - własne zapisy aktualizują słownik.
+        """
+        signature = (meta.get("generation"), meta.get("rows"), meta.get("dim"))
+        if signature != self._signature:
+            keys, self._vectors = self._open(meta) if meta else (np.empty(0, dtype=KEY_DTYPE), None)
+            self._key_rows = {k: i for i, k in enumerate(keys.tolist())}
+            self._signature = signature
+        elif self._vectors is None and meta:
+            self._vectors = self._open_vectors(meta)
+        return self._key_rows, self._vectors
+
+    def _open_vectors(self, meta: dict):
+        if not meta["rows"]:
+            return np.empty((0, meta["dim"]), dtype=np.float32)
+        return np.memmap(self._path("vectors", meta["generation"], "f32"), dtype=np.float32, mode="r",
+                         shape=(meta["rows"], meta["dim"]))
+
+    def key(self, text: str) -> bytes:
+        return hashlib.sha1(f"{self.model_name}\0{text}".encode("utf-8")).hexdigest().encode("ascii")
+
+    # --- API ---
+    def embed(self, texts: list, encode: Callable, complete: bool = True) -> np.ndarray:
+        """
+        Wektory dla `texts` (float32, wiersz na tekst). Kodowane są tylko teksty bez wpisu
+        w magazynie - `encode(list_of_texts)` wywoływane raz dla wszystkich braków.
+        `complete=False` dla aktualizacji częściowych: `texts` to nie cały katalog,
+        więc brak wpisu nie oznacza, że jest nieaktualny (bez kompaktowania).
+        """
+        with self._lock:
+            with self._file_lock(shared=True):
+                meta, rows, vectors = self._load_index()
+
+            wanted = [self.key(t) for t in texts]
+            missing = {}
+            for k, text in zip(wanted, texts):
+                if k not in rows and k not in missing:
+                    missing[k] = text
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+            fresh = None
+            if missing:
+                logger.info(f"🧠 [AI SEARCH] Kodowanie {len(missing)} nowych/zmienionych opisów "
+                            f"({len(texts) - len(missing)} z magazynu)...")
+                fresh = np.asarray(encode(list(missing.values())), dtype=np.float32)
+                if vectors is not None and fresh.shape[1] != vectors.shape[1]:
+                    return self._rebuild(texts, encode)
+
+            dim = vectors.shape[1] if vectors is not None else (fresh.shape[1] if fresh is not None else 0)
+            result = np.empty((len(texts), dim), dtype=np.float32)
+            cached = np.fromiter((rows.get(k, -1) for k in wanted), dtype=np.int64, count=len(wanted))
+            hit = cached >= 0
+            if hit.any():
+                result[hit] = vectors[cached[hit]]
+            if fresh is not None:
+                new_rows = {k: i for i, k in enumerate(missing)}
+                result[~hit] = fresh[[new_rows[k] for k, h in zip(wanted, hit) if not h]]
+
+            live = set(wanted)
+            stale = sum(1 for k in rows if k not in live) if complete else 0
+            if complete and rows and stale > COMPACT_RATIO * len(rows):
+                with self._file_lock():
+                    self._compact(result, wanted)
+            elif fresh is not None:
+                self._store(list(missing), fresh)
+            return result
+
+    def _load_index(self) -> tuple:
+        meta = self._read_meta()
+        try:
+            rows, vectors = self._index(meta)
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ [AI SEARCH] Uszkodzony magazyn wektorów ({e}) - budowa od nowa.")
+            meta = {}
+            rows, vectors = self._index(meta)
+        return meta, rows, vectors
+
+    def _rebuild(self, texts: list, encode: Callable) -> np.ndarray:
+        """Zmiana wymiaru (inny model pod tą samą nazwą) - pełne przekodowanie."""
+        result = np.asarray(encode(list(texts)), dtype=np.float32)
+        with self._file_lock():
+            self._compact(result, [self.key(t) for t in texts])
+        return result
+
+    def _store(self, keys: list, vectors: np.ndarray):
+        """
+        Dopisanie pod wyłączną blokadą. meta.json czytany ponownie - inny proces mógł w międzyczasie
+        dopisać (te same klucze są pomijane) lub skompaktować magazyn.
+        """
+        with self._file_lock():
+            meta, rows, _ = self._load_index()
+            if meta and meta["dim"] != vectors.shape[1]:
+                return
+            new = [i for i, k in enumerate(keys) if k not in rows]
+            if new:
+                self._append(meta, [keys[i] for i in new], vectors[new])
+
+    def _append(self, meta: dict, keys: list, vectors: np.ndarray):
+        os.makedirs(self.directory, exist_ok=True)
+        generation = meta.get("generation", 0)
+        rows = meta.get("rows", 0)
+        if not meta:
+            # Nowy magazyn: usuwamy ewentualne pozostałości po przerwanym zapisie
+            for name, ext in (("keys", "bin"), ("vectors", "f32")):
+                path = self._path(name, generation, ext)
+                if os.path.exists(path):
+                    os.remove(path)
+        for name, ext, data in (("keys", "bin", np.asarray(keys, dtype=KEY_DTYPE)), ("vectors", "f32", vectors)):
+            path = self._path(name, generation, ext)
+            with open(path, "ab") as f:
+                # Obcięcie ogona po przerwanym dopisywaniu - meta.json zna poprawną długość
+                f.truncate(rows * data.itemsize * (data.shape[1] if data.ndim > 1 else 1))
+                f.write(np.ascontiguousarray(data).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        self._write_meta(generation, rows + len(keys), vectors.shape[1])
+        # Dopisane wiersze trafiają do słownika w pamięci; memmap otwierany ponownie (większy kształt)
+        if not meta:
+            self._key_rows = {}
+        for i, k in enumerate(keys):
+            self._key_rows.setdefault(k, rows + i)
+        self._vectors, self._signature = None, (generation, rows + len(keys), vectors.shape[1])
+
+    def _compact(self, vectors: np.ndarray, keys: list):
+        """
+        Nowa generacja plików tylko z aktualnymi wpisami; stara usuwana po przełączeniu meta
+        (wywołujący trzyma wyłączną blokadę pliku).
+        """
+        old = self._read_meta().get("generation")
+        generation = (old or 0) + 1
+        unique = {}
+        for i, k in enumerate(keys):
+            unique.setdefault(k, i)
+        order = list(unique.values())
+        _write_atomic(self._path("keys", generation, "bin"), np.asarray(list(unique), dtype=KEY_DTYPE).tobytes())
+        _write_atomic(self._path("vectors", generation, "f32"), np.ascontiguousarray(vectors[order]).tobytes())
+        self._write_meta(generation, len(order), vectors.shape[1])
+        self._key_rows = {k: i for i, k in enumerate(unique)}
+        self._vectors, self._signature = None, (generation, len(order), vectors.shape[1])
+        if old is not None and old != generation:
+            for name, ext in (("keys", "bin"), ("vectors", "f32")):
+                path = self._path(name, old, ext)
+                if os.path.exists(path):
+                    os.remove(path)
+        logger.info(f"🗜️ [AI SEARCH] Magazyn wektorów skompaktowany ({len(order)} wpisów).")
+
+    def stats(self) -> dict:
+        meta = self._read_meta()
+        return {"model": self.model_name, "rows": meta.get("rows", 0), "dim": meta.get("dim"),
+                "hits": self.hits, "misses": self.misses}
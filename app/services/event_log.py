@@ -0,0 +1,103 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Optional
+
+EVENT_LOG_SIZE = 1000
+
+
+class EventLog:
+    """
+    Dziennik zdarzeń symulatora: bufor cykliczny z monotonicznymi numerami sekwencyjnymi.
+    Numer wpisu służy jako kursor (SSE `Last-Event-ID`) - klient dostaje wszystko po nim.
+    Zapisy przychodzą z wątku symulatora, odczyty z pętli zdarzeń API.
+    """
+
+    def __init__(self, maxlen: int = EVENT_LOG_SIZE):
+        self._entries = deque(maxlen=maxlen)   # {"id", "kind", "data"}
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._waiters = set()                  # (pętla asyncio, asyncio.Event)
+
+    @property
+    def last_id(self) -> int:
+        return self._next_id - 1
+
+    def append(self, kind: str, data: dict) -> int:
+        """Dopisuje wpis; `data` dostaje pole `id` równe numerowi sekwencyjnemu."""
+        with self._lock:
+            seq = self._next_id
+            self._next_id += 1
+            data["id"] = seq
+            self._entries.append({"id": seq, "kind": kind, "data": data})
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # pętla klienta już zamknięta
+        return seq
+
+    def since(self, last_id: int) -> tuple:
+        """
+        Wpisy o numerze > last_id oraz flaga luki: kursor starszy niż bufor albo nowszy niż ostatni wpis
+        (restart bez aktualnej migawki - numeracja zaczęła się od nowa). Przy kursorze z przyszłości
+        zwracany jest cały bufor.
+        """
+        with self._lock:
+            if last_id > self._next_id - 1:
+                return list(self._entries), True
+            if not self._entries:
+                return [], False
+            gap = last_id < self._entries[0]["id"] - 1
+            # Wyszukiwanie binarne po zapisanych numerach - poprawne także, gdy numeracja ma przerwy
+            start, end = 0, len(self._entries)
+            while start < end:
+                middle = (start + end) // 2
+                if self._entries[middle]["id"] <= last_id:
+                    start = middle + 1
+                else:
+                    end = middle
+            return [self._entries[i] for i in range(start, len(self._entries))], gap
+
+    def recent(self, kind: str, limit: int) -> list:
+        """Ostatnie wpisy danego rodzaju, od najnowszego."""
+        with self._lock:
+            result = []
+            for entry in reversed(self._entries):
+                if entry["kind"] == kind:
+                    result.append(entry["data"])
+                    if len(result) >= limit:
+                        break
+            return result
+
+    def export(self) -> list:
+        with self._lock:
+            return list(self._entries)
+
+    def restore(self, entries: list):
+        """Odtworzenie z migawki - numeracja jest kontynuowana, kursory klientów pozostają ważne."""
+        with self._lock:
+            self._entries.clear()
+            self._entries.extend(entries)
+            if entries:
+                # Numer za ostatnim wpisem migawki: last_id wskazuje istniejący wpis, więc wait() i since() są zgodne
+                self._next_id = entries[-1]["id"] + 1
+
+    async def wait(self, last_id: int, timeout: float) -> bool:
+        """Czeka (bez blokowania pętli) na wpis nowszy niż last_id."""
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = (loop, event)
+        with self._lock:
+            if self.last_id > last_id:
+                return True
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
@@ -0,0 +1,224 @@
+import logging
+import threading
+import numpy as np
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import func, update, insert
+from sqlalchemy.orm import Session
+from app import models, database
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ("product", "supplier")
+# Poniżej tej liczby obserwacji statystyka jest zbyt niepewna - z-score = 0
+MIN_OBSERVATIONS = 5
+Z_CLIP = 50.0
+
+
+class RunningStats:
+    """Średnia i wariancja liczone przyrostowo (algorytm Welforda) dla ilości i ceny jednostkowej."""
+
+    __slots__ = ("count", "mean_quantity", "m2_quantity", "mean_unit_price", "m2_unit_price")
+
+    def __init__(self, count=0, mean_quantity=0.0, m2_quantity=0.0, mean_unit_price=0.0, m2_unit_price=0.0):
+        self.count = count
+        self.mean_quantity = mean_quantity
+        self.m2_quantity = m2_quantity
+        self.mean_unit_price = mean_unit_price
+        self.m2_unit_price = m2_unit_price
+
+    def add(self, quantity: float, unit_price: float):
+        self.count += 1
+        delta = quantity - self.mean_quantity
+        self.mean_quantity += delta / self.count
+        self.m2_quantity += delta * (quantity - self.mean_quantity)
+        delta = unit_price - self.mean_unit_price
+        self.mean_unit_price += delta / self.count
+        self.m2_unit_price += delta * (unit_price - self.mean_unit_price)
+
+    def std(self) -> tuple:
+        if self.count < 2:
+            return 0.0, 0.0
+        return (self.m2_quantity / (self.count - 1)) ** 0.5, (self.m2_unit_price / (self.count - 1)) ** 0.5
+
+    def as_dict(self) -> dict:
+        std_q, std_up = self.std()
+        return {
+            "count": self.count,
+            "mean_quantity": round(self.mean_quantity, 4),
+            "std_quantity": round(std_q, 4),
+            "mean_unit_price": round(self.mean_unit_price, 4),
+            "std_unit_price": round(std_up, 4),
+        }
+
+
+class FeatureStore:
+    """
+    Magazyn cech per produkt i per dostawca, aktualizowany przy każdym wstawieniu zamówienia.
+    Odczyt z-score dla pozycji to O(1) (słownik w pamięci); tabela `order_feature_stats`
+    utrwala stan. Tabela `orders` jest czytana tylko raz - przy pierwszym wypełnieniu magazynu.
+    """
+
+    def __init__(self):
+        self._stats = {scope: {} for scope in SCOPES}
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    @property
+    def ready(self) -> bool:
+        return self._loaded
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def frozen(self) -> "FeatureStore":
+        """Niezależna kopia bieżących statystyk (oznaczona jako wczytana - nigdy nie sięga do bazy)."""
+        self.ensure_loaded()
+        copy = FeatureStore()
+        with self._lock:
+            copy._stats = {scope: {key: RunningStats(s.count, s.mean_quantity, s.m2_quantity,
+                                                     s.mean_unit_price, s.m2_unit_price)
+                                   for key, s in table.items()}
+                           for scope, table in self._stats.items()}
+        copy._loaded = True
+        return copy
+
+    # --- ŁADOWANIE ---
+    def ensure_loaded(self):
+        """Leniwe wczytanie stanu (własna sesja - nie zatwierdza transakcji wywołującego)."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            db = database.SessionLocal()
+            try:
+                self._load(db)
+            finally:
+                db.close()
+            self._loaded = True
+
+    def _load(self, db: Session, commit: bool = True) -> bool:
+        """Wczytanie z tabeli stanu; True, gdy stan zbudowano od zera z tabeli `orders`."""
+        rows = db.query(models.OrderFeatureStat).all()
+        if not rows:
+            self._bootstrap(db, commit)
+            return True
+        stats = {scope: {} for scope in SCOPES}
+        for r in rows:
+            stats[r.scope][r.key] = RunningStats(r.count, r.mean_quantity, r.m2_quantity,
+                                                 r.mean_unit_price, r.m2_unit_price)
+        self._stats = stats
+        return False
+
+    def _bootstrap(self, db: Session, commit: bool = True):
+        """Jednorazowe wypełnienie z agregatów SQL (jeden przebieg GROUP BY, bez ładowania wierszy)."""
+        unit_price = models.Order.total_price / models.Order.quantity
+        stats = {scope: {} for scope in SCOPES}
+        for scope, column in (("product", models.Order.product_id), ("supplier", models.Order.supplier_id)):
+            rows = db.query(
+                column, func.count(), func.avg(models.Order.quantity),
+                func.avg(models.Order.quantity * models.Order.quantity),
+                func.avg(unit_price), func.avg(unit_price * unit_price)
+            ).filter(column.isnot(None), models.Order.quantity > 0).group_by(column).all()
+            for key, n, mq, mq2, mu, mu2 in rows:
+                stats[scope][key] = RunningStats(n, mq, max(0.0, n * (mq2 - mq * mq)), mu, max(0.0, n * (mu2 - mu * mu)))
+        self._stats = stats
+        self._persist(db, {(scope, key) for scope in SCOPES for key in stats[scope]}, new_keys=True)
+        if commit:
+            db.commit()
+        logger.info(f"📐 [FEATURES] Magazyn cech zainicjalizowany: {len(stats['product'])} produktów, "
+                    f"{len(stats['supplier'])} dostawców.")
+
+    def invalidate(self):
+        """Po wycofanej transakcji - stan zostanie ponownie wczytany z tabeli."""
+        with self._lock:
+            self._loaded = False
+
+    # --- AKTUALIZACJA PRZY WSTAWIENIU ZAMÓWIEŃ ---
+    def record(self, db: Session, orders: list):
+        """
+        Aktualizuje statystyki o nowe zamówienia (słowniki z product_id, supplier_id,
+        quantity, total_price). Zapis trafia do tej samej transakcji co insert zamówień.
+        """
+        with self._lock:
+            if not self._loaded:
+                # Transakcja wywołującego trzyma już blokadę zapisu SQLite - druga sesja by na nią czekała.
+                # Stan budowany w tej samej transakcji (bez commit; po rollbacku wywołujący robi invalidate()).
+                db.flush()
+                bootstrapped = self._load(db, commit=False)
+                self._loaded = True
+                if bootstrapped:
+                    return  # agregaty z tabeli `orders` obejmują już wstawione zamówienia
+            touched, new_keys = set(), set()
+            for o in orders:
+                quantity = float(o.get("quantity") or 0)
+                if quantity <= 0:
+                    continue
+                unit_price = float(o.get("total_price") or 0) / quantity
+                for scope, key in (("product", o.get("product_id")), ("supplier", o.get("supplier_id"))):
+                    if key is None:
+                        continue
+                    stats = self._stats[scope].get(key)
+                    if stats is None:
+                        stats = self._stats[scope][key] = RunningStats()
+                        new_keys.add((scope, key))
+                    stats.add(quantity, unit_price)
+                    touched.add((scope, key))
+            if touched:
+                self._persist(db, touched - new_keys)
+                self._persist(db, new_keys, new_keys=True)
+
+    def _persist(self, db: Session, keys: set, new_keys: bool = False):
+        if not keys:
+            return
+        now = datetime.utcnow()
+        rows = []
+        for scope, key in keys:
+            s = self._stats[scope][key]
+            rows.append({"scope": scope, "key": key, "count": s.count,
+                         "mean_quantity": s.mean_quantity, "m2_quantity": s.m2_quantity,
+                         "mean_unit_price": s.mean_unit_price, "m2_unit_price": s.m2_unit_price,
+                         "updated_at": now})
+        if new_keys:
+            db.execute(insert(models.OrderFeatureStat), rows)
+        else:
+            db.execute(update(models.OrderFeatureStat), rows)
+
+    # --- ODCZYT ---
+    def zscores(self, product_ids, quantity, unit_price) -> np.ndarray:
+        """Znormalizowane cechy per produkt: kolumny [z_ilości, z_ceny_jednostkowej]."""
+        self.ensure_loaded()
+        quantity = np.asarray(quantity, dtype=float)
+        unit_price = np.asarray(unit_price, dtype=float)
+        n = len(quantity)
+        mean = np.zeros((n, 2))
+        std = np.zeros((n, 2))
+        table = self._stats["product"]
+        for i, pid in enumerate(product_ids if product_ids is not None else ()):
+            s = table.get(pid) if pid is not None else None
+            if s is not None and s.count >= MIN_OBSERVATIONS:
+                mean[i] = (s.mean_quantity, s.mean_unit_price)
+                std[i] = s.std()
+        values = np.column_stack([quantity, unit_price])
+        z = np.divide(values - mean, std, out=np.zeros((n, 2)), where=std > 0)
+        return np.clip(z, -Z_CLIP, Z_CLIP)
+
+    def get(self, scope: str, key: int) -> Optional[dict]:
+        self.ensure_loaded()
+        stats = self._stats[scope].get(key)
+        return stats.as_dict() if stats is not None else None
+
+    def all(self, scope: str) -> dict:
+        self.ensure_loaded()
+        with self._lock:
+            return {key: stats.as_dict() for key, stats in self._stats[scope].items()}
+
+
+feature_store = FeatureStore()
@@ -0,0 +1,140 @@
+import logging
+import numpy as np
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Liczba losowych wierszy kontrolnych przy eksporcie (porównanie bit w bit ze sklearn)
+VERIFY_ROWS = 512
+# Wiersze przetwarzane naraz przez ewaluator wsadowy
+CHUNK_ROWS = 1024
+
+
+class CompiledForest:
+    """
+    Isolation Forest wyeksportowany do płaskich tablic NumPy: cecha, próg i dzieci
+    dla wszystkich węzłów wszystkich drzew oraz gotowa wartość ścieżki w liściach.
+    Ewaluator przechodzi wszystkie drzewa naraz (poziom po poziomie) - bez walidacji
+    sklearn, joblib i pętli Pythona po estymatorach.
+    """
+
+    def __init__(self, feature, threshold, left, right, leaf_value, roots, max_depth,
+                 denominator: float, offset: float, n_features: int):
+        self.feature = feature        # globalny indeks cechy (liście: 0)
+        self.threshold = threshold    # float64 (liście: +inf)
+        self.left = left              # liście wskazują na siebie
+        self.right = right
+        # Dzieci przeplecione: children[2 * węzeł + (x <= próg)] - jeden gather na poziom
+        self.children = np.stack([right, left], axis=1).ravel()
+        self.leaf_value = leaf_value  # głębokość ścieżki + c(n_liścia) - 1
+        self.roots = roots            # indeks korzenia każdego drzewa
+        self.max_depth = max_depth
+        self.denominator = denominator
+        self.offset = offset
+        self.n_features_in_ = n_features
+
+    @classmethod
+    def from_sklearn(cls, model) -> "CompiledForest":
+        from sklearn.ensemble._iforest import _average_path_length
+
+        n_features = model.n_features_in_
+        subsample = model._max_features != n_features
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for tree, tree_features in zip(model.estimators_, model.estimators_features_):
+            t = tree.tree_
+            n = t.node_count
+            is_leaf = t.children_left == -1
+
+            # Długość ścieżki decyzji = głębokość węzła + 1 (korzeń liczony jak w sklearn)
+            path_length = np.zeros(n, dtype=np.int64)
+            path_length[0] = 1
+            for node in range(n):
+                if not is_leaf[node]:
+                    path_length[t.children_left[node]] = path_length[node] + 1
+                    path_length[t.children_right[node]] = path_length[node] + 1
+            max_depth = max(max_depth, int(path_length.max()) - 1)
+
+            feature = np.where(is_leaf, 0, t.feature).astype(np.int64)
+            if subsample:
+                feature = np.asarray(tree_features, dtype=np.int64)[feature]
+            node_ids = np.arange(n, dtype=np.int64) + offset
+            features.append(feature)
+            thresholds.append(np.where(is_leaf, np.inf, t.threshold))
+            lefts.append(np.where(is_leaf, node_ids, t.children_left + offset))
+            rights.append(np.where(is_leaf, node_ids, t.children_right + offset))
+            # Ta sama kolejność działań co w sklearn: (ścieżka + c(n)) - 1.0
+            values.append(path_length + _average_path_length(t.n_node_samples) - 1.0)
+            roots.append(offset)
+            offset += n
+
+        denominator = len(model.estimators_) * _average_path_length([model._max_samples])[0]
+        return cls(np.concatenate(features), np.concatenate(thresholds), np.concatenate(lefts),
+                   np.concatenate(rights), np.concatenate(values), np.asarray(roots, dtype=np.int64),
+                   max_depth, float(denominator), float(model.offset_), n_features)
+
+    def _depths(self, X: np.ndarray) -> np.ndarray:
+        n, n_features = X.shape
+        flat = X.ravel()
+        offsets = np.arange(n) * n_features
+        node = np.repeat(self.roots[:, None], n, axis=1)   # (drzewa, wiersze)
+        for _ in range(self.max_depth):
+            go_left = flat[self.feature[node] + offsets] <= self.threshold[node]
+            node = self.children[2 * node + go_left]
+        # cumsum sumuje drzewa po kolei - ta sama kolejność dodawania co w sklearn
+        return np.cumsum(self.leaf_value[node], axis=0)[-1]
+
+    def score_samples(self, X) -> np.ndarray:
+        # sklearn porównuje próbki rzutowane na float32 z progami float64
+        X = np.ascontiguousarray(np.asarray(X, dtype=np.float32), dtype=np.float64)
+        n = X.shape[0]
+        if not n or not len(self.roots):
+            depths = np.zeros(n)
+        else:
+            # Paczki wierszy mieszczące się w cache - stały koszt pamięci dla dużych wsadów
+            depths = np.concatenate([self._depths(X[i:i + CHUNK_ROWS]) for i in range(0, n, CHUNK_ROWS)])
+        if self.denominator != 0:
+            scores = 2 ** (-(depths / self.denominator))
+        else:
+            scores = np.ones(n)
+        return -scores
+
+    def decision_function(self, X) -> np.ndarray:
+        return self.score_samples(X) - self.offset
+
+    def predict(self, X) -> np.ndarray:
+        return np.where(self.decision_function(X) < 0, -1, 1)
+
+
+def _probe_rows(compiled: CompiledForest, rng: np.random.Generator) -> np.ndarray:
+    """Wiersze kontrolne: wartości na progach, tuż obok nich i losowe z zakresu cech."""
+    internal = np.isfinite(compiled.threshold)
+    columns = []
+    for f in range(compiled.n_features_in_):
+        t = compiled.threshold[internal & (compiled.feature == f)]
+        if not len(t):
+            t = np.zeros(1)
+        picks = rng.choice(t, VERIFY_ROWS)
+        jitter = rng.choice([-1.0, 0.0, 1.0], VERIFY_ROWS) * rng.uniform(0, np.abs(picks).max() * 0.01 + 1e-6, VERIFY_ROWS)
+        columns.append(np.where(rng.random(VERIFY_ROWS) < 0.5, picks, picks + jitter))
+    return np.column_stack(columns)
+
+
+def compile_forest(model, seed: int = 0) -> Optional[CompiledForest]:
+    """
+    Eksport modelu z weryfikacją: skompilowany ewaluator jest używany tylko wtedy,
+    gdy na wierszach kontrolnych daje wyniki identyczne (bit w bit) z sklearn.
+    """
+    try:
+        compiled = CompiledForest.from_sklearn(model)
+        X = _probe_rows(compiled, np.random.default_rng(seed))
+        expected = model.decision_function(X)
+        actual = compiled.decision_function(X)
+        if not np.array_equal(expected, actual):
+            diff = float(np.max(np.abs(expected - actual)))
+            logger.warning(f"⚠️ [AI SECURITY] Ewaluator niezgodny ze sklearn (max różnica {diff:.3e}) - używam sklearn.")
+            return None
+        return compiled
+    except Exception as e:
+        logger.warning(f"⚠️ [AI SECURITY] Eksport lasu nieudany ({e}) - używam sklearn.")
+        return None
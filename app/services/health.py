@@ -0,0 +1,81 @@
+import time
+import logging
+import threading
+from sqlalchemy import text
+from app import models, database
+from app.services.ai_search import ai_search
+from app.services.anomaly_detector import anomaly_detector
+from app.services.feature_store import feature_store
+
+logger = logging.getLogger(__name__)
+
+STARTED_AT = time.time()
+_warmup_thread = None
+warmup_state = {"state": "pending", "started_at": None, "finished_at": None}
+
+
+def _warm_up():
+    warmup_state.update(state="running", started_at=time.time())
+    try:
+        logger.info("🔥 [SYSTEM] Rozgrzewka modułów AI w tle...")
+        anomaly_detector.ensure_loaded()
+        feature_store.ensure_loaded()
+        db = database.SessionLocal()
+        try:
+            products = db.query(models.Product).all()
+        finally:
+            db.close()
+        ai_search.warm_up(products)
+        warmup_state["state"] = "done"
+        logger.info("✅ [SYSTEM] Moduły AI gotowe.")
+    except Exception as e:
+        warmup_state["state"] = "failed"
+        logger.error(f"❌ [SYSTEM] Błąd rozgrzewki: {e}")
+    finally:
+        warmup_state["finished_at"] = time.time()
+
+
+def start_warm_up():
+    """Ładowanie modeli poza ścieżką startu - API obsługuje żądania od razu."""
+    global _warmup_thread
+    if _warmup_thread is None or not _warmup_thread.is_alive():
+        _warmup_thread = threading.Thread(target=_warm_up, name="ai-warmup", daemon=True)
+        _warmup_thread.start()
+
+
+def _database_ready() -> bool:
+    db = database.SessionLocal()
+    try:
+        db.execute(text("SELECT 1"))
+        return True
+    except Exception:
+        return False
+    finally:
+        db.close()
+
+
+def readiness(simulator) -> dict:
+    """
+    Gotowość per komponent. Baza i detektor anomalii są wymagane (audyt zamówień);
+    wyszukiwanie semantyczne jest opcjonalne - bez niego API działa w trybie ograniczonym.
+    """
+    components = {
+        "database": {"ready": _database_ready(), "required": True},
+        "anomaly_detector": {"ready": anomaly_detector.ready, "required": True,
+                             "model_version": anomaly_detector.version},
+        "feature_store": {"ready": feature_store.ready, "required": False},
+        "ai_search": {"ready": ai_search.state == "ready", "required": False,
+                      "state": ai_search.state, "error": ai_search.error,
+                      "embedding_cache": ai_search.embedding_cache.stats(), "index": ai_search.index_stats(),
+                      "query_cache": ai_search.query_encoder.stats()},
+        "simulator": {"ready": simulator._worker is not None and simulator._worker.is_alive(), "required": False},
+    }
+    required_ok = all(c["ready"] for c in components.values() if c["required"])
+    all_ok = all(c["ready"] for c in components.values())
+    return {
+        "status": "ready" if all_ok else ("degraded" if required_ok else "starting"),
+        "ready": required_ok,
+        "uptime_s": round(time.time() - STARTED_AT, 1),
+        "warmup": dict(warmup_state),
+        "components": components,
+    }
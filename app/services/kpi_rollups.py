@@ -0,0 +1,200 @@
+import logging
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# Typy zamówień liczone jako "Optymalizacja Kosztów" ('' = brak typu w starych rekordach)
+COST_ORDER_TYPES = ("KOSZT", "KOSZT/JIT", "")
+# Sumy przechowywane jako liczby całkowite w 1/10000 PLN - ceny awaryjne (x1.5) mają części grosza,
+# a przyrosty +/- na liczbach całkowitych nie kumulują błędów zaokrągleń float
+TOTAL_SCALE = 10000
+
+
+def _fixed(amount_sql: str) -> str:
+    return f"CAST(round({amount_sql} * {TOTAL_SCALE}) AS INTEGER)"
+
+
+def _bump(key_sql: str, count_sql: str, total_sql: str, metric: str) -> str:
+    return ("INSERT INTO kpi_rollups(metric, key, count, total) "
+            f"VALUES ('{metric}', {key_sql}, {count_sql}, {total_sql}) "
+            "ON CONFLICT(metric, key) DO UPDATE SET count = count + excluded.count, total = total + excluded.total;")
+
+
+def _order_delta(row: str, sign: int) -> str:
+    total = f"{sign} * {_fixed(f'coalesce({row}.total_price, 0)')}"
+    return (_bump(f"coalesce({row}.status, '')", str(sign), total, "status")
+            + _bump(f"coalesce({row}.order_type, '')", str(sign), total, "order_type"))
+
+
+def _volume_delta(row: str, sign: int) -> str:
+    # Zamówienia bez produktu lub daty nie trafiają do okien trendów
+    return ("INSERT INTO product_daily_volume(product_id, day, quantity, orders) "
+            f"SELECT {row}.product_id, date({row}.created_at), {sign} * coalesce({row}.quantity, 0), {sign} "
+            f"WHERE {row}.product_id IS NOT NULL AND {row}.created_at IS NOT NULL "
+            "ON CONFLICT(product_id, day) DO UPDATE SET quantity = quantity + excluded.quantity, "
+            "orders = orders + excluded.orders;"
+            + ("" if sign > 0 else
+               f"DELETE FROM product_daily_volume WHERE product_id = {row}.product_id "
+               f"AND day = date({row}.created_at) AND orders <= 0;"))
+
+
+def _stock_value(row: str = "") -> str:
+    return f"coalesce({row}current_stock, 0) * coalesce({row}unit_cost, 0)"
+
+
+def _low_stock(row: str = "") -> str:
+    # To samo kryterium co na dashboardzie: dni zapasu <= max(1.5, 30% czasu dostawy)
+    return (f"(coalesce({row}current_stock, 0) * 1.0 / max(coalesce({row}average_daily_consumption, 0), 0.5) "
+            f"<= max(1.5, coalesce(nullif({row}lead_time_days, 0), 7) * 0.3))")
+
+
+def _product_delta(row: str, sign: int) -> str:
+    return (_bump("'value'", str(sign), f"{sign} * {_fixed(_stock_value(row + '.'))}", "inventory")
+            + _bump("'low_stock'", f"{sign} * {_low_stock(row + '.')}", "0", "inventory"))
+
+
+# Znacznik zbiorczego zapisu ticku symulacji (istnieje tylko wewnątrz jego transakcji) - wyzwalacz
+# produktów go pomija, a KPI magazynu ustawia na końcu set_inventory
+_BULK_MARKER = "NOT EXISTS (SELECT 1 FROM kpi_rollups WHERE metric = 'inventory' AND key = 'bulk')"
+
+# Wyzwalacze: zamówienia - każda zmiana statusu/typu/kwoty i dzienne wolumeny per produkt;
+# produkty - wstawienie, usunięcie i edycja stanu, zużycia, ceny lub czasu dostawy (poza zapisem ticku).
+_TRIGGERS = (
+    ("kpi_orders_ai", f"CREATE TRIGGER kpi_orders_ai AFTER INSERT ON orders BEGIN {_order_delta('new', 1)} END"),
+    ("kpi_orders_ad", f"CREATE TRIGGER kpi_orders_ad AFTER DELETE ON orders BEGIN {_order_delta('old', -1)} END"),
+    ("kpi_orders_au", "CREATE TRIGGER kpi_orders_au AFTER UPDATE OF status, order_type, total_price ON orders BEGIN "
+                      f"{_order_delta('old', -1)} {_order_delta('new', 1)} END"),
+    ("kpi_volume_ai", f"CREATE TRIGGER kpi_volume_ai AFTER INSERT ON orders BEGIN {_volume_delta('new', 1)} END"),
+    ("kpi_volume_ad", f"CREATE TRIGGER kpi_volume_ad AFTER DELETE ON orders BEGIN {_volume_delta('old', -1)} END"),
+    ("kpi_volume_au", "CREATE TRIGGER kpi_volume_au AFTER UPDATE OF product_id, quantity, created_at ON orders BEGIN "
+                      f"{_volume_delta('old', -1)} {_volume_delta('new', 1)} END"),
+    ("kpi_products_ai", f"CREATE TRIGGER kpi_products_ai AFTER INSERT ON products BEGIN {_product_delta('new', 1)} END"),
+    ("kpi_products_ad", f"CREATE TRIGGER kpi_products_ad AFTER DELETE ON products BEGIN {_product_delta('old', -1)} END"),
+    ("kpi_products_au", "CREATE TRIGGER kpi_products_au AFTER UPDATE OF current_stock, average_daily_consumption, "
+                        f"unit_cost, lead_time_days ON products WHEN {_BULK_MARKER} BEGIN "
+                        f"{_product_delta('old', -1)} {_product_delta('new', 1)} END"),
+)
+
+# Pełne przeliczenie z tabel źródłowych (jeden przebieg GROUP BY na metrykę)
+_ORDER_AGGREGATES = (
+    f"SELECT 'status', coalesce(status, ''), count(*), coalesce(sum({_fixed('coalesce(total_price, 0)')}), 0) "
+    "FROM orders GROUP BY 2",
+    f"SELECT 'order_type', coalesce(order_type, ''), count(*), coalesce(sum({_fixed('coalesce(total_price, 0)')}), 0) "
+    "FROM orders GROUP BY 2",
+)
+_INVENTORY = (
+    f"SELECT 'inventory', 'value', count(*), coalesce(sum({_fixed(_stock_value())}), 0) FROM products",
+    f"SELECT 'inventory', 'low_stock', coalesce(sum({_low_stock()}), 0), 0 FROM products",
+)
+_AGGREGATES = _ORDER_AGGREGATES + _INVENTORY
+
+_available = False
+
+
+def ensure_rollups(engine) -> bool:
+    """
+    Tworzy wyzwalacze utrzymujące tabele `kpi_rollups` i `product_daily_volume`. Gdy czegoś brakuje (nowa baza,
+    recreate_db.py, dane wgrane skryptem bez wyzwalaczy) lub definicja się zmieniła - pełne przeliczenie z historii.
+    """
+    global _available
+    if engine.dialect.name != "sqlite":
+        return False
+    try:
+        with engine.begin() as conn:
+            existing = dict(conn.execute(text(
+                "SELECT name, sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'kpi_%'")).all())
+            missing = [(name, ddl) for name, ddl in _TRIGGERS if existing.get(name) != ddl]
+            for name, ddl in missing:
+                if name in existing:
+                    conn.execute(text(f"DROP TRIGGER {name}"))
+                conn.execute(text(ddl))
+            if missing:
+                rebuild(conn)
+                logger.info("📊 [KPI] Agregaty dashboardu i dzienne wolumeny przeliczone z historii zamówień.")
+        _available = True
+    except Exception as e:
+        logger.warning(f"⚠️ [KPI] Agregaty przyrostowe niedostępne ({e}) - KPI liczone zapytaniami.")
+        _available = False
+    return _available
+
+
+def rebuild(conn):
+    conn.execute(text("DELETE FROM kpi_rollups"))
+    for select in _AGGREGATES:
+        conn.execute(text(f"INSERT INTO kpi_rollups(metric, key, count, total) {select}"))
+    conn.execute(text("DELETE FROM product_daily_volume"))
+    conn.execute(text(
+        "INSERT INTO product_daily_volume(product_id, day, quantity, orders) "
+        "SELECT product_id, date(created_at), coalesce(sum(quantity), 0), count(*) FROM orders "
+        "WHERE product_id IS NOT NULL AND created_at IS NOT NULL GROUP BY 1, 2"))
+
+
+class KpiTotals:
+    """Odczyt agregatów: liczba i suma (w złotych) dla metryki i jednego lub kilku kluczy."""
+
+    def __init__(self, rows):
+        self._rows = {(metric, key): (count or 0, int(total or 0)) for metric, key, count, total in rows}
+
+    def count(self, metric: str, *keys) -> int:
+        return sum(self._rows.get((metric, k), (0, 0))[0] for k in keys)
+
+    def total(self, metric: str, *keys) -> float:
+        return sum(self._rows.get((metric, k), (0, 0))[1] for k in keys) / TOTAL_SCALE
+
+    def keys(self, metric: str) -> list:
+        return [k for m, k in self._rows if m == metric]
+
+
+def read_totals(db: Session) -> KpiTotals:
+    """Kilkanaście wierszy tabeli agregatów (O(1) względem historii); bez wyzwalaczy - zapytania GROUP BY."""
+    if _available:
+        return KpiTotals(db.execute(text("SELECT metric, key, count, total FROM kpi_rollups")))
+    return KpiTotals(row for select in _AGGREGATES for row in db.execute(text(select)))
+
+
+def suspend_inventory(db: Session):
+    """
+    Początek zbiorczego zapisu stanów (tick symulacji): wyzwalacz produktów pomija wiersze
+    - wiersz po wierszu byłoby to kilka razy wolniej. Zamyka go set_inventory w tej samej transakcji.
+    """
+    if _available:
+        db.execute(text("INSERT OR IGNORE INTO kpi_rollups(metric, key, count, total) VALUES ('inventory', 'bulk', 0, 0)"))
+
+
+def set_inventory(db: Session):
+    """
+    KPI magazynu po zbiorczym zapisie stanów: przeliczone z tabeli `products` (jeden przebieg),
+    więc obejmują też produkty i zmiany zapisane przez API w trakcie ticku / fast-forward.
+    """
+    if not _available:
+        return
+    db.execute(text("DELETE FROM kpi_rollups WHERE metric = 'inventory' AND key = 'bulk'"))
+    for select in _INVENTORY:
+        # WHERE true - wymagane przez SQLite dla INSERT ... SELECT z ON CONFLICT
+        db.execute(text(f"INSERT INTO kpi_rollups(metric, key, count, total) {select} WHERE true "
+                        "ON CONFLICT(metric, key) DO UPDATE SET count = excluded.count, total = excluded.total"))
+
+
+def growing_products(db: Session, recent_date, past_date, min_past: float, growth: float) -> list:
+    """
+    Produkty z rosnącym zużyciem: (nazwa, wolumen od recent_date, wolumen past_date..recent_date),
+    wg id produktu. Okna liczone sumą po dziennych agregatach (z dokładnością do dnia).
+    """
+    if _available:
+        recent_day, past_day = recent_date.strftime("%Y-%m-%d"), past_date.strftime("%Y-%m-%d")
+        source = ("SELECT product_id, "
+                  "sum(CASE WHEN day >= :recent THEN quantity ELSE 0 END) AS recent, "
+                  "sum(CASE WHEN day < :recent THEN quantity ELSE 0 END) AS past "
+                  "FROM product_daily_volume WHERE day >= :past GROUP BY product_id")
+        params = {"recent": recent_day, "past": past_day}
+    else:
+        source = ("SELECT product_id, "
+                  "sum(CASE WHEN created_at >= :recent THEN quantity ELSE 0 END) AS recent, "
+                  "sum(CASE WHEN created_at < :recent THEN quantity ELSE 0 END) AS past "
+                  "FROM orders WHERE created_at >= :past GROUP BY product_id")
+        params = {"recent": recent_date, "past": past_date}
+    return db.execute(text(
+        f"SELECT p.name, v.recent, v.past FROM ({source}) v JOIN products p ON p.id = v.product_id "
+        "WHERE v.past > :min_past AND v.recent > v.past * :growth ORDER BY p.id"),
+        dict(params, min_past=min_past, growth=growth)).all()
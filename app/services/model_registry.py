@@ -0,0 +1,107 @@
+import os
+import re
+import json
+import logging
+import joblib
+from datetime import datetime
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.getenv("ANOMALY_MODEL_DIR", os.path.join("data", "models", "anomaly"))
+MODEL_KEEP = int(os.getenv("ANOMALY_MODEL_KEEP", "10"))
+
+_ARTIFACT_RE = re.compile(r"^anomaly_v(\d{4,})\.pkl$")
+
+
+def _write_atomic(path: str, write):
+    """Zapis do pliku tymczasowego + os.replace - czytelnik widzi starą albo nową wersję, nigdy połowę."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ModelRegistry:
+    """
+    Wersjonowane artefakty modelu detekcji anomalii:
+    anomaly_vNNNN.pkl + anomaly_vNNNN.json (metadane) oraz wskaźnik current.json.
+    Artefakty są niezmienne - aktywacja i rollback zmieniają wyłącznie wskaźnik.
+    Wskaźnik ustawiony ręcznie (rollback, aktywacja wersji przez operatora) jest przypięty -
+    retrening w tle rejestruje wtedy nowe wersje tylko jako kandydatów.
+    """
+
+    def __init__(self, directory: str = MODEL_DIR, keep: int = MODEL_KEEP):
+        self.directory = directory
+        self.keep = keep
+
+    def _path(self, version: int, ext: str) -> str:
+        return os.path.join(self.directory, f"anomaly_v{version:04d}.{ext}")
+
+    def versions(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        found = (_ARTIFACT_RE.match(name) for name in os.listdir(self.directory))
+        return sorted(int(m.group(1)) for m in found if m)
+
+    def metadata(self, version: int) -> dict:
+        with open(self._path(version, "json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def _pointer(self) -> dict:
+        pointer = os.path.join(self.directory, "current.json")
+        if not os.path.exists(pointer):
+            return {}
+        with open(pointer, encoding="utf-8") as f:
+            return json.load(f)
+
+    def current_version(self) -> Optional[int]:
+        return self._pointer().get("version")
+
+    def is_pinned(self) -> bool:
+        return bool(self._pointer().get("pinned"))
+
+    def latest_metadata(self) -> dict:
+        """Metadane najnowszej wersji (także nieaktywowanego kandydata) - podstawa wyzwalaczy retreningu."""
+        versions = self.versions()
+        return self.metadata(versions[-1]) if versions else {}
+
+    def save(self, model, meta: dict) -> int:
+        """Zapisuje nową wersję (bez aktywacji) i zwraca jej numer."""
+        os.makedirs(self.directory, exist_ok=True)
+        versions = self.versions()
+        version = (versions[-1] + 1) if versions else 1
+        meta = dict(meta, version=version, saved_at=datetime.now().isoformat(timespec="seconds"))
+        # Najpierw metadane, potem model - artefakt jest widoczny dopiero gdy jest kompletny
+        _write_atomic(self._path(version, "json"), lambda f: f.write(json.dumps(meta, indent=2).encode("utf-8")))
+        _write_atomic(self._path(version, "pkl"), lambda f: joblib.dump(model, f))
+        return version
+
+    def load(self, version: int):
+        return joblib.load(self._path(version, "pkl")), self.metadata(version)
+
+    def activate(self, version: int, pinned: bool = False):
+        if version not in self.versions():
+            raise ValueError(f"Brak wersji modelu: {version}")
+        pointer = os.path.join(self.directory, "current.json")
+        payload = {"version": version, "pinned": pinned, "activated_at": datetime.now().isoformat(timespec="seconds")}
+        _write_atomic(pointer, lambda f: f.write(json.dumps(payload).encode("utf-8")))
+        self.prune()
+
+    def previous_version(self) -> Optional[int]:
+        current = self.current_version()
+        older = [v for v in self.versions() if current is None or v < current]
+        return older[-1] if older else None
+
+    def prune(self):
+        """Usuwa najstarsze wersje ponad limit (aktywna wersja nigdy nie jest usuwana)."""
+        current = self.current_version()
+        for version in self.versions()[:-self.keep]:
+            if version == current:
+                continue
+            for ext in ("pkl", "json"):
+                path = self._path(version, ext)
+                if os.path.exists(path):
+                    os.remove(path)
@@ -0,0 +1,194 @@
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from app import models, database
+from app.services.anomaly_detector import (
+    anomaly_detector, feature_matrix, fit_model, training_metadata, MIN_SAMPLES_FOR_TRAINING, FEATURE_VERSION
+)
+from app.services.model_registry import ModelRegistry
+from app.services.feature_store import feature_store
+
+logger = logging.getLogger(__name__)
+
+# Wyzwalacze retreningu: co N godzin lub po M nowych dostarczonych zamówieniach
+RETRAIN_INTERVAL_HOURS = float(os.getenv("ANOMALY_RETRAIN_INTERVAL_HOURS", "24"))
+RETRAIN_AFTER_ORDERS = int(os.getenv("ANOMALY_RETRAIN_AFTER_ORDERS", "500"))
+CHECK_INTERVAL = float(os.getenv("ANOMALY_RETRAIN_CHECK_SECONDS", "60"))
+# Proces treningu bez fork() z wielowątkowego API (forkserver nie istnieje na Windows - tam spawn)
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+# Powód retreningu modelu na nieaktualnej definicji cech - aktywowany mimo przypięcia
+STALE_FEATURES = "nieaktualne cechy"
+# Zamówienia zaakceptowane przez proces - próbka "normalnych" zakupów
+TRAINING_STATUSES = ("ordered", "delivered")
+
+
+def delivered_count(db) -> int:
+    return db.query(func.count(models.Order.id)).filter(models.Order.status == "delivered").scalar() or 0
+
+
+def train_from_db(database_url: str, registry_dir: str, trigger: str) -> Optional[int]:
+    """
+    Zadanie procesu roboczego: odczyt historii, trening nowej instancji i zapis wersji
+    do rejestru (bez aktywacji - podmiany dokonuje proces API po zakończeniu).
+    """
+    started = time.perf_counter()
+    engine = create_engine(database_url)
+    db = sessionmaker(bind=engine)()
+    try:
+        rows = db.query(models.Order.quantity, models.Order.total_price, models.Order.product_id).filter(
+            models.Order.status.in_(TRAINING_STATUSES)
+        ).all()
+        delivered = delivered_count(db)
+    finally:
+        db.close()
+        engine.dispose()
+
+    if len(rows) < MIN_SAMPLES_FOR_TRAINING:
+        return None
+    # Proces puli żyje dłużej niż jeden trening - aktualny stan magazynu cech czytamy z tabeli
+    feature_store.invalidate()
+    X = feature_matrix([r[0] or 0 for r in rows], [r[1] or 0 for r in rows], [r[2] for r in rows], per_product=True)
+    model = fit_model(X)
+    meta = training_metadata(X, started, trigger=trigger, delivered_orders=delivered)
+    return ModelRegistry(registry_dir).save(model, meta)
+
+
+class ModelRetrainer:
+    """
+    Retrening modelu anomalii w osobnym procesie (nie blokuje tworzenia zamówień).
+    Wątek nadzorcy sprawdza wyzwalacze; gotowa wersja jest aktywowana atomowo,
+    chyba że operator przypiął wersję (rollback / ręczna aktywacja) - wtedy zostaje kandydatem.
+    """
+
+    def __init__(self, detector=anomaly_detector):
+        self.detector = detector
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._running: Optional[Future] = None
+        self._reason = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_trained_at = None
+        self.last_delivered = None
+        self.last_error = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name="anomaly-retrainer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def trigger(self, reason: str = "manual") -> bool:
+        """Zleca trening w tle; False gdy poprzedni jeszcze trwa."""
+        with self._lock:
+            if self._running is not None and not self._running.done():
+                return False
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context(START_METHOD))
+            logger.info(f"🔄 [AI SECURITY] Retrening w tle ({reason})...")
+            self._reason = reason
+            self._running = self._executor.submit(
+                train_from_db, database.SQLALCHEMY_DATABASE_URL, self.detector.registry.directory, reason
+            )
+            self._running.add_done_callback(self._on_trained)
+            return True
+
+    def _on_trained(self, future: Future):
+        self.last_trained_at = datetime.now()
+        try:
+            version = future.result()
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"❌ [AI SECURITY] Błąd retreningu: {e}")
+            return
+        if version is None:
+            logger.warning("⚠️ [AI SECURITY] Za mało danych do retreningu.")
+            return
+        self.last_delivered = self.detector.registry.metadata(version).get("delivered_orders", self.last_delivered)
+        # Przypięcie operatora zdejmuje tylko ręcznie zlecony retrening (lub wymiana modelu na starych cechach)
+        if self._reason not in ("manual", STALE_FEATURES) and self.detector.registry.is_pinned():
+            logger.info(f"📌 [AI SECURITY] v{version} zapisana jako kandydat - aktywna wersja przypięta przez operatora.")
+            self.last_error = None
+            return
+        try:
+            self.detector.activate(version)
+            self.last_error = None
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"❌ [AI SECURITY] Błąd aktywacji v{version}: {e}")
+
+    def _due(self, delivered: int) -> Optional[str]:
+        # Wyzwalacze liczone od najnowszej wersji w rejestrze, nie od aktywnej - po rollbacku
+        # starsza aktywna wersja nie wymusza natychmiastowego retreningu
+        self.detector.ensure_loaded()
+        if self.detector.stale_features:
+            return STALE_FEATURES
+        latest = self.detector.registry.latest_metadata() or self.detector.metadata
+        if self.last_delivered is None:
+            self.last_delivered = latest.get("delivered_orders", delivered)
+        if delivered - self.last_delivered >= RETRAIN_AFTER_ORDERS:
+            return f"{delivered - self.last_delivered} nowych dostaw"
+        trained_at = latest.get("trained_at")
+        last = self.last_trained_at or (datetime.fromisoformat(trained_at) if trained_at else None)
+        if last is None or (datetime.now() - last).total_seconds() >= RETRAIN_INTERVAL_HOURS * 3600:
+            return "harmonogram"
+        return None
+
+    def _watch(self):
+        while not self._stop.wait(CHECK_INTERVAL):
+            db = database.SessionLocal()
+            try:
+                reason = self._due(delivered_count(db))
+            except Exception as e:
+                logger.error(f"❌ [AI SECURITY] Błąd sprawdzania wyzwalaczy: {e}")
+                reason = None
+            finally:
+                db.close()
+            if reason:
+                self.trigger(reason)
+
+    def status(self) -> dict:
+        registry = self.detector.registry
+        versions = []
+        for version in reversed(registry.versions()):
+            try:
+                meta = registry.metadata(version)
+            except Exception:
+                continue
+            versions.append({
+                "version": version,
+                "trained_at": meta.get("trained_at"),
+                "training_rows": meta.get("training_rows"),
+                "trigger": meta.get("trigger"),
+                "feature_version": meta.get("feature_version", 1),
+                "active": version == self.detector.version,
+            })
+        return {
+            "active_version": self.detector.version,
+            "compiled_evaluator": self.detector.ready and self.detector.compiled,
+            "pinned": registry.is_pinned(),
+            "feature_version": FEATURE_VERSION,
+            "stale_features": self.detector.ready and self.detector.stale_features,
+            "training": self._running is not None and not self._running.done(),
+            "last_trained_at": self.last_trained_at.isoformat(timespec="seconds") if self.last_trained_at else None,
+            "last_error": self.last_error,
+            "versions": versions,
+        }
+
+
+model_retrainer = ModelRetrainer()
@@ -0,0 +1,283 @@
+import os
+import time
+import logging
+import multiprocessing
+import numpy as np
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from sqlalchemy.orm import Session
+from app.services.simulation_engine import (
+    CatalogArrays, InTransitOrders, load_pending_quantities,
+    DEFAULT_UNIT_PRICE, EMERGENCY_THRESHOLD_DAYS, ROP_BUFFER_MULTIPLIER, EMERGENCY_PRICE_MULTIPLIER,
+    SPIKE_PROBABILITY, SPIKE_RANGE, DELAY_PROBABILITY, DELAY_RANGE, to_datetime64, DAY
+)
+
+logger = logging.getLogger(__name__)
+
+# Parametry modelu stochastycznego - wspólne z LogisticsSimulator (simulation_engine, delivery_schedule)
+EMERGENCY_LOOKAHEAD = 8
+
+# Budżet pamięci jednej paczki replikacji (elementy macierzy harmonogramu dostaw)
+CHUNK_CELLS = 2_000_000
+# Poniżej tej liczby komórek (replikacje x produkty x dni) liczymy w procesie API
+INLINE_CELLS = 2_000_000
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+# Procesy puli bez fork() z wielowątkowego API (wątki symulatora, retreningu, blokady SQLAlchemy);
+# forkserver nie istnieje na Windows - tam spawn
+START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _pipeline_length(state: "ForkedState", horizon: int, delay_days: int) -> int:
+    """Liczba dni w harmonogramie dostaw (horyzont + najdłuższy możliwy transport)."""
+    return horizon + int(state.lead_time.max(initial=0)) + delay_days + DELAY_RANGE[1] + 2
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=multiprocessing.get_context(START_METHOD))
+    return _executor
+
+
+def shutdown_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+class ForkedState:
+    """
+    Kopia stanu bliźniaka (produkty + dostawy w drodze) jako zwykłe tablice.
+    Obiekt jest picklowalny - trafia bez zmian do procesów puli.
+    """
+
+    def __init__(self, catalog: CatalogArrays, transit: InTransitOrders, pending_qty: np.ndarray, current_date: datetime):
+        self.ids = catalog.ids.copy()
+        self.names = list(catalog.names)
+        self.stock = catalog.stock.copy()
+        self.ema = catalog.ema.copy()
+        self.lead_time = catalog.lead_time.copy()
+        self.unit_cost = catalog.unit_cost.copy()
+        fallback_price = np.where(catalog.unit_cost != 0, catalog.unit_cost, DEFAULT_UNIT_PRICE)
+        self.base_price = np.where(np.isnan(catalog.contract_price), fallback_price, catalog.contract_price)
+        self.pending = pending_qty.copy()
+
+        # Dostawy w drodze: dzień przyjazdu liczony od dziś (tick t przyjmuje eta <= dziś + t dni)
+        known = (transit.product_idx >= 0) & ~np.isnat(transit.eta)
+        offset = (transit.eta[known] - to_datetime64(current_date)) / DAY
+        self.transit_idx = transit.product_idx[known]
+        self.transit_qty = transit.quantity[known]
+        self.transit_due = np.maximum(1, np.ceil(offset)).astype(np.int64)
+        self.transit_can_delay = (transit.delay_days[known] == 0) & ~transit.is_emergency[known]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_db(cls, db: Session, current_date: datetime) -> "ForkedState":
+        catalog = CatalogArrays.from_db(db)
+        transit = InTransitOrders.from_db(db, catalog)
+        return cls(catalog, transit, load_pending_quantities(db, catalog), current_date)
+
+
+def _delay_draw(rng: np.random.Generator, days_in_transit: np.ndarray) -> np.ndarray:
+    """
+    Opóźnienie transportu: codzienna szansa 15% na jednorazowy zator (+3..6 dni),
+    losowana raz przy nadaniu zamiast codziennie (rozkład geometryczny).
+    """
+    hit = rng.geometric(DELAY_PROBABILITY, size=days_in_transit.shape) <= days_in_transit
+    extra = rng.integers(DELAY_RANGE[0], DELAY_RANGE[1] + 1, size=days_in_transit.shape)
+    return np.where(hit, extra, 0)
+
+
+def simulate_replications(state: ForkedState, replications: int, horizon: int, delay_days: int,
+                          demand_spike: float, alpha: float, seed) -> dict:
+    """
+    Wektorowa symulacja wielu replikacji naraz - macierze (replikacje x produkty).
+    Model jak w DayCycleEngine: skoki popytu, zatory logistyczne, Gap Bridging i ROP.
+    Scenariusz: `delay_days` wydłuża transport standardowy, `demand_spike` (%) podnosi zużycie.
+    """
+    rng = np.random.default_rng(seed)
+    R, P = replications, len(state)
+    lead_time = state.lead_time
+    pipeline = _pipeline_length(state, horizon, delay_days)
+    rows = np.arange(R)[:, None]
+
+    stock = np.broadcast_to(state.stock, (R, P)).astype(np.int64)
+    ema = np.broadcast_to(state.ema, (R, P)).astype(np.float64)
+    # Harmonogram dostaw w układzie (dzień, replikacja, produkt) - odczyt dnia t jest ciągły w pamięci
+    arrivals = np.zeros((pipeline + 1, R, P), dtype=np.int64)
+    incoming = np.zeros((R, P), dtype=np.int64)
+
+    # Dostawy w drodze w momencie rozwidlenia
+    if len(state.transit_idx):
+        due = np.broadcast_to(state.transit_due, (R, len(state.transit_due))).copy()
+        can_delay = state.transit_can_delay
+        due[:, can_delay] += delay_days
+        due[:, can_delay] += _delay_draw(rng, due[:, can_delay])
+        due = np.minimum(due, pipeline)
+        np.add.at(arrivals, (due, rows, state.transit_idx[None, :]), state.transit_qty[None, :])
+        np.add.at(incoming, (rows, state.transit_idx[None, :]), state.transit_qty[None, :])
+
+    demand_multiplier = 1.0 + demand_spike / 100
+    total_stock = np.empty((horizon, R), dtype=np.int64)
+    any_stockout = np.empty((horizon, R), dtype=bool)
+    ever_stockout = np.zeros((R, P), dtype=bool)
+    premium = np.zeros((R, P))
+
+    for t in range(1, horizon + 1):
+        arrived = arrivals[t]
+        stock += arrived
+        incoming -= arrived
+
+        current_avg = np.maximum(ema, 1.0)
+        spike = np.ones((R, P))
+        spiked = rng.random((R, P)) > 1 - SPIKE_PROBABILITY
+        spike[spiked] = rng.uniform(*SPIKE_RANGE, size=int(spiked.sum()))
+        noise = rng.normal(current_avg, current_avg * 0.2)
+        burn = np.ceil(np.maximum(1.0, noise) * spike * demand_multiplier).astype(np.int64)
+        ema = burn * alpha + current_avg * (1 - alpha)
+
+        stock -= np.minimum(stock, burn)
+        stockout = stock == 0
+        ever_stockout |= stockout
+        total_stock[t - 1] = stock.sum(axis=1)
+        any_stockout[t - 1] = stockout.any(axis=1)
+
+        avg_burn = np.maximum(ema, 1.0)
+        days_left = stock / avg_burn
+
+        # Gap Bridging - najbliższa dostawa szukana tylko dla kandydatów
+        emergency = np.zeros((R, P), dtype=bool)
+        r_idx, p_idx = np.nonzero(days_left <= EMERGENCY_THRESHOLD_DAYS)
+        if len(r_idx):
+            # Luka jest ograniczona do 7 dni, więc wystarczy okno 8 dni do przodu
+            future = arrivals[t + 1:t + 1 + EMERGENCY_LOOKAHEAD, r_idx, p_idx] > 0
+            days_until_next = np.where(future.any(axis=0), future.argmax(axis=0) + 1, 999)
+            hit = days_until_next > 1
+            r_e, p_e = r_idx[hit], p_idx[hit]
+            gap = np.minimum(7, days_until_next[hit] - days_left[r_e, p_e] + 1)
+            qty = np.maximum(5, np.ceil(avg_burn[r_e, p_e] * gap)).astype(np.int64)
+            arrivals[t + 1, r_e, p_e] += qty
+            incoming[r_e, p_e] += qty
+            premium[r_e, p_e] += qty * state.base_price[p_e] * (EMERGENCY_PRICE_MULTIPLIER - 1)
+            emergency[r_e, p_e] = True
+
+        # Punkt zamawiania (ROP)
+        reorder_point = avg_burn * (lead_time + lead_time * ROP_BUFFER_MULTIPLIER)
+        rop = ~emergency & (stock + incoming + state.pending < reorder_point)
+        r_o, p_o = np.nonzero(rop)
+        if len(r_o):
+            lt = lead_time[p_o] + delay_days
+            qty = np.maximum(15, np.ceil(avg_burn[r_o, p_o] * (lead_time[p_o] + 10))).astype(np.int64)
+            due = np.minimum(t + lt + _delay_draw(rng, lt), pipeline)
+            # Pary (replikacja, produkt) są unikalne w obrębie dnia - zwykłe przypisanie wystarcza
+            arrivals[due, r_o, p_o] += qty
+            incoming[r_o, p_o] += qty
+
+    return {
+        "total_stock": total_stock,
+        "any_stockout": any_stockout,
+        "end_stock": stock,
+        "ever_stockout": ever_stockout,
+        "premium": premium,
+    }
+
+
+def _run_chunk(args) -> tuple:
+    """Zadanie dla procesu puli: scenariusz i linia bazowa na tych samych liczbach losowych."""
+    state, replications, horizon, delay_days, demand_spike, alpha, seed = args
+    scenario = simulate_replications(state, replications, horizon, delay_days, demand_spike, alpha, seed)
+    baseline = simulate_replications(state, replications, horizon, 0, 0.0, alpha, seed)
+    return scenario, baseline["total_stock"]
+
+
+def _bands(values: np.ndarray, axis: int = 0) -> np.ndarray:
+    return np.percentile(values, [5, 50, 95], axis=axis)
+
+
+class WhatIfEngine:
+    """
+    Silnik analiz what-if: rozwidla bieżący stan bliźniaka i uruchamia tysiące
+    replikacji Monte Carlo, rozłożonych na pulę procesów.
+    """
+
+    def __init__(self, ema_alpha: float = 0.03):
+        self.ema_alpha = ema_alpha
+
+    def run(self, state: ForkedState, delay_days: int = 0, demand_spike: float = 0.0,
+            replications: int = 1000, horizon: int = 14, seed: Optional[int] = None) -> dict:
+        started = time.perf_counter()
+        P = max(len(state), 1)
+        pipeline = _pipeline_length(state, horizon, delay_days) + 1
+
+        chunk_size = max(1, min(replications, CHUNK_CELLS // (P * pipeline)))
+        sizes = [min(chunk_size, replications - i) for i in range(0, replications, chunk_size)]
+        seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+        tasks = [(state, n, horizon, delay_days, demand_spike, self.ema_alpha, s) for n, s in zip(sizes, seeds)]
+
+        workers = 1
+        if replications * P * horizon <= INLINE_CELLS or len(tasks) == 1 or MAX_WORKERS == 1:
+            outputs = [_run_chunk(task) for task in tasks]
+        else:
+            workers = min(MAX_WORKERS, len(tasks))
+            outputs = list(_get_executor().map(_run_chunk, tasks))
+
+        scenario = {key: np.concatenate([o[0][key] for o in outputs], axis=1 if key in ("total_stock", "any_stockout") else 0)
+                    for key in outputs[0][0]}
+        baseline_total = np.concatenate([o[1] for o in outputs], axis=1)
+        result = self._summarize(state, scenario, baseline_total, replications, horizon)
+        result["summary"]["workers"] = workers
+        result["summary"]["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+
+    def _summarize(self, state: ForkedState, scenario: dict, baseline_total: np.ndarray,
+                   replications: int, horizon: int) -> dict:
+        stock_bands = _bands(scenario["total_stock"], axis=1)
+        baseline_p50 = np.percentile(baseline_total, 50, axis=1)
+        stockout_prob = scenario["any_stockout"].mean(axis=1)
+        days = [{
+            "day": f"Dzień {t + 1}",
+            "stock": round(float(stock_bands[1, t]), 1),
+            "stock_p5": round(float(stock_bands[0, t]), 1),
+            "stock_p95": round(float(stock_bands[2, t]), 1),
+            "baseline": round(float(baseline_p50[t]), 1),
+            "stockout_probability": round(float(stockout_prob[t]), 4),
+        } for t in range(horizon)]
+
+        end_bands = _bands(scenario["end_stock"])
+        premium_bands = _bands(scenario["premium"])
+        product_stockout = scenario["ever_stockout"].mean(axis=0)
+        products = [{
+            "id": int(state.ids[i]),
+            "product_name": state.names[i],
+            "stock_p5": round(float(end_bands[0, i]), 1),
+            "stock_p50": round(float(end_bands[1, i]), 1),
+            "stock_p95": round(float(end_bands[2, i]), 1),
+            "stockout_probability": round(float(product_stockout[i]), 4),
+            "emergency_premium_p5": round(float(premium_bands[0, i]), 2),
+            "emergency_premium_p50": round(float(premium_bands[1, i]), 2),
+            "emergency_premium_p95": round(float(premium_bands[2, i]), 2),
+        } for i in range(len(state))]
+        products.sort(key=lambda x: (x["stockout_probability"], x["emergency_premium_p50"]), reverse=True)
+
+        total_premium = _bands(scenario["premium"].sum(axis=1))
+        return {
+            "days": days,
+            "products": products,
+            "summary": {
+                "replications": replications,
+                "horizon_days": horizon,
+                "stockout_probability": round(float(scenario["ever_stockout"].any(axis=1).mean()), 4),
+                "emergency_premium_p5": round(float(total_premium[0]), 2),
+                "emergency_premium_p50": round(float(total_premium[1]), 2),
+                "emergency_premium_p95": round(float(total_premium[2]), 2),
+            },
+        }
+
+
+what_if_engine = WhatIfEngine()
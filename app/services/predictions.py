@@ -0,0 +1,113 @@
+import numpy as np
+from sqlalchemy import select, func, text, true
+from sqlalchemy.orm import Session
+from app import models
+from app.services.analytics_cache import data_version, VersionedCache
+
+ACTIVE_STATUSES = ("ordered", "pending_approval")
+# Do tylu wybranych produktów szczegóły doczytywane są przez IN (...), powyżej - pełnym przebiegiem
+IN_LIMIT = 1000
+
+# Predykcje zmieniają się tylko po zapisie produktów/zamówień (tick symulatora, API) - liczone raz na wersję danych
+predictions_cache = VersionedCache(data_version)
+
+
+def round1(values: np.ndarray) -> np.ndarray:
+    """round(x, 1) jak w Pythonie (połówki wg dokładnej wartości binarnej) - wektorowo, poprawka tylko dla połówek."""
+    scaled = values * 10
+    rounded = np.round(scaled) / 10
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if near_half.any():
+        rounded[near_half] = [round(v, 1) for v in values[near_half].tolist()]
+    return rounded
+
+
+def smallest_k(values: np.ndarray, k: int) -> np.ndarray:
+    """Indeksy k najmniejszych wartości rosnąco; remisy wg pozycji (jak stabilne sortowanie), bez sortowania całości."""
+    if k >= len(values):
+        return np.argsort(values, kind="stable")
+    kth = np.partition(values, k - 1)[k - 1]
+    below = np.flatnonzero(values < kth)
+    chosen = np.concatenate([below, np.flatnonzero(values == kth)[:k - len(below)]])
+    return chosen[np.lexsort((chosen, values[chosen]))]
+
+
+def _incoming(db: Session, scope) -> dict:
+    """Zamówienia w drodze per produkt: (suma ilości, najwcześniejsza dostawa, jej opóźnienie) - funkcje okna."""
+    first = func.row_number().over(
+        partition_by=models.Order.product_id,
+        order_by=(models.Order.estimated_delivery.is_(None), models.Order.estimated_delivery, text("orders.rowid")))
+    inflow = select(
+        models.Order.product_id, func.sum(models.Order.quantity).over(partition_by=models.Order.product_id),
+        models.Order.estimated_delivery, models.Order.delay_days, first.label("position"),
+    ).where(models.Order.status.in_(ACTIVE_STATUSES), scope).subquery()
+    rows = db.connection().execute(select(inflow).where(inflow.c.position == 1))
+    return {r[0]: (r[1], r[2], r[3]) for r in rows}
+
+
+def compute_predictions(db: Session, limit: int) -> list:
+    """
+    Prognoza wyczerpania zapasów: dni zapasu liczone tablicowo dla całego katalogu, wybór `limit`
+    najpilniejszych częściowym sortowaniem; nazwy i zamówienia w drodze tylko dla wybranych.
+    """
+    burn_sql = func.max(func.coalesce(models.Product.average_daily_consumption, 0.5), 0.5)
+    rows = db.connection().execute(select(
+        models.Product.id, func.coalesce(models.Product.current_stock, 0), burn_sql
+    ).order_by(models.Product.id)).all()
+    if not rows:
+        return []
+    ids, stock, burn = (np.array(column) for column in zip(*rows))
+    days_left = round1(stock.astype(float) / burn.astype(float))
+    top = smallest_k(days_left, limit)
+
+    selected = ids[top].tolist()
+    scope = models.Product.id.in_(selected) if len(selected) <= IN_LIMIT else true()
+    details = {r[0]: r for r in db.connection().execute(select(
+        models.Product.id, models.Product.name, models.Product.lead_time_days).where(scope))}
+    incoming = _incoming(db, models.Order.product_id.in_(selected) if len(selected) <= IN_LIMIT else true())
+
+    results = []
+    for i in top.tolist():
+        pid, days, burn_rate = int(ids[i]), float(days_left[i]), float(burn[i])
+        _, name, lead_time = details[pid]
+        incoming_qty, eta, eta_delay = incoming.get(pid, (0, None, 0))
+
+        # --- AKTUALIZACJA: WYCIĄGANIE DNI OPÓŹNIENIA ---
+        next_delivery = None
+        delay_days = 0
+        if eta:
+            # Najwcześniejsza nadchodząca dostawa
+            next_delivery = eta.strftime("%Y-%m-%d")
+            delay_days = eta_delay
+
+        lead_time = lead_time or 7
+
+        dynamic_safety_buffer = lead_time * 0.5
+        warning_threshold = lead_time + dynamic_safety_buffer
+        emergency_threshold = max(1.5, lead_time * 0.3)
+
+        status = "safe"
+
+        if days <= lead_time:
+            status = "critical" if incoming_qty == 0 else "incoming"
+        elif days <= warning_threshold:
+            status = "warning"
+
+        results.append({
+            "id": pid,
+            "product_name": name,
+            "current_stock": int(stock[i]),
+            "burn_rate": round(burn_rate, 2),
+            "days_left": days,
+            "status": status,
+            "restock_recommended": (days <= warning_threshold and incoming_qty == 0),
+            "incoming_stock": int(incoming_qty),
+            "next_delivery_date": next_delivery,
+            "delay_days": delay_days,  # Przesyłamy pole do frontendu
+            "ai_supplier_advice": "Tryb Express" if days <= emergency_threshold else "Optymalny koszt"
+        })
+    return results
+
+
+def get_predictions(db: Session, limit: int) -> list:
+    return predictions_cache.get_or_compute(limit, lambda: compute_predictions(db, limit))
@@ -0,0 +1,166 @@
+import os
+import re
+import json
+import base64
+import logging
+from typing import Optional
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.services.ai_search import ai_search
+
+logger = logging.getLogger(__name__)
+
+# Kandydaci z każdego źródła (BM25 i semantyka) - głębokość rankingu stronicowanego kursorem
+SEARCH_DEPTH = int(os.getenv("PRODUCT_SEARCH_DEPTH", "500"))
+# Stała Reciprocal Rank Fusion (standardowo 60) - tłumi wpływ pojedynczej wysokiej pozycji
+RRF_K = 60
+# Wagi kolumn BM25: nazwa > kategoria > opis
+BM25_WEIGHTS = (10.0, 3.0, 1.0)
+
+# Litery bez rozkładu Unicode (unicode61 nie usuwa z nich "ogonków") - składane ręcznie
+_FOLD = {"ł": "l", "Ł": "L", "ø": "o", "Ø": "O"}
+
+
+def _fold_sql(column: str) -> str:
+    expr = f"coalesce({column}, '')"
+    for src, dst in _FOLD.items():
+        expr = f"replace({expr}, '{src}', '{dst}')"
+    return expr
+
+
+def _fts_values(prefix: str) -> str:
+    return ", ".join(_fold_sql(f"{prefix}.{c}") for c in ("name", "category", "description"))
+
+
+# Tabela FTS z własną (złożoną) kopią tekstu, rowid = id produktu
+_FTS_DDL = (
+    ("table", "products_fts",
+     "CREATE VIRTUAL TABLE products_fts USING fts5(name, category, description, "
+     "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"),
+    ("trigger", "products_fts_ai",
+     "CREATE TRIGGER products_fts_ai AFTER INSERT ON products BEGIN "
+     f"INSERT INTO products_fts(rowid, name, category, description) VALUES (new.id, {_fts_values('new')}); END"),
+    ("trigger", "products_fts_ad",
+     "CREATE TRIGGER products_fts_ad AFTER DELETE ON products BEGIN "
+     "DELETE FROM products_fts WHERE rowid = old.id; END"),
+    # Tylko kolumny tekstowe - aktualizacje stanów z symulatora nie dotykają indeksu
+    ("trigger", "products_fts_au",
+     "CREATE TRIGGER products_fts_au AFTER UPDATE OF name, category, description ON products BEGIN "
+     "DELETE FROM products_fts WHERE rowid = old.id; "
+     f"INSERT INTO products_fts(rowid, name, category, description) VALUES (new.id, {_fts_values('new')}); END"),
+)
+
+_fts_available = False
+
+
+def ensure_fts(engine) -> bool:
+    """
+    Tworzy indeks FTS5 (tabela + wyzwalacze synchronizacji z `products`).
+    Gdy czegoś brakuje (np. po recreate_db.py) - odtworzenie i pełna przebudowa indeksu.
+    """
+    global _fts_available
+    if engine.dialect.name != "sqlite":
+        return False
+    try:
+        with engine.begin() as conn:
+            existing = {(r[0], r[1]) for r in conn.execute(text(
+                "SELECT type, name FROM sqlite_master WHERE name LIKE 'products_fts%'"))}
+            missing = [(kind, name, ddl) for kind, name, ddl in _FTS_DDL if (kind, name) not in existing]
+            for _, _, ddl in missing:
+                conn.execute(text(ddl))
+            if missing:
+                conn.execute(text("DELETE FROM products_fts"))
+                conn.execute(text("INSERT INTO products_fts(rowid, name, category, description) "
+                                  f"SELECT p.id, {_fts_values('p')} FROM products p"))
+                logger.info("🔎 [SEARCH] Indeks pełnotekstowy FTS5 zbudowany.")
+        _fts_available = True
+    except Exception as e:
+        logger.warning(f"⚠️ [SEARCH] FTS5 niedostępne ({e}) - wyszukiwanie przez LIKE.")
+        _fts_available = False
+    return _fts_available
+
+
+def fts_query(query: str) -> Optional[str]:
+    """Zapytanie MATCH: słowa w cudzysłowach (bez składni FTS od użytkownika), ostatnie jako prefiks."""
+    for src, dst in _FOLD.items():
+        query = query.replace(src, dst)
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"   # pole wyszukiwania działa przy każdym naciśnięciu klawisza
+    return " ".join(terms)
+
+
+def encode_cursor(score: float, product_id: int) -> str:
+    payload = json.dumps([round(score, 12), product_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        score, product_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(score), int(product_id)
+    except Exception:
+        raise ValueError("Nieprawidłowy kursor")
+
+
+def encode_id_cursor(product_id: int) -> str:
+    """Kursor listy produktów (keyset po id) - ten sam format co kursor rankingu, inny kształt."""
+    return base64.urlsafe_b64encode(json.dumps([product_id]).encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_id_cursor(cursor: str) -> int:
+    try:
+        (product_id,) = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return int(product_id)
+    except Exception:
+        raise ValueError("Nieprawidłowy kursor")
+
+
+def keyword_ranking(db: Session, query: str, category: Optional[str], depth: int) -> list:
+    """Identyfikatory produktów w kolejności BM25 (najlepsze pierwsze)."""
+    match = fts_query(query)
+    if match is None:
+        return []
+    sql = ("SELECT products_fts.rowid FROM products_fts "
+           + ("JOIN products ON products.id = products_fts.rowid " if category else "")
+           + "WHERE products_fts MATCH :match "
+           + ("AND products.category = :category " if category else "")
+           + "ORDER BY bm25(products_fts, :w_name, :w_category, :w_description) LIMIT :depth")
+    params = {"match": match, "category": category, "depth": depth,
+              "w_name": BM25_WEIGHTS[0], "w_category": BM25_WEIGHTS[1], "w_description": BM25_WEIGHTS[2]}
+    return [r[0] for r in db.execute(text(sql), params)]
+
+
+def semantic_ranking(query: str, category: Optional[str], depth: int) -> list:
+    hits = ai_search.search_scored(query, top_k=depth)
+    return [entry.id for entry, _ in hits if category is None or entry.category == category]
+
+
+def hybrid_search(db: Session, query: str, limit: int, cursor: Optional[str] = None,
+                  category: Optional[str] = None, depth: int = SEARCH_DEPTH) -> tuple:
+    """
+    Ranking hybrydowy: BM25 (FTS5) i podobieństwo wektorowe łączone przez Reciprocal Rank Fusion.
+    Zwraca (id produktów strony, kursor następnej strony lub None). Kursor to (wynik, id)
+    ostatniej pozycji - kolejna strona zaczyna się ściśle za nim, bez OFFSET.
+    """
+    keyword = keyword_ranking(db, query, category, depth) if _fts_available else []
+    semantic = semantic_ranking(query, category, depth)
+
+    fused = {}
+    for ranking in (keyword, semantic):
+        for rank, product_id in enumerate(ranking):
+            fused[product_id] = fused.get(product_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    ranked = sorted(((round(score, 12), pid) for pid, score in fused.items()), key=lambda x: (-x[0], x[1]))
+
+    if cursor:
+        after_score, after_id = decode_cursor(cursor)
+        ranked = [(s, pid) for s, pid in ranked if s < after_score or (s == after_score and pid > after_id)]
+    page = ranked[:limit]
+    next_cursor = encode_cursor(*page[-1]) if len(ranked) > limit else None
+    return [pid for _, pid in page], next_cursor
+
+
+def fts_ready() -> bool:
+    return _fts_available
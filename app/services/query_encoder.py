@@ -0,0 +1,118 @@
+import os
+import time
+import queue
+import logging
+import threading
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+# Pojemność LRU (wektor 384 x float32 = 1.5 KB - 4096 wpisów to ok. 6 MB)
+QUERY_CACHE_SIZE = int(os.getenv("AI_SEARCH_QUERY_CACHE", "4096"))
+# Okno zbierania zapytań do jednego wywołania encode i maksymalny rozmiar paczki
+BATCH_WAIT_MS = float(os.getenv("AI_SEARCH_BATCH_WAIT_MS", "3"))
+BATCH_MAX = int(os.getenv("AI_SEARCH_BATCH_MAX", "64"))
+ENCODE_TIMEOUT = 30.0
+
+
+def normalize_query(query: str) -> str:
+    # Model all-MiniLM-L6-v2 ma tokenizer bez rozróżniania wielkości liter - klucz bez zmiany wyniku
+    return " ".join(str(query).lower().split())
+
+
+class QueryEncoder:
+    """
+    Kodowanie zapytań wyszukiwarki: LRU znormalizowane zapytanie -> wektor oraz mikro-paczki.
+    Zapytania, które przyjdą w oknie BATCH_WAIT_MS, trafiają do jednego wywołania `encode`
+    (jeden przebieg modelu zamiast N); identyczne zapytania w locie czekają na ten sam wynik.
+    """
+
+    def __init__(self, encode: Callable, cache_size: int = QUERY_CACHE_SIZE,
+                 batch_wait_ms: float = BATCH_WAIT_MS, batch_max: int = BATCH_MAX):
+        self._encode = encode
+        self.cache_size = cache_size
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.batch_max = batch_max
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._worker = None
+        self.hits = 0
+        self.misses = 0
+        self.batches = 0
+        self.batched_queries = 0
+
+    def encode(self, query: str) -> np.ndarray:
+        key = normalize_query(query)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+            future = self._inflight.get(key)
+            if future is None:
+                future = self._inflight[key] = Future()
+                self._queue.put((key, future))
+                self._ensure_worker()
+        return future.result(timeout=ENCODE_TIMEOUT)
+
+    def _ensure_worker(self):
+        if self._worker is None or not self._worker.is_alive():
+            self._worker = threading.Thread(target=self._run, name="query-encoder", daemon=True)
+            self._worker.start()
+
+    def _collect(self) -> list:
+        """Pierwsze zapytanie (blokująco), potem dobieranie kolejnych do końca okna."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_max:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            keys = [key for key, _ in batch]
+            try:
+                vectors = np.asarray(self._encode(keys), dtype=np.float32).reshape(len(keys), -1)
+            except Exception as e:
+                logger.error(f"❌ [AI SEARCH] Błąd kodowania zapytań: {e}")
+                with self._lock:
+                    for key, future in batch:
+                        self._inflight.pop(key, None)
+                        future.set_exception(e)
+                continue
+            vectors.setflags(write=False)   # wektory z cache współdzielone między żądaniami
+            with self._lock:
+                self.batches += 1
+                self.batched_queries += len(batch)
+                for (key, future), vector in zip(batch, vectors):
+                    self._cache[key] = vector
+                    self._cache.move_to_end(key)
+                    self._inflight.pop(key, None)
+                    future.set_result(vector)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._cache),
+                "capacity": self.cache_size,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+                "batches": self.batches,
+                "avg_batch": round(self.batched_queries / self.batches, 2) if self.batches else None,
+            }
@@ -0,0 +1,102 @@
+import time
+import logging
+from datetime import timedelta
+from concurrent.futures import as_completed
+from typing import Optional
+from app.services.anomaly_detector import anomaly_detector
+from app.services.monte_carlo import _get_executor, MAX_WORKERS
+from app.services.simulation_engine import DayCycleEngine, ROP_BUFFER_MULTIPLIER, EMERGENCY_THRESHOLD_DAYS
+from app.services.sim_snapshot import SimulationSnapshot
+
+logger = logging.getLogger(__name__)
+
+MAX_BRANCHES = 8
+
+
+class ScenarioBranch:
+    """Nazwana gałąź scenariusza: parametry polityki zakupowej dla jednej kopii bliźniaka."""
+
+    def __init__(self, name: str, rop_multiplier: float = ROP_BUFFER_MULTIPLIER,
+                 emergency_threshold: float = EMERGENCY_THRESHOLD_DAYS):
+        self.name = name
+        self.rop_multiplier = rop_multiplier
+        self.emergency_threshold = emergency_threshold
+
+    def params(self) -> dict:
+        return {"rop_multiplier": self.rop_multiplier, "emergency_threshold": self.emergency_threshold}
+
+
+def run_branch(snapshot: SimulationSnapshot, branch: ScenarioBranch, days: int,
+               ema_alpha: float = 0.03, seed: Optional[int] = None, detector=None) -> dict:
+    """
+    Zadanie dla procesu puli: własna kopia stanu (SimulationSnapshot.fork) przewijana
+    w pamięci. Wszystkie gałęzie startują z tego samego stanu RNG, więc różnice KPI
+    wynikają z polityki, a nie z innego losowania popytu.
+    `detector` to kopia odłączona (AnomalyDetector.detached) - proces puli nie czyta bazy.
+    """
+    started = time.perf_counter()
+    state = snapshot.fork()
+    if seed is not None:
+        state.rng.seed(seed)
+    engine = DayCycleEngine(ema_alpha=ema_alpha, detector=detector, **branch.params())
+
+    series = []
+    current_date = state.current_date
+    for _ in range(days):
+        current_date += timedelta(days=1)
+        result = engine.step(state.catalog, state.schedule, state.pending_qty, current_date, rng=state.rng)
+        series.append(result.summary())
+
+    return {
+        "name": branch.name,
+        "params": branch.params(),
+        "series": series,
+        "totals": {
+            "stockouts": sum(p["stockouts"] for p in series),
+            "emergency_premium": round(sum(p["emergency_premium"] for p in series), 2),
+            "emergency_orders": sum(p["emergency_orders"] for p in series),
+            "avg_inventory_value": round(sum(p["inventory_value"] for p in series) / max(len(series), 1), 2),
+            "end_inventory_value": series[-1]["inventory_value"] if series else 0.0,
+        },
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+
+
+class ScenarioRunner:
+    """
+    Równoległe gałęzie cyfrowego bliźniaka: N nazwanych scenariuszy rozwidlonych
+    z bieżącego stanu i liczonych w puli procesów. Tabele produkcyjne pozostają nietknięte.
+    """
+
+    def __init__(self, ema_alpha: float = 0.03):
+        self.ema_alpha = ema_alpha
+
+    def iter_results(self, snapshot: SimulationSnapshot, branches: list, days: int,
+                     seed: Optional[int] = None):
+        """Wyniki gałęzi w kolejności ukończenia (do strumieniowania)."""
+        # Model i statystyki cech zamrożone raz, w procesie API - gałęzie nie dotykają tabel produkcyjnych
+        detector = anomaly_detector.detached()
+        if MAX_WORKERS == 1 or len(branches) == 1:
+            for branch in branches:
+                yield run_branch(snapshot, branch, days, self.ema_alpha, seed, detector)
+            return
+
+        executor = _get_executor()
+        futures = [executor.submit(run_branch, snapshot, branch, days, self.ema_alpha, seed, detector)
+                   for branch in branches]
+        for future in as_completed(futures):
+            yield future.result()
+
+    def run(self, snapshot: SimulationSnapshot, branches: list, days: int, seed: Optional[int] = None) -> dict:
+        started = time.perf_counter()
+        order = {branch.name: i for i, branch in enumerate(branches)}
+        results = sorted(self.iter_results(snapshot, branches, days, seed), key=lambda r: order[r["name"]])
+        logger.info(f"🔀 [SCENARIOS] {len(branches)} gałęzi x {days} dni w {time.perf_counter() - started:.2f}s")
+        return {
+            "start_date": snapshot.current_date.strftime("%Y-%m-%d"),
+            "days": days,
+            "branches": results,
+        }
+
+
+scenario_runner = ScenarioRunner()
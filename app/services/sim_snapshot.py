@@ -0,0 +1,213 @@
+import os
+import json
+import random
+import logging
+import numpy as np
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from app import models
+from app.services.simulation_engine import CatalogArrays
+from app.services.delivery_schedule import DeliverySchedule
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 3
+# Format 2 zawierał jeszcze tablice katalogu - wczytywany bez nich
+READABLE_FORMATS = (2, 3)
+SNAPSHOT_DIR = os.getenv("SIM_SNAPSHOT_DIR", os.path.join("data", "snapshots"))
+SNAPSHOT_EVERY = int(os.getenv("SIM_SNAPSHOT_EVERY", "20"))
+SNAPSHOT_KEEP = int(os.getenv("SIM_SNAPSHOT_KEEP", "5"))
+
+CATALOG_FIELDS = ("ids", "names", "stock", "ema", "lead_time", "unit_cost",
+                  "contract_price", "contract_supplier", "contract_terms")
+
+
+def orders_fingerprint(db: Session) -> str:
+    """Tani odcisk stanu tabeli orders (liczności statusów + najnowsze zamówienie)."""
+    counts = db.query(models.Order.status, func.count(models.Order.id)).group_by(models.Order.status).all()
+    newest = db.query(func.max(models.Order.created_at)).scalar()
+    parts = [f"{status}:{count}" for status, count in sorted(counts, key=lambda x: str(x[0]))]
+    return f"{newest}|{';'.join(parts)}"
+
+
+class SimulationFork:
+    """
+    Niezależna kopia stanu bliźniaka do eksperymentów "gałąź od tego punktu".
+    Działa wyłącznie w pamięci - nie dotyka tabel produkcyjnych.
+    """
+
+    def __init__(self, current_date: datetime, catalog: CatalogArrays, schedule: DeliverySchedule,
+                 pending_qty: np.ndarray, rng: random.Random):
+        self.current_date = current_date
+        self.catalog = catalog
+        self.schedule = schedule
+        self.pending_qty = pending_qty
+        self.rng = rng
+
+
+class SimulationSnapshot:
+    """
+    Binarna migawka pełnego stanu symulatora: zegar, stan RNG, harmonogram dostaw,
+    tablice produktów (stan, EMA, kontrakty), bufor zdarzeń i liczniki.
+    Zapisywana jako pojedynczy plik .npz (bez pickle).
+    Format 2: `events` to wpisy EventLog (id, kind, data).
+    Format 3: bez tablic katalogu - po restarcie stany produktów pochodzą z bazy, a katalog
+    potrzebny jest tylko gałęziom (fork) z migawki w pamięci. Liczniki do listy w `meta`.
+    """
+
+    def __init__(self, current_date: datetime, tick: int, rng_state: tuple, events: list,
+                 catalog: Optional[dict], pending_qty: Optional[np.ndarray], schedule: dict, fingerprint: str = "",
+                 created_at: Optional[datetime] = None, products: Optional[int] = None):
+        self.current_date = current_date
+        self.tick = tick
+        self.rng_state = rng_state
+        self.events = events
+        self.catalog = catalog
+        self.pending_qty = pending_qty
+        self.schedule = schedule
+        self.fingerprint = fingerprint
+        self.created_at = created_at or datetime.now()
+        self.products = len(catalog["ids"]) if catalog is not None else products
+
+    @classmethod
+    def capture(cls, current_date: datetime, tick: int, rng: random.Random, events: list,
+                catalog: CatalogArrays, pending_qty: np.ndarray, schedule: DeliverySchedule,
+                fingerprint: str = "") -> "SimulationSnapshot":
+        arrays = {field: np.array(getattr(catalog, field), dtype=str) if field == "names" else getattr(catalog, field).copy()
+                  for field in CATALOG_FIELDS}
+        return cls(current_date, tick, rng.getstate(), list(events), arrays,
+                   pending_qty.copy(), schedule.export(), fingerprint)
+
+    def fork(self) -> SimulationFork:
+        """Nowa, niezależna gałąź stanu (każde wywołanie tworzy świeże obiekty)."""
+        if self.catalog is None:
+            raise ValueError("Migawka z dysku nie zawiera katalogu produktów - gałąź tylko ze stanu w pamięci")
+        fields = {field: (self.catalog[field].tolist() if field == "names" else self.catalog[field].copy())
+                  for field in CATALOG_FIELDS}
+        catalog = CatalogArrays(**fields)
+        rng = random.Random()
+        rng.setstate(self.rng_state)
+        return SimulationFork(self.current_date, catalog, DeliverySchedule.restore(self.schedule),
+                              self.pending_qty.copy(), rng)
+
+    def info(self) -> dict:
+        return {
+            "tick": self.tick,
+            "current_date": self.current_date.strftime("%Y-%m-%d"),
+            "created_at": self.created_at.isoformat(timespec="seconds"),
+            "products": self.products,
+            "in_transit": len(self.schedule["order_id"]),
+        }
+
+    @staticmethod
+    def read_info(path: str) -> dict:
+        """Dane do listy migawek - odczyt samego członu `meta` (bez zdarzeń i tablic)."""
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("format") not in READABLE_FORMATS:
+                raise ValueError(f"Nieobsługiwany format migawki: {meta.get('format')}")
+            if "products" not in meta:
+                meta["products"] = len(data["catalog_ids"])
+                meta["in_transit"] = len(data["schedule_order_id"])
+        return {
+            "tick": meta["tick"],
+            "current_date": datetime.fromisoformat(meta["current_date"]).strftime("%Y-%m-%d"),
+            "created_at": datetime.fromisoformat(meta["created_at"]).isoformat(timespec="seconds"),
+            "products": meta["products"],
+            "in_transit": meta["in_transit"],
+        }
+
+    # --- SERIALIZACJA ---
+    def save(self, path: str):
+        """Zapis atomowy: plik tymczasowy + os.replace (awaria nie psuje poprzedniej migawki)."""
+        version, internal, gauss_next = self.rng_state
+        meta = {
+            "format": SNAPSHOT_FORMAT,
+            "current_date": self.current_date.isoformat(),
+            "created_at": self.created_at.isoformat(),
+            "tick": self.tick,
+            "fingerprint": self.fingerprint,
+            "rng_version": version,
+            "rng_gauss_next": gauss_next,
+            "products": self.products,
+            "in_transit": len(self.schedule["order_id"]),
+            "events": self.events,
+        }
+        arrays = {"meta": np.array(json.dumps(meta, ensure_ascii=False)),
+                  "rng_internal": np.array(internal, dtype=np.int64)}
+        arrays.update({f"schedule_{k}": v for k, v in self.schedule.items()})
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "SimulationSnapshot":
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("format") not in READABLE_FORMATS:
+                raise ValueError(f"Nieobsługiwany format migawki: {meta.get('format')}")
+            schedule = {k[len("schedule_"):]: data[k] for k in data.files if k.startswith("schedule_")}
+            rng_state = (meta["rng_version"], tuple(data["rng_internal"].tolist()), meta["rng_gauss_next"])
+            return cls(
+                current_date=datetime.fromisoformat(meta["current_date"]),
+                tick=meta["tick"],
+                rng_state=rng_state,
+                events=meta["events"],
+                catalog=None,
+                pending_qty=None,
+                schedule=schedule,
+                fingerprint=meta["fingerprint"],
+                created_at=datetime.fromisoformat(meta["created_at"]),
+                products=meta.get("products", len(data["catalog_ids"]) if "catalog_ids" in data.files else 0),
+            )
+
+
+class SnapshotStore:
+    """Katalog migawek: zapis co K ticków, rotacja najstarszych, odczyt najnowszej."""
+
+    def __init__(self, directory: str = SNAPSHOT_DIR, keep: int = SNAPSHOT_KEEP):
+        self.directory = directory
+        self.keep = keep
+
+    def _paths(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted(n for n in os.listdir(self.directory) if n.startswith("sim_") and n.endswith(".npz"))
+        return [os.path.join(self.directory, n) for n in names]
+
+    def save(self, snapshot: SimulationSnapshot) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = snapshot.created_at.strftime("%Y%m%d%H%M%S%f")
+        path = os.path.join(self.directory, f"sim_{stamp}_{snapshot.tick:08d}.npz")
+        snapshot.save(path)
+        self.prune()
+        return path
+
+    def prune(self):
+        """Rotacja: zostaje `keep` najnowszych, zawsze co najmniej jedna (keep <= 0 nie wyłącza rotacji)."""
+        keep = max(self.keep, 1)
+        for old in self._paths()[:-keep]:
+            os.remove(old)
+
+    def latest(self) -> Optional[SimulationSnapshot]:
+        for path in reversed(self._paths()):
+            try:
+                return SimulationSnapshot.load(path)
+            except Exception as e:
+                logger.error(f"❌ [SNAPSHOT] Uszkodzona migawka {path}: {e}")
+        return None
+
+    def list(self) -> list:
+        result = []
+        for path in reversed(self._paths()):
+            try:
+                info = SimulationSnapshot.read_info(path)
+            except Exception:
+                continue
+            info["file"] = os.path.basename(path)
+            result.append(info)
+        return result
@@ -0,0 +1,408 @@
+import random
+import uuid
+import logging
+import numpy as np
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import func, update, insert, bindparam
+from sqlalchemy.orm import Session
+from app import models
+from app.services.delivery_schedule import DeliverySchedule, DELAY_PROBABILITY, DELAY_RANGE
+from app.services.kpi_rollups import suspend_inventory, set_inventory
+
+logger = logging.getLogger(__name__)
+
+# Stałe modelu symulacji (wspólne dla wszystkich silników)
+DAY = np.timedelta64(1, "D")
+NO_DELIVERY_DAYS = 999
+EMERGENCY_THRESHOLD_DAYS = 1.2
+ROP_BUFFER_MULTIPLIER = 1.3
+EMERGENCY_PRICE_MULTIPLIER = 1.5
+# Skok popytu: dzienna szansa i zakres mnożnika (opóźnienia dostaw - delivery_schedule)
+SPIKE_PROBABILITY = 0.06
+SPIKE_RANGE = (1.8, 3.0)
+DEFAULT_LEAD_TIME = 7
+DEFAULT_SUPPLIER_ID = 1
+DEFAULT_UNIT_PRICE = 50.0
+
+
+def to_datetime64(value: Optional[datetime]) -> np.datetime64:
+    """Konwersja daty Pythona na datetime64[us] (NaT dla braku daty)."""
+    return np.datetime64(value, "us") if value is not None else np.datetime64("NaT", "us")
+
+
+def to_datetime(value: np.datetime64) -> datetime:
+    return value.astype("datetime64[us]").item()
+
+
+def _no_split(name: str):
+    pass
+
+
+class CatalogArrays:
+    """
+    Stan katalogu produktów w postaci tablic NumPy.
+    Jeden odczyt z bazy na tick zamiast zapytań per produkt.
+    """
+
+    def __init__(self, ids, names, stock, ema, lead_time, unit_cost,
+                 contract_price, contract_supplier, contract_terms):
+        self.ids = ids
+        self.names = names
+        self.stock = stock
+        self.ema = ema
+        self.lead_time = lead_time
+        self.unit_cost = unit_cost
+        # Pierwszy aktywny kontrakt produktu (NaN / -1 = brak kontraktu)
+        self.contract_price = contract_price
+        self.contract_supplier = contract_supplier
+        self.contract_terms = contract_terms
+        self.index = {pid: i for i, pid in enumerate(ids.tolist())}
+        # Stan z chwili odczytu - zapis do bazy przenosi tylko różnicę (zmiany z zewnątrz w trakcie przebiegu zostają)
+        self.loaded_stock = stock.copy()
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_db(cls, db: Session) -> "CatalogArrays":
+        rows = db.query(
+            models.Product.id, models.Product.name, models.Product.current_stock,
+            models.Product.average_daily_consumption, models.Product.lead_time_days, models.Product.unit_cost
+        ).order_by(models.Product.id).all()
+
+        n = len(rows)
+        ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+        names = [r[1] for r in rows]
+        stock = np.fromiter((r[2] or 0 for r in rows), dtype=np.int64, count=n)
+        ema = np.fromiter((r[3] or 0.0 for r in rows), dtype=np.float64, count=n)
+        lead_time = np.fromiter((r[4] or DEFAULT_LEAD_TIME for r in rows), dtype=np.int64, count=n)
+        unit_cost = np.fromiter((r[5] or 0.0 for r in rows), dtype=np.float64, count=n)
+
+        catalog = cls(ids, names, stock, ema, lead_time, unit_cost,
+                      contract_price=np.full(n, np.nan),
+                      contract_supplier=np.full(n, -1, dtype=np.int64),
+                      contract_terms=np.full(n, -1, dtype=np.int64))
+
+        # Odpowiednik `.first()` z pętli per produkt: kontrakt o najniższym id wygrywa
+        contracts = db.query(
+            models.Contract.product_id, models.Contract.supplier_id,
+            models.Contract.price, models.Contract.payment_terms_days
+        ).filter(models.Contract.is_active == True).order_by(models.Contract.id.desc()).all()
+        for product_id, supplier_id, price, terms in contracts:
+            i = catalog.index.get(product_id)
+            if i is None:
+                continue
+            catalog.contract_price[i] = price
+            catalog.contract_supplier[i] = supplier_id if supplier_id is not None else DEFAULT_SUPPLIER_ID
+            # Kontrakt bez terminu: None przy insercie ORM i tak dawał domyślne 30 z kolumny Order.payment_terms_days
+            catalog.contract_terms[i] = terms if terms is not None else 30
+
+        return catalog
+
+
+class InTransitOrders:
+    """Zamówienia w drodze (status 'ordered') jako tablice kolumnowe (rozwidlenia what-if)."""
+
+    def __init__(self, ids, product_idx, quantity, eta, delay_days, is_emergency):
+        self.ids = ids
+        self.product_idx = product_idx
+        self.quantity = quantity
+        self.eta = eta
+        self.delay_days = delay_days
+        self.is_emergency = is_emergency
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_db(cls, db: Session, catalog: CatalogArrays) -> "InTransitOrders":
+        rows = db.query(
+            models.Order.id, models.Order.product_id, models.Order.quantity,
+            models.Order.estimated_delivery, models.Order.delay_days, models.Order.order_type
+        ).filter(models.Order.status == "ordered").all()
+
+        n = len(rows)
+        return cls(
+            ids=[r[0] for r in rows],
+            product_idx=np.fromiter((catalog.index.get(r[1], -1) for r in rows), dtype=np.int64, count=n),
+            quantity=np.fromiter((r[2] or 0 for r in rows), dtype=np.int64, count=n),
+            eta=np.array([to_datetime64(r[3]) for r in rows], dtype="datetime64[us]"),
+            delay_days=np.fromiter((r[4] or 0 for r in rows), dtype=np.int64, count=n),
+            is_emergency=np.fromiter((r[5] == "EMERGENCY" for r in rows), dtype=bool, count=n),
+        )
+
+
+def load_pending_quantities(db: Session, catalog: CatalogArrays) -> np.ndarray:
+    """Suma ilości w zamówieniach czekających na akceptację (wchodzą do pozycji zapasu)."""
+    pending = np.zeros(len(catalog), dtype=np.int64)
+    rows = db.query(models.Order.product_id, func.sum(models.Order.quantity)).filter(
+        models.Order.status == "pending_approval"
+    ).group_by(models.Order.product_id).all()
+    for product_id, qty in rows:
+        i = catalog.index.get(product_id)
+        if i is not None:
+            pending[i] = qty or 0
+    return pending
+
+
+class TickResult:
+    """Wynik jednego dnia symulacji - zmiany do zapisania w bazie."""
+
+    def __init__(self, date: datetime):
+        self.date = date
+        self.delayed = []       # (order_id, delay_days, estimated_delivery)
+        self.arrived = []       # order_id
+        self.new_orders = []    # słowniki gotowe do insert(models.Order)
+        self.events = []        # (message, type) w kolejności zdarzeń
+        self.inventory_value = 0.0
+        self.consumption = 0
+        self.stockouts = 0
+        self.emergency_premium = 0.0   # dopłata za tryb EXPRESS ponad cenę bazową
+
+    def summary(self) -> dict:
+        """Punkt trajektorii (KPI dnia) dla trybu fast-forward."""
+        return {
+            "date": self.date.strftime("%Y-%m-%d"),
+            "inventory_value": round(self.inventory_value, 2),
+            "consumption": self.consumption,
+            "stockouts": self.stockouts,
+            "emergency_premium": round(self.emergency_premium, 2),
+            "deliveries": len(self.arrived),
+            "delays": len(self.delayed),
+            "orders_created": len(self.new_orders),
+            "emergency_orders": sum(1 for o in self.new_orders if o["order_type"] == "EMERGENCY"),
+            "blocked_orders": sum(1 for o in self.new_orders if o["status"] == "pending_approval"),
+        }
+
+
+class WriteBatch:
+    """
+    Zmiany z jednego lub wielu ticków scalone do jednego zapisu.
+    Zamówienia utworzone w obrębie paczki są aktualizowane w pamięci przed insertem.
+    """
+
+    def __init__(self):
+        self.delayed = {}       # order_id -> (delay_days, estimated_delivery)
+        self.arrived = []
+        self.new_orders = {}    # order_id -> słownik dla insert(models.Order)
+        self.stats = []
+
+    def add(self, result: TickResult):
+        for order_id, delay, eta in result.delayed:
+            if order_id in self.new_orders:
+                self.new_orders[order_id].update(delay_days=delay, estimated_delivery=eta)
+            else:
+                self.delayed[order_id] = (delay, eta)
+        for order_id in result.arrived:
+            if order_id in self.new_orders:
+                self.new_orders[order_id]["status"] = "delivered"
+            else:
+                self.arrived.append(order_id)
+        for order in result.new_orders:
+            self.new_orders[order["id"]] = order
+        self.stats.append({
+            "date": result.date,
+            "total_inventory_value": result.inventory_value,
+            "total_orders_count": result.consumption,
+        })
+
+
+class DayCycleEngine:
+    """
+    Wektorowy silnik cyklu dnia: zużycie, EMA, progi awaryjne i ROP liczone na tablicach.
+    Dostawy i zatory pochodzą z harmonogramu zdarzeń (DeliverySchedule), a losowania popytu
+    wykonywane są w stałej kolejności produktów - dla stałego ziarna wynik jest powtarzalny.
+    """
+
+    def __init__(self, ema_alpha: float = 0.03, detector=None,
+                 rop_multiplier: float = ROP_BUFFER_MULTIPLIER,
+                 emergency_threshold: float = EMERGENCY_THRESHOLD_DAYS):
+        self.ema_alpha = ema_alpha
+        self.detector = detector
+        # Parametry polityki zakupowej (gałęzie scenariuszy mogą je nadpisać)
+        self.rop_multiplier = rop_multiplier
+        self.emergency_threshold = emergency_threshold
+
+    def step(self, catalog: CatalogArrays, schedule: DeliverySchedule, pending_qty: np.ndarray,
+             current_date: datetime, rng=random, profiler=None) -> TickResult:
+        split = profiler.split if profiler is not None else _no_split
+        result = TickResult(current_date)
+        today = to_datetime64(current_date)
+        n = len(catalog)
+
+        # --- 1. ZATORY LOGISTYCZNE (tylko zdarzenia przypadające na dziś) ---
+        for delivery, delay in schedule.pop_delays(current_date, rng):
+            result.delayed.append((delivery.order_id, delay, delivery.eta))
+            i = catalog.index.get(delivery.product_id)
+            if i is not None:
+                result.events.append((f"⚠️ LOGISTYKA: Zator na trasie {catalog.names[i]} (+{delay} dni)!", "warning"))
+
+        split("delays")
+
+        # --- 2. ODBIÓR DOSTAW (również spóźnionych) ---
+        for delivery in schedule.pop_due(current_date):
+            i = catalog.index.get(delivery.product_id)
+            if i is None:
+                continue
+            catalog.stock[i] += delivery.quantity
+            result.arrived.append(delivery.order_id)
+            if delivery.is_emergency:
+                result.events.append((f"🩹 RATUNEK: Luka {catalog.names[i]} załatana.", "success"))
+            else:
+                result.events.append((f"🚚 Odebrano transport (JIT): {catalog.names[i]}", "truck"))
+
+        split("arrivals")
+
+        # --- 3. LOSOWANIE POPYTU (jedna pętla po losowaniach, reszta na tablicach) ---
+        current_avg = np.maximum(catalog.ema, 1.0)
+        spike = np.ones(n)
+        noise = np.empty(n)
+        for i in range(n):
+            if rng.random() > 1 - SPIKE_PROBABILITY:
+                spike[i] = rng.uniform(*SPIKE_RANGE)
+            noise[i] = rng.gauss(current_avg[i], current_avg[i] * 0.2)
+
+        raw_burn = np.maximum(1.0, noise) * spike
+        daily_burn = np.ceil(raw_burn).astype(np.int64)
+        catalog.ema = (daily_burn * self.ema_alpha) + (current_avg * (1 - self.ema_alpha))
+
+        actual_burn = np.where(catalog.stock > 0, np.minimum(catalog.stock, daily_burn), 0)
+        catalog.stock -= actual_burn
+        stockout = (catalog.stock == 0) & (daily_burn > 0)
+        result.stockouts = int(stockout.sum())
+
+        result.consumption = int(actual_burn.sum())
+        result.inventory_value = float((catalog.stock * catalog.unit_cost).sum())
+
+        split("consumption")
+
+        # --- 4. PRÓG AWARYJNY (Gap Bridging) ---
+        avg_burn = np.maximum(catalog.ema, 1.0)
+        physical_days_left = catalog.stock / avg_burn
+        lead_time = catalog.lead_time
+
+        candidates = physical_days_left <= self.emergency_threshold
+        days_until_next = np.full(n, NO_DELIVERY_DAYS, dtype=np.int64)
+        for i in np.flatnonzero(candidates).tolist():
+            next_eta = schedule.next_delivery(int(catalog.ids[i]))
+            if next_eta is not None:
+                days_until_next[i] = (next_eta - current_date).days
+
+        emergency = candidates & (days_until_next > 1)
+        gap_days = np.minimum(7, days_until_next - physical_days_left + 1)
+
+        split("emergency")
+
+        # --- 5. PUNKT ZAMAWIANIA (ROP) ---
+        incoming = np.zeros(n, dtype=np.int64)
+        for product_id, qty in schedule.incoming().items():
+            i = catalog.index.get(product_id)
+            if i is not None:
+                incoming[i] = qty
+        inventory_position = catalog.stock + incoming + pending_qty
+        reorder_point = avg_burn * (lead_time + (lead_time * self.rop_multiplier))
+        rop = ~emergency & (inventory_position < reorder_point)
+
+        # --- 6. NOWE ZAMÓWIENIA ---
+        has_contract = ~np.isnan(catalog.contract_price)
+        fallback_price = np.where(catalog.unit_cost != 0, catalog.unit_cost, DEFAULT_UNIT_PRICE)
+        base_price = np.where(has_contract, catalog.contract_price, fallback_price)
+        supplier_id = np.where(has_contract, catalog.contract_supplier, DEFAULT_SUPPLIER_ID)
+        terms = np.where(has_contract, catalog.contract_terms, 14)
+
+        gap = np.where(gap_days == 0, 5, gap_days)
+        emergency_qty = np.maximum(5, np.ceil(avg_burn * gap)).astype(np.int64)
+        rop_qty = np.maximum(15, np.ceil(avg_burn * (lead_time + 10))).astype(np.int64)
+        qty = np.where(emergency, emergency_qty, rop_qty)
+        price = np.where(emergency, base_price * EMERGENCY_PRICE_MULTIPLIER, base_price)
+        result.emergency_premium = float((qty * base_price)[emergency].sum() * (EMERGENCY_PRICE_MULTIPLIER - 1))
+        order_lt = np.where(emergency, 1, lead_time)
+
+        split("rop")
+
+        # Audyt AI jedną paczką dla wszystkich zamówień ROP z tego dnia
+        blocked = np.zeros(n, dtype=bool)
+        rop_idx = np.flatnonzero(rop)
+        if self.detector is not None and len(rop_idx):
+            rop_qty_f = qty[rop_idx].astype(float)
+            rop_price = price[rop_idx]
+            blocked[rop_idx] = self.detector.is_anomaly_batch(rop_qty_f, rop_qty_f * rop_price, rop_price,
+                                                                catalog.ids[rop_idx].tolist())
+        split("anomaly_audit")
+
+        for i in np.flatnonzero(stockout | emergency | rop).tolist():
+            name = catalog.names[i]
+            if stockout[i]:
+                result.events.append((f"POSTÓJ PRODUKCJI: Brak materiału {name}!", "error"))
+            if not (emergency[i] or rop[i]):
+                continue
+
+            q = int(qty[i])
+            unit_price = float(price[i])
+            status = "ordered"
+            if rop[i]:
+                if blocked[i]:
+                    status = "pending_approval"
+                    result.events.append((f"🚨 AI Audit: Zablokowano {name}", "warning"))
+                else:
+                    result.events.append((f"🤖 Optymalizacja JIT: {name}", "bot"))
+
+            result.new_orders.append({
+                "id": f"AUTO-{uuid.uuid4().hex[:6].upper()}",
+                "product_id": int(catalog.ids[i]),
+                "supplier_id": int(supplier_id[i]),
+                "quantity": q,
+                "total_price": q * unit_price,
+                "status": status,
+                "order_type": "EMERGENCY" if emergency[i] else "KOSZT/JIT",
+                "created_at": current_date,
+                "estimated_delivery": to_datetime(today + np.timedelta64(int(order_lt[i]), "D")),
+                "payment_terms_days": int(terms[i]),
+                "delay_days": 0,
+            })
+
+        # Stan w pamięci gotowy na kolejny tick
+        for o in result.new_orders:
+            if o["status"] == "ordered":
+                schedule.add(o["id"], o["product_id"], o["quantity"], o["estimated_delivery"],
+                             is_emergency=o["order_type"] == "EMERGENCY", start=current_date, rng=rng)
+            else:
+                pending_qty[catalog.index[o["product_id"]]] += o["quantity"]
+        split("create_orders")
+
+        return result
+
+
+_STOCK_UPDATE = update(models.Product).where(models.Product.id == bindparam("pid")).values(
+    current_stock=models.Product.current_stock + bindparam("delta"), average_daily_consumption=bindparam("ema")
+).execution_options(dml_strategy="core_only")
+
+
+def write_back(db: Session, catalog: CatalogArrays, batch: WriteBatch, feature_store=None):
+    """
+    Zapis paczki zmian: jedna aktualizacja zbiorcza produktów i zamówień, jeden insert.
+    Statystyki magazynu cech i KPI magazynu aktualizowane są w tej samej transakcji.
+    """
+    suspend_inventory(db)
+    if len(catalog):
+        # Stan przyrostowo (stock = stock + zmiana symulacji) - edycje z API w trakcie fast-forward nie giną
+        delta = catalog.stock - catalog.loaded_stock
+        db.execute(_STOCK_UPDATE, [
+            {"pid": pid, "delta": change, "ema": ema}
+            for pid, change, ema in zip(catalog.ids.tolist(), delta.tolist(), catalog.ema.tolist())
+        ])
+        catalog.loaded_stock = catalog.stock.copy()
+    set_inventory(db)
+    if batch.delayed:
+        db.execute(update(models.Order), [
+            {"id": oid, "delay_days": delay, "estimated_delivery": eta} for oid, (delay, eta) in batch.delayed.items()
+        ])
+    if batch.arrived:
+        db.execute(update(models.Order), [{"id": oid, "status": "delivered"} for oid in batch.arrived])
+    if batch.new_orders:
+        db.execute(insert(models.Order), list(batch.new_orders.values()))
+        if feature_store is not None:
+            feature_store.record(db, list(batch.new_orders.values()))
+    if batch.stats:
+        db.execute(insert(models.DailyStats), batch.stats)
@@ -1,217 +1,430 @@
-import asyncio
+import os
+import time
+import queue
 import random
-import math
 import logging
-import uuid
+import threading
+from concurrent.futures import Future
 from datetime import datetime, timedelta
+from typing import Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func, desc
+from sqlalchemy import desc
 from app import models, database
 from app.services.anomaly_detector import anomaly_detector
+from app.services.feature_store import feature_store
+from app.services.simulation_engine import (
+    DayCycleEngine, CatalogArrays, WriteBatch, load_pending_quantities, write_back
+)
+from app.services.delivery_schedule import DeliverySchedule
+from app.services.event_log import EventLog
+from app.services.tick_profiler import TickProfiler
+from app.services.sim_snapshot import SimulationSnapshot, SnapshotStore, orders_fingerprint, SNAPSHOT_EVERY
 
 logger = logging.getLogger(__name__)
 
+# Interwał ticku w sekundach (konfigurowalny zmienną środowiskową lub przez API)
+TICK_INTERVAL = float(os.getenv("SIM_TICK_INTERVAL", "1.5"))
+MIN_TICK_INTERVAL = 0.05
+
+class TickStats:
+    """Czas trwania ticków i opóźnienie względem harmonogramu (lag) wątku symulatora."""
+
+    def __init__(self):
+        self.ticks = 0
+        self.last_ms = 0.0
+        self.avg_ms = 0.0
+        self.max_ms = 0.0
+        self.lag_ms = 0.0
+
+    def record(self, duration: float, lag: float):
+        duration_ms = duration * 1000
+        self.ticks += 1
+        self.last_ms = duration_ms
+        self.avg_ms = duration_ms if self.ticks == 1 else 0.9 * self.avg_ms + 0.1 * duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.lag_ms = max(0.0, lag * 1000)
+
+    def as_dict(self) -> dict:
+        return {
+            "ticks": self.ticks,
+            "last_tick_ms": round(self.last_ms, 2),
+            "avg_tick_ms": round(self.avg_ms, 2),
+            "max_tick_ms": round(self.max_ms, 2),
+            "lag_ms": round(self.lag_ms, 2),
+        }
+
 class LogisticsSimulator:
     def __init__(self):
         self.is_running = False
         self.current_date = datetime.now()
-        self.events = []
+        # Dziennik zdarzeń i KPI z numerami sekwencyjnymi (kursor dla strumienia SSE)
+        self.event_log = EventLog()
+        self._last_inventory_value = None
         self.ema_alpha = 0.03 
+        self.engine = DayCycleEngine(ema_alpha=self.ema_alpha, detector=anomaly_detector)
+        # Własny generator symulacji - jego stan trafia do migawek
+        self.rng = random.Random()
+        self.day = 0
+        self.snapshots = SnapshotStore()
+        # Tick na żywo i fast-forward nie mogą przesuwać zegara równocześnie
+        self._tick_lock = threading.Lock()
+        # Harmonogram dostaw w drodze (odbudowywany z tabeli orders przy starcie)
+        self.schedule = None
+        # Zmiany harmonogramu z API (nowe / zaakceptowane / odrzucone zamówienia) - nakładane między krokami
+        # symulacji, więc wątki żądań nie czekają na blokadę ticku (fast-forward trzyma ją przez cały przebieg).
+        # None = brak harmonogramu: jego odbudowa i tak odczyta zamówienia z bazy
+        self._schedule_changes = None
+        self._changes_lock = threading.Lock()
+        # Wątek roboczy i kanał sterowania
+        self.tick_interval = TICK_INTERVAL
+        self.tick_stats = TickStats()
+        self.profiler = TickProfiler()
+        self._commands = queue.Queue()
+        self._worker = None
+        self._stopping = False
 
     def get_status(self):
         return {
             "current_date": self.current_date.strftime("%Y-%m-%d"),
             "is_running": self.is_running,
-            "events": self.events[:20] 
+            "events": self.event_log.recent("event", 20),
+            "last_event_id": self.event_log.last_id,
+            "worker_alive": self._worker is not None and self._worker.is_alive(),
+            "tick_interval": self.tick_interval,
+            "metrics": self.tick_stats.as_dict()
         }
 
-    def log_event(self, message, type="info"):
+    def log_event(self, message, type="info", date=None):
         icon_map = {
             "bot": "🤖", "warning": "🚨", "error": "❌", "success": "✅", 
             "info": "📦", "negotiate": "🤝", "truck": "🚚", "bandage": "🩹"
         }
-        self.events.insert(0, {
-            "id": random.randint(1000, 99999),
-            "date": self.current_date.strftime("%Y-%m-%d"),
+        self.event_log.append("event", {
+            "date": (date or self.current_date).strftime("%Y-%m-%d"),
             "message": message,
             "type": type,
             "icon": icon_map.get(type, "ℹ️")
         })
-        if len(self.events) > 50: self.events.pop()
 
-    async def run_simulation_loop(self):
-        logger.info("🚀 Cyfrowy Bliźniak (Digital Twin) uruchomiony.")
-        db = database.SessionLocal()
+    @property
+    def events(self) -> list:
+        return self.event_log.recent("event", 50)
+
+    def _publish_kpi(self, summary: dict):
+        """Punkt KPI dnia wraz ze zmianą wartości magazynu względem poprzedniego ticku."""
+        previous = self._last_inventory_value
+        self._last_inventory_value = summary["inventory_value"]
+        delta = 0.0 if previous is None else round(summary["inventory_value"] - previous, 2)
+        self.event_log.append("kpi", dict(summary, inventory_value_delta=delta))
+
+    def _publish_status(self):
+        self.event_log.append("status", {
+            "is_running": self.is_running,
+            "current_date": self.current_date.strftime("%Y-%m-%d"),
+        })
+
+    # --- WĄTEK ROBOCZY (poza pętlą zdarzeń API) ---
+    def start(self):
+        """Uruchamia bliźniaka w dedykowanym wątku z własnym połączeniem do bazy."""
+        if self._worker is not None and self._worker.is_alive():
+            return
+        self._stopping = False
+        self._worker = threading.Thread(target=self._worker_loop, name="digital-twin", daemon=True)
+        self._worker.start()
+
+    def stop(self, timeout: float = 5.0):
+        if self._worker is None:
+            return
+        self.control("shutdown")
+        self._worker.join(timeout)
+        self._worker = None
+
+    def control(self, command: str, value=None) -> Future:
+        """
+        Kanał sterowania wątkiem: komenda trafia do kolejki, wynik wraca przez Future.
+        Bez działającego wątku komenda wykonywana jest od razu.
+        """
+        future = Future()
+        if self._worker is None or not self._worker.is_alive():
+            self._resolve(future, command, value)
+        else:
+            self._commands.put((command, value, future))
+        return future
+
+    def _resolve(self, future: Future, command: str, value):
+        try:
+            future.set_result(self._handle_command(command, value))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _handle_command(self, command: str, value):
+        if command == "toggle":
+            self.is_running = not self.is_running
+            self._publish_status()
+            return self.is_running
+        if command == "run":
+            self.is_running = bool(value)
+            self._publish_status()
+            return self.is_running
+        if command == "tick_interval":
+            self.tick_interval = max(MIN_TICK_INTERVAL, float(value))
+            return self.tick_interval
+        if command == "shutdown":
+            self._stopping = True
+            return True
+        raise ValueError(f"Nieznana komenda symulatora: {command}")
+
+    def _restore_state(self, db: Session):
+        """
+        Start wątku: przywrócenie najnowszej migawki (zegar, RNG, zdarzenia, harmonogram).
+        Jeśli baza zmieniła się od zapisu migawki, harmonogram odbudowywany jest z tabeli orders.
+        """
+        try:
+            snapshot = self.snapshots.latest()
+        except Exception as e:
+            logger.error(f"❌ [SNAPSHOT] Błąd odczytu migawek: {e}")
+            snapshot = None
+        if snapshot is None:
+            self._sync_clock(db)
+            return
+
+        self.current_date = snapshot.current_date
+        self.day = snapshot.tick
+        self.rng.setstate(snapshot.rng_state)
+        self.event_log.restore(snapshot.events)
+        try:
+            self._collect_schedule_changes()
+            if snapshot.fingerprint == orders_fingerprint(db):
+                with self._tick_lock:
+                    self.schedule = DeliverySchedule.restore(snapshot.schedule)
+                logger.info(f"💾 [SNAPSHOT] Przywrócono stan z migawki: {self.current_date.strftime('%Y-%m-%d')} (tick {self.day}).")
+                return
+        except Exception as e:
+            logger.error(f"❌ [SNAPSHOT] Błąd weryfikacji migawki: {e}")
+            db.rollback()
+        logger.warning("⚠️ [SNAPSHOT] Migawka nieaktualna względem bazy - harmonogram odbudowany z tabeli orders.")
+        self._sync_clock(db, not_before=self.current_date)
+
+    def _sync_clock(self, db: Session, not_before: Optional[datetime] = None):
+        not_before = not_before or datetime.now()
         try:
             last_order = db.query(models.Order).filter(models.Order.created_at.isnot(None)).order_by(desc(models.Order.created_at)).first()
-            if last_order and last_order.created_at > datetime.now():
+            if last_order and last_order.created_at > not_before:
                 self.current_date = last_order.created_at
                 logger.info(f"⏳ Synchronizacja czasu z bazą: {self.current_date.strftime('%Y-%m-%d')}")
             else:
-                self.current_date = datetime.now()
+                self.current_date = not_before
         except Exception:
-            self.current_date = datetime.now()
+            self.current_date = not_before
+
+        try:
+            with self._tick_lock:
+                self._collect_schedule_changes()
+                self.schedule = DeliverySchedule.from_db(db, self.current_date, rng=self.rng)
+        except Exception as e:
+            logger.error(f"❌ Błąd odbudowy harmonogramu dostaw: {e}")
+            db.rollback()
+            self._drop_schedule()
+
+    def _worker_loop(self):
+        logger.info("🚀 Cyfrowy Bliźniak (Digital Twin) uruchomiony w wątku roboczym.")
+        db = database.SessionLocal()
+        try:
+            self._restore_state(db)
+            next_tick = time.monotonic() + self.tick_interval
+            while not self._stopping:
+                try:
+                    command, value, future = self._commands.get(timeout=max(0.0, next_tick - time.monotonic()))
+                    self._resolve(future, command, value)
+                    if command == "tick_interval":
+                        next_tick = time.monotonic() + self.tick_interval
+                    continue
+                except queue.Empty:
+                    pass
+
+                lag = time.monotonic() - next_tick
+                if self.is_running:
+                    self._timed_tick(db, lag)
+                # Bez nadrabiania zaległych ticków po przeciążeniu
+                next_tick = max(next_tick + self.tick_interval, time.monotonic())
         finally:
+            try:
+                self.save_snapshot(db)
+            except Exception as e:
+                logger.error(f"❌ [SNAPSHOT] Błąd zapisu migawki przy zatrzymaniu: {e}")
             db.close()
+            logger.info("🛑 Cyfrowy Bliźniak zatrzymany.")
 
-        while True:
-            if self.is_running:
-                db = database.SessionLocal()
-                try:
-                    self.run_day_cycle(db)
-                except Exception as e:
-                    logger.error(f"❌ Błąd cyklu: {e}")
-                    db.rollback()
-                finally:
-                    db.close()
-            await asyncio.sleep(1.5) # Przyspieszona pętla dla lepszej dynamiki testów
+    def _timed_tick(self, db: Session, lag: float):
+        # Fast-forward trzyma blokadę - ten tick pomijamy zamiast czekać
+        if not self._tick_lock.acquire(blocking=False):
+            return
+        started = time.perf_counter()
+        try:
+            self.run_day_cycle(db)
+        except Exception as e:
+            logger.error(f"❌ Błąd cyklu: {e}")
+            db.rollback()
+        finally:
+            self._tick_lock.release()
+        self.tick_stats.record(time.perf_counter() - started, lag)
+
+    def track_order(self, order: models.Order):
+        """Zgłoszenie zamówienia z API (utworzone / zaakceptowane) do harmonogramu dostaw."""
+        if order.status != "ordered":
+            return
+        delivery = (order.product_id, order.quantity or 0, order.estimated_delivery,
+                    order.delay_days or 0, order.order_type == "EMERGENCY")
+        self._queue_schedule_change(order.id, delivery)
+
+    def untrack_order(self, order_id: str):
+        self._queue_schedule_change(order_id, None)
+
+    def _queue_schedule_change(self, order_id: str, delivery: Optional[tuple]):
+        with self._changes_lock:
+            if self._schedule_changes is not None:
+                self._schedule_changes.append((order_id, delivery))
+
+    def _collect_schedule_changes(self):
+        """
+        Przed odczytem harmonogramu z bazy lub migawki: od tej chwili zgłoszenia z API są zbierane.
+        Wcześniejsze zamówienia są już zatwierdzone w bazie (zgłoszenie następuje po commicie).
+        """
+        with self._changes_lock:
+            self._schedule_changes = []
+
+    def _drop_schedule(self):
+        with self._changes_lock:
+            self.schedule, self._schedule_changes = None, None
+
+    def _ensure_schedule(self, db: Session):
+        """Harmonogram gotowy na kolejny krok (wywołujący trzyma blokadę ticku)."""
+        if self.schedule is None:
+            self._collect_schedule_changes()
+            self.schedule = DeliverySchedule.from_db(db, self.current_date, rng=self.rng)
+        self._apply_schedule_changes()
+
+    def _apply_schedule_changes(self):
+        with self._changes_lock:
+            changes, self._schedule_changes = self._schedule_changes or [], []
+        for order_id, delivery in changes:
+            if delivery is None:
+                self.schedule.remove(order_id)
+            else:
+                self.schedule.add(order_id, *delivery, start=self.current_date, rng=self.rng)
+
+    # --- MIGAWKI STANU ---
+    def capture(self, db: Session, catalog: Optional[CatalogArrays] = None,
+                pending_qty=None) -> SimulationSnapshot:
+        """Migawka bieżącego stanu w pamięci (wywołujący trzyma blokadę ticku)."""
+        self._ensure_schedule(db)
+        if catalog is None:
+            catalog = CatalogArrays.from_db(db)
+            pending_qty = load_pending_quantities(db, catalog)
+        return SimulationSnapshot.capture(self.current_date, self.day, self.rng, self.event_log.export(),
+                                          catalog, pending_qty, self.schedule, orders_fingerprint(db))
+
+    def save_snapshot(self, db: Session) -> SimulationSnapshot:
+        with self._tick_lock:
+            snapshot = self.capture(db)
+        self.snapshots.save(snapshot)
+        return snapshot
+
+    def fork(self, db: Session) -> SimulationSnapshot:
+        """Zamrożony stan "od tego punktu" - SimulationSnapshot.fork() tworzy niezależne gałęzie."""
+        with self._tick_lock:
+            return self.capture(db)
+
+    def _auto_snapshot(self, db: Session, catalog: CatalogArrays, pending_qty):
+        try:
+            self.snapshots.save(self.capture(db, catalog, pending_qty))
+        except Exception as e:
+            logger.error(f"❌ [SNAPSHOT] Błąd zapisu migawki: {e}")
 
     def run_day_cycle(self, db: Session):
+        profiler = self.profiler
+        profiler.begin_tick()
+        self._ensure_schedule(db)
+        start_date, rng_state = self.current_date, self.rng.getstate()
         self.current_date += timedelta(days=1)
-        
-        # Pobieramy wszystkie aktywne zamówienia w drodze
-        pending_orders = db.query(models.Order).filter(models.Order.status == "ordered").all()
-
-        for order in pending_orders:
-            # --- POPRAWKA LOGIKI LOSOWANIA: Sprawdzamy transporty bez zapisanego opóźnienia ---
-            if getattr(order, 'delay_days', 0) == 0 and getattr(order, 'order_type', '') != 'EMERGENCY':
-                # Szansa 15% na wystąpienie zatoru w dowolnym momencie trwania transportu
-                if random.random() > 0.85:
-                    delay = random.randint(3, 6) # Wyraźniejsze opóźnienie dla testów UX
-                    order.delay_days = delay 
-                    order.estimated_delivery += timedelta(days=delay)
-                    if order.product:
-                        self.log_event(f"⚠️ LOGISTYKA: Zator na trasie {order.product.name} (+{delay} dni)!", "warning")
-
-        # Odbiór dostaw (również tych spóźnionych / Ghost Deliveries)
-        arriving_orders = db.query(models.Order).filter(
-            models.Order.status == "ordered",
-            models.Order.estimated_delivery <= self.current_date
-        ).all()
-
-        for order in arriving_orders:
-            p = order.product
-            if p:
-                p.current_stock += int(order.quantity)
-                order.status = "delivered"
-                # delay_days zostawiamy w bazie dla celów analitycznych, ale towar już dotarł
-                
-                if getattr(order, 'order_type', '') == 'EMERGENCY':
-                    self.log_event(f"🩹 RATUNEK: Luka {p.name} załatana.", "success")
-                else:
-                    self.log_event(f"🚚 Odebrano transport (JIT): {p.name}", "truck")
-
-        products = db.query(models.Product).all()
-        total_stock_value = 0
-        total_consumption = 0
-        
-        for p in products:
-            demand_spike = 1.0
-            current_avg = max(p.average_daily_consumption or 0.0, 1.0)
-            
-            # Losowe skoki popytu dla realizmu (szansa 6%)
-            if random.random() > 0.94: 
-                demand_spike = random.uniform(1.8, 3.0) 
-
-            raw_burn = max(1.0, random.gauss(current_avg, current_avg * 0.2)) * demand_spike
-            daily_burn = int(math.ceil(raw_burn))
-
-            p.average_daily_consumption = (daily_burn * self.ema_alpha) + (current_avg * (1 - self.ema_alpha))
-
-            if p.current_stock > 0:
-                actual_burn = min(p.current_stock, daily_burn)
-                p.current_stock -= actual_burn
-                total_consumption += actual_burn
-            
-            if p.current_stock == 0 and daily_burn > 0:
-                self.log_event(f"POSTÓJ PRODUKCJI: Brak materiału {p.name}!", "error")
-            
-            total_stock_value += (p.current_stock * p.unit_cost)
-
-            avg_burn = max(p.average_daily_consumption or 1.0, 1.0) 
-            physical_days_left = p.current_stock / avg_burn
-            lead_time = p.lead_time_days or 7
-            
-            ordered_today = False
-
-            # --- DOPRACOWANY PRÓG AWARYJNY ---
-            if physical_days_left <= 1.2:
-                next_order = db.query(models.Order).filter(
-                    models.Order.product_id == p.id,
-                    models.Order.status == "ordered"
-                ).order_by(models.Order.estimated_delivery.asc()).first()
-
-                days_until_next = (next_order.estimated_delivery - self.current_date).days if next_order else 999
-
-                # Jeśli nic nie dojedzie w ciągu najbliższych 2 dni -> akcja ratunkowa
-                if days_until_next > 1:
-                    gap = min(7, days_until_next - physical_days_left + 1)
-                    self._create_order(db, p, inventory_position=p.current_stock, is_emergency=True, gap_days=gap)
-                    ordered_today = True
-
-            # --- AGRESYWNY BUFOR JIT (Punkt zamawiania ROP) ---
-            if not ordered_today:
-                incoming_stock = db.query(func.sum(models.Order.quantity)).filter(
-                    models.Order.product_id == p.id,
-                    models.Order.status.in_(["ordered", "pending_approval"])
-                ).scalar() or 0
-
-                inventory_position = p.current_stock + incoming_stock
-                # Bufor 1.3x lead_time dla maksymalnej stabilności niebieskiego słupka
-                reorder_point = avg_burn * (lead_time + (lead_time * 1.3))
-
-                if inventory_position < reorder_point:
-                    self._create_order(db, p, inventory_position=inventory_position, is_emergency=False)
 
         try:
-            stat_entry = models.DailyStats(
-                date=self.current_date,
-                total_inventory_value=total_stock_value,
-                total_orders_count=total_consumption
-            )
-            db.add(stat_entry)
-        except Exception: pass
-
-        db.commit()
-
-    def _create_order(self, db: Session, product, inventory_position, is_emergency=False, gap_days=None):
-        avg_burn = max(product.average_daily_consumption or 1.0, 1.0)
-        contract = db.query(models.Contract).filter(models.Contract.product_id == product.id, models.Contract.is_active == True).first()
-        supplier_id = contract.supplier_id if contract else 1
-        base_price = contract.price if contract else (product.unit_cost or 50.0)
-
-        if is_emergency:
-            qty = max(5, int(math.ceil(avg_burn * (gap_days or 5))))
-            price = base_price * 1.5 
-            lt = 1 
-            s_strategy = "EMERGENCY"
-        else:
-            qty = max(15, int(math.ceil(avg_burn * (product.lead_time_days + 10))))
-            price = base_price
-            lt = product.lead_time_days or 7
-            s_strategy = "KOSZT/JIT"
-
-        new_order = models.Order(
-            id=f"AUTO-{uuid.uuid4().hex[:6].upper()}",
-            product_id=product.id,
-            supplier_id=supplier_id,
-            quantity=qty,
-            total_price=qty * price,
-            status="ordered",
-            order_type=s_strategy, 
-            created_at=self.current_date,
-            estimated_delivery=self.current_date + timedelta(days=lt),
-            payment_terms_days=contract.payment_terms_days if contract else 14,
-            delay_days=0
-        )
-
-        if not is_emergency and anomaly_detector.is_anomaly(float(qty), float(qty * price), float(price)):
-            new_order.status = "pending_approval"
-            self.log_event(f"🚨 AI Audit: Zablokowano {product.name}", "warning")
-        else:
-            if not is_emergency:
-                self.log_event(f"🤖 Optymalizacja JIT: {product.name}", "bot")
+            # Jeden odczyt stanu na tick (zamiast zapytań per produkt)
+            catalog = CatalogArrays.from_db(db)
+            pending_qty = load_pending_quantities(db, catalog)
+            profiler.split("load_state")
+
+            result = self.engine.step(catalog, self.schedule, pending_qty, self.current_date,
+                                      rng=self.rng, profiler=profiler)
+            batch = WriteBatch()
+            batch.add(result)
+            write_back(db, catalog, batch, feature_store)
+            profiler.split("write_back")
+            db.commit()
+            profiler.split("commit")
+        except Exception:
+            # Harmonogram w pamięci mógł się rozjechać z bazą - odbudowa przy następnym ticku
+            self.current_date = start_date
+            self.rng.setstate(rng_state)
+            self._drop_schedule()
+            feature_store.invalidate()
+            profiler.abort_tick()
+            raise
+
+        for message, type in result.events:
+            self.log_event(message, type)
+        self._publish_kpi(result.summary())
+        profiler.split("publish_events")
+
+        self.day += 1
+        if self.day % SNAPSHOT_EVERY == 0:
+            self._auto_snapshot(db, catalog, pending_qty)
+            profiler.split("snapshot")
+        profiler.end_tick(self.current_date.strftime("%Y-%m-%d"), len(result.new_orders))
+
+    def fast_forward(self, db: Session, days: int) -> list:
+        """
+        Tryb headless: N cykli dnia bez pauzy na stanie w pamięci.
+        Zamówienia, DailyStats i stany magazynowe trafiają do bazy jedną transakcją na końcu;
+        zdarzenia i punkty KPI są publikowane dopiero po udanym commicie. Zwraca trajektorię KPI dzień po dniu.
+        """
+        with self._tick_lock:
+            self._ensure_schedule(db)
+            start_date, rng_state = self.current_date, self.rng.getstate()
+            catalog = CatalogArrays.from_db(db)
+            pending_qty = load_pending_quantities(db, catalog)
+
+            batch = WriteBatch()
+            trajectory = []
+            events = []
+            try:
+                for _ in range(days):
+                    self._apply_schedule_changes()
+                    self.current_date += timedelta(days=1)
+                    result = self.engine.step(catalog, self.schedule, pending_qty, self.current_date, rng=self.rng)
+                    events.append((self.current_date, result.events))
+                    batch.add(result)
+                    trajectory.append(result.summary())
+
+                write_back(db, catalog, batch, feature_store)
+                db.commit()
+            except Exception:
+                # Nic nie zostało opublikowane - przywrócenie daty i RNG daje powtarzalny ponowny przebieg
+                db.rollback()
+                self.current_date = start_date
+                self.rng.setstate(rng_state)
+                self._drop_schedule()
+                feature_store.invalidate()
+                raise
+
+            for (date, day_events), summary in zip(events, trajectory):
+                for message, type in day_events:
+                    self.log_event(message, type, date=date)
+                self._publish_kpi(summary)
+            self.day += days
+            self._auto_snapshot(db, catalog, pending_qty)
 
-        db.add(new_order)
+        logger.info(f"⏩ Fast-forward: {days} dni ({start_date.strftime('%Y-%m-%d')} → {self.current_date.strftime('%Y-%m-%d')})")
+        return trajectory
 
 simulator = LogisticsSimulator()
\ No newline at end of file
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import logging
+import threading
+import numpy as np
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+tick_logger = logging.getLogger("procurement.tick_profile")
+
+PROFILE_WINDOW = int(os.getenv("SIM_PROFILE_WINDOW", "500"))
+# Zrzut każdego ticku jako JSON do loggera "procurement.tick_profile"
+PROFILE_LOG = os.getenv("SIM_PROFILE_LOG", "0").lower() in ("1", "true", "yes")
+# Górne granice kubełków histogramu (ms)
+HISTOGRAM_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+_sql = threading.local()
+
+
+def _sql_counters():
+    if not hasattr(_sql, "statements"):
+        _sql.statements = 0
+        _sql.rows = 0
+    return _sql
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    # Liczniki per wątek - zapytania endpointów API nie mieszają się z tickiem symulatora
+    counters = _sql_counters()
+    counters.statements += 1
+    if cursor.rowcount and cursor.rowcount > 0:
+        counters.rows += cursor.rowcount
+
+
+class PhaseWindow:
+    """Okno kroczące pomiarów jednej fazy: czas, zapytania SQL, wiersze."""
+
+    def __init__(self, size: int):
+        self.ms = deque(maxlen=size)
+        self.statements = deque(maxlen=size)
+        self.rows = deque(maxlen=size)
+        self.total = 0
+
+    def add(self, ms: float, statements: int, rows: int):
+        self.ms.append(ms)
+        self.statements.append(statements)
+        self.rows.append(rows)
+        self.total += 1
+
+    def summary(self) -> dict:
+        ms = np.fromiter(self.ms, dtype=float)
+        p50, p95, p99 = np.percentile(ms, [50, 95, 99]) if len(ms) else (0.0, 0.0, 0.0)
+        counts = np.bincount(np.searchsorted(HISTOGRAM_BUCKETS_MS, ms), minlength=len(HISTOGRAM_BUCKETS_MS) + 1)
+        labels = [f"<={b}ms" for b in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.total,
+            "mean_ms": round(float(ms.mean()), 3) if len(ms) else 0.0,
+            "p50_ms": round(float(p50), 3),
+            "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3),
+            "max_ms": round(float(ms.max()), 3) if len(ms) else 0.0,
+            "sql_statements_avg": round(sum(self.statements) / max(len(self.statements), 1), 2),
+            "rows_avg": round(sum(self.rows) / max(len(self.rows), 1), 2),
+            "histogram": {label: int(c) for label, c in zip(labels, counts) if c},
+        }
+
+
+class TickProfiler:
+    """
+    Instrumentacja cyklu dnia: czas ściany, liczba zapytań SQL i dotkniętych wierszy
+    dla każdej fazy ticku, w kroczących histogramach (ostatnie PROFILE_WINDOW ticków).
+    """
+
+    def __init__(self, window: int = PROFILE_WINDOW, log_ticks: bool = PROFILE_LOG):
+        self.window = window
+        self.log_ticks = log_ticks
+        self._phases = {}
+        self._lock = threading.Lock()
+        self._current = None
+        self._tick_started = 0.0
+        self._mark = None
+        self.last_tick = None
+
+    def begin_tick(self):
+        counters = _sql_counters()
+        self._current = {}
+        self._tick_started = time.perf_counter()
+        self._mark = (self._tick_started, counters.statements, counters.rows)
+
+    def split(self, name: str):
+        """Zamyka fazę `name`: pomiar od poprzedniego znacznika (lub początku ticku)."""
+        if self._current is None:
+            return
+        counters = _sql_counters()
+        now = time.perf_counter()
+        started, statements, rows = self._mark
+        self._mark = (now, counters.statements, counters.rows)
+        self._record(name, (now - started) * 1000, counters.statements - statements, counters.rows - rows)
+
+    def _record(self, name: str, ms: float, statements: int, rows: int):
+        with self._lock:
+            window = self._phases.get(name)
+            if window is None:
+                window = self._phases[name] = PhaseWindow(self.window)
+            window.add(ms, statements, rows)
+        if self._current is not None:
+            self._current[name] = {"ms": round(ms, 3), "sql": statements, "rows": rows}
+
+    def end_tick(self, date: str, orders_created: int):
+        if self._current is None:
+            return
+        total_ms = (time.perf_counter() - self._tick_started) * 1000
+        record = {
+            "date": date,
+            "total_ms": round(total_ms, 3),
+            "sql_statements": sum(p["sql"] for p in self._current.values()),
+            "rows": sum(p["rows"] for p in self._current.values()),
+            "orders_created": orders_created,
+            "phases": self._current,
+        }
+        self._current = None
+        self._record("tick", total_ms, record["sql_statements"], record["rows"])
+        with self._lock:
+            self.last_tick = record
+        if self.log_ticks:
+            tick_logger.info(json.dumps(record, ensure_ascii=False))
+
+    def abort_tick(self):
+        self._current = None
+
+    def report(self) -> dict:
+        with self._lock:
+            phases = {name: window.summary() for name, window in self._phases.items()}
+            last_tick = self.last_tick
+        return {"window": self.window, "phases": phases, "last_tick": last_tick}
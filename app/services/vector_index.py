@@ -0,0 +1,247 @@
+import os
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# auto: dokładne przeszukiwanie poniżej ANN_MIN_SIZE, IVF powyżej; exact / ivf wymuszają typ
+INDEX_KIND = os.getenv("AI_SEARCH_INDEX", "auto")
+ANN_MIN_SIZE = int(os.getenv("AI_SEARCH_ANN_MIN_SIZE", "50000"))
+# Liczba list IVF (0 = ~sqrt(N)) i liczba przeszukiwanych list - kompromis trafność/opóźnienie
+IVF_NLIST = int(os.getenv("AI_SEARCH_IVF_NLIST", "0"))
+IVF_NPROBE = int(os.getenv("AI_SEARCH_IVF_NPROBE", "16"))
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 64       # próbek treningowych na centroid
+ASSIGN_CHUNK = 8192
+# Maksymalny rozmiar bloku macierzy podobieństw przy budowie grafu sąsiedztwa (elementy float32)
+NEIGHBOUR_BLOCK = 16_000_000
+
+
+def _inv_norms(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1)
+    return np.divide(1.0, norms, out=np.zeros(len(norms), dtype=np.float32), where=norms > 0).astype(np.float32)
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+def _row_top_k(sims: np.ndarray, k: int) -> np.ndarray:
+    """Top-k kolumn w każdym wierszu bloku, malejąco."""
+    top = np.argpartition(-sims, k - 1, axis=1)[:, :k] if k < sims.shape[1] else np.tile(np.arange(sims.shape[1]), (len(sims), 1))
+    order = np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1, kind="stable")
+    return np.take_along_axis(top, order, axis=1)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indeksy k najwyższych wyników, malejąco (argpartition + sortowanie tylko k elementów)."""
+    if k >= len(scores):
+        return np.argsort(-scores, kind="stable")
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class ExactIndex:
+    """
+    Dokładne podobieństwo kosinusowe względem całej macierzy (małe katalogi, punkt odniesienia).
+    Interfejs indeksu: build / set / remove operują na numerach wierszy macierzy serwisu,
+    search zwraca (wiersze, wyniki) - inne struktury ANN wystarczy podpiąć w create_index.
+    """
+
+    kind = "exact"
+
+    def __init__(self):
+        self._inv_norm = np.empty(0, dtype=np.float32)
+
+    def build(self, vectors: np.ndarray):
+        self._inv_norm = _inv_norms(vectors)
+
+    def _grow(self, size: int):
+        if size > len(self._inv_norm):
+            grown = np.zeros(max(size, 2 * len(self._inv_norm)), dtype=np.float32)
+            grown[:len(self._inv_norm)] = self._inv_norm
+            self._inv_norm = grown
+
+    def set(self, rows, vectors: np.ndarray):
+        """Nowe lub zmienione wiersze macierzy."""
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows):
+            self._grow(int(rows.max()) + 1)
+            self._inv_norm[rows] = _inv_norms(vectors)
+
+    def remove(self, row: int, last: int):
+        """Usunięcie wiersza `row`; wiersz `last` został przeniesiony na jego miejsce."""
+        self._inv_norm[row] = self._inv_norm[last]
+
+    def reached(self, vectors: np.ndarray, queries: np.ndarray, floor: np.ndarray) -> np.ndarray:
+        """Maska wierszy, dla których któryś z `queries` ma podobieństwo powyżej `floor` (próg per wiersz)."""
+        q = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        q = q * _inv_norms(q)[:, None]
+        hit = np.zeros(len(vectors), dtype=bool)
+        block = max(1, NEIGHBOUR_BLOCK // max(len(q), 1))
+        for start in range(0, len(vectors), block):
+            part = slice(start, min(start + block, len(vectors)))
+            sims = (vectors[part] @ q.T) * self._inv_norm[part, None]
+            hit[part] = (sims > floor[part, None]).any(axis=1)
+        return hit
+
+    def _block_neighbours(self, vectors, members: np.ndarray, candidates: np.ndarray, k: int):
+        """Sąsiedzi `members` spośród `candidates` (bez siebie samego) - blokami ograniczonymi pamięciowo."""
+        rows = np.full((len(members), k), -1, dtype=np.int64)
+        scores = np.full((len(members), k), -np.inf, dtype=np.float32)
+        kk = min(k, len(candidates))
+        if not kk:
+            return rows, scores
+        block = max(1, NEIGHBOUR_BLOCK // max(len(candidates), 1))
+        cand_vectors = vectors[candidates] * self._inv_norm[candidates, None]
+        for start in range(0, len(members), block):
+            part = members[start:start + block]
+            sims = (vectors[part] * self._inv_norm[part, None]) @ cand_vectors.T
+            sims[part[:, None] == candidates[None, :]] = -np.inf
+            top = _row_top_k(sims, kk)
+            rows[start:start + len(part), :kk] = candidates[top]
+            scores[start:start + len(part), :kk] = np.take_along_axis(sims, top, axis=1)
+        rows[~np.isfinite(scores)] = -1
+        return rows, scores
+
+    def neighbours(self, vectors: np.ndarray, k: int, rows=None):
+        """k najbliższych sąsiadów wierszy `rows` (domyślnie całego katalogu): (wiersze x k, wyniki x k), -1 = brak."""
+        everything = np.arange(len(vectors))
+        members = everything if rows is None else np.asarray(rows, dtype=np.int64)
+        return self._block_neighbours(vectors, members, everything, k)
+
+    def search(self, vectors: np.ndarray, query, top_k: int, **_):
+        if not len(vectors):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = (vectors @ _normalize(query)) * self._inv_norm[:len(vectors)]
+        top = _top_k(scores, top_k)
+        return top, scores[top]
+
+    def stats(self) -> dict:
+        return {"kind": self.kind}
+
+
+class IVFIndex(ExactIndex):
+    """
+    Odwrócony indeks plikowy (IVF): sferyczny k-means dzieli katalog na `nlist` list,
+    zapytanie przeszukuje tylko `nprobe` list o najbliższych centroidach.
+    Listy przechowują numery wierszy macierzy serwisu - wektory nie są kopiowane.
+    """
+
+    kind = "ivf"
+
+    def __init__(self, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE, seed: int = 0):
+        super().__init__()
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.seed = seed
+        self.centroids = None
+        self._lists = []          # numery wierszy w każdej liście
+        self._arrays = []         # ta sama zawartość jako np.ndarray (None = do odświeżenia)
+        self._assign = np.empty(0, dtype=np.int64)
+
+    def build(self, vectors: np.ndarray):
+        super().build(vectors)
+        n = len(vectors)
+        nlist = max(1, min(self.nlist or int(np.sqrt(n)), n))
+        rng = np.random.default_rng(self.seed)
+        sample = vectors[rng.choice(n, min(n, nlist * KMEANS_SAMPLE), replace=False)]
+        sample = sample * _inv_norms(sample)[:, None]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)]
+        for _ in range(KMEANS_ITERATIONS):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            empty = np.bincount(labels, minlength=nlist) == 0
+            # Pusta lista dostaje losową próbkę - wszystkie centroidy pozostają w użyciu
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = sums * _inv_norms(sums)[:, None]
+        self.centroids = centroids.astype(np.float32)
+
+        self._assign = np.concatenate([self._nearest(vectors[i:i + ASSIGN_CHUNK]) for i in range(0, n, ASSIGN_CHUNK)]) \
+            if n else np.empty(0, dtype=np.int64)
+        order = np.argsort(self._assign, kind="stable")
+        bounds = np.searchsorted(self._assign[order], np.arange(nlist + 1))
+        self._arrays = [order[bounds[i]:bounds[i + 1]] for i in range(nlist)]
+        self._lists = [a.tolist() for a in self._arrays]
+
+    def _nearest(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(vectors @ self.centroids.T, axis=1)
+
+    def set(self, rows, vectors: np.ndarray):
+        super().set(rows, vectors)
+        rows = np.asarray(rows, dtype=np.int64)
+        if not len(rows):
+            return
+        if len(self._assign) < len(self._inv_norm):
+            grown = np.full(len(self._inv_norm), -1, dtype=np.int64)
+            grown[:len(self._assign)] = self._assign
+            self._assign = grown
+        for row, target in zip(rows.tolist(), self._nearest(vectors).tolist()):
+            current = self._assign[row]
+            if current == target:
+                continue
+            if current >= 0:
+                self._lists[current].remove(row)
+                self._arrays[current] = None
+            self._lists[target].append(row)
+            self._arrays[target] = None
+            self._assign[row] = target
+
+    def remove(self, row: int, last: int):
+        super().remove(row, last)
+        lst = self._assign[row]
+        self._lists[lst].remove(row)
+        self._arrays[lst] = None
+        if row != last:
+            moved = self._assign[last]
+            members = self._lists[moved]
+            members[members.index(last)] = row
+            self._arrays[moved] = None
+            self._assign[row] = moved
+        self._assign[last] = -1
+
+    def _list(self, i: int) -> np.ndarray:
+        array = self._arrays[i]
+        if array is None:
+            array = self._arrays[i] = np.asarray(self._lists[i], dtype=np.int64)
+        return array
+
+    def search(self, vectors: np.ndarray, query, top_k: int, nprobe: int = None):
+        q = _normalize(query)
+        nprobe = min(nprobe or self.nprobe, len(self._lists))
+        probe = _top_k(self.centroids @ q, nprobe)
+        candidates = np.concatenate([self._list(i) for i in probe.tolist()])
+        if not len(candidates):
+            return candidates, np.empty(0, dtype=np.float32)
+        scores = (vectors[candidates] @ q) * self._inv_norm[candidates]
+        top = _top_k(scores, top_k)
+        return candidates[top], scores[top]
+
+    def neighbours(self, vectors: np.ndarray, k: int, rows=None):
+        """Sąsiedzi lista po liście: członkowie listy vs członkowie `nprobe` najbliższych list."""
+        rows = np.arange(len(vectors)) if rows is None else np.asarray(rows, dtype=np.int64)
+        out_rows = np.full((len(rows), k), -1, dtype=np.int64)
+        out_scores = np.full((len(rows), k), -np.inf, dtype=np.float32)
+        nprobe = min(self.nprobe, len(self._lists))
+        lists = self._assign[rows]
+        for i in np.unique(lists).tolist():
+            at = np.flatnonzero(lists == i)
+            probe = _top_k(self.centroids @ self.centroids[i], nprobe)
+            candidates = np.concatenate([self._list(j) for j in probe.tolist()])
+            out_rows[at], out_scores[at] = self._block_neighbours(vectors, rows[at], candidates, k)
+        return out_rows, out_scores
+
+    def stats(self) -> dict:
+        sizes = [len(l) for l in self._lists]
+        return {"kind": self.kind, "nlist": len(sizes), "nprobe": self.nprobe,
+                "max_list": max(sizes) if sizes else 0}
+
+
+def create_index(size: int, kind: str = INDEX_KIND):
+    """Wybór struktury: ANN opłaca się dopiero dla dużych katalogów."""
+    if size and (kind == "ivf" or (kind == "auto" and size >= ANN_MIN_SIZE)):
+        return IVFIndex()
+    return ExactIndex()
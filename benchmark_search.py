@@ -0,0 +1,76 @@
+"""
+Benchmark indeksu wyszukiwania semantycznego: recall@k i opóźnienia (p50/p99)
+indeksu ANN (IVF) względem dokładnego przeszukiwania, dla rosnącego katalogu.
+
+Wektory są syntetyczne (skupiska tematyczne jak w katalogu MRO) - benchmark nie wymaga
+modelu NLP ani bazy danych:
+
+    python benchmark_search.py --sizes 10000,50000,200000 --nprobe 4,8,16,32
+"""
+import time
+import argparse
+import numpy as np
+from app.services.vector_index import ExactIndex, IVFIndex
+
+
+def synthetic_catalog(size: int, dim: int, topics: int, noise: float, rng: np.random.Generator) -> np.ndarray:
+    # Produkt = mieszanka dwóch tematów + szum: skupiska nakładają się jak w prawdziwych opisach
+    centers = rng.normal(size=(topics, dim)).astype(np.float32)
+    mix = rng.uniform(0, 1, (size, 1)).astype(np.float32)
+    vectors = (mix * centers[rng.integers(0, topics, size)] + (1 - mix) * centers[rng.integers(0, topics, size)]
+               + rng.normal(scale=noise, size=(size, dim)).astype(np.float32))
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def timed_search(index, vectors, queries, k, **kwargs):
+    rows, latencies = [], []
+    for q in queries:
+        started = time.perf_counter()
+        found, _ = index.search(vectors, q, k, **kwargs)
+        latencies.append((time.perf_counter() - started) * 1000)
+        rows.append(found)
+    return rows, np.array(latencies)
+
+
+def recall(found: list, truth: list, k: int) -> float:
+    return float(np.mean([len(set(f[:k].tolist()) & set(t[:k].tolist())) / k for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,50000,200000")
+    parser.add_argument("--nprobe", default="4,8,16,32")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.8, help="szum względem tematów (większy = trudniejszy katalog)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'rozmiar':>9} {'indeks':>12} {'budowa s':>9} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        # Zapytania z tego samego rozkładu, ale spoza katalogu (nowy opis, nie kopia produktu)
+        vectors = synthetic_catalog(size + args.queries, args.dim, max(16, size // 500), args.noise, rng)
+        vectors, queries = vectors[:size], vectors[size:]
+
+        exact = ExactIndex()
+        started = time.perf_counter()
+        exact.build(vectors)
+        build_s = time.perf_counter() - started
+        truth, lat = timed_search(exact, vectors, queries, args.k)
+        print(f"{size:>9} {'exact':>12} {build_s:>9.2f} {1.0:>10.3f} {np.percentile(lat, 50):>8.2f} {np.percentile(lat, 99):>8.2f}")
+
+        ivf = IVFIndex()
+        started = time.perf_counter()
+        ivf.build(vectors)
+        build_s = time.perf_counter() - started
+        for nprobe in (int(n) for n in args.nprobe.split(",")):
+            found, lat = timed_search(ivf, vectors, queries, args.k, nprobe=nprobe)
+            label = f"ivf/{ivf.stats()['nlist']}/{nprobe}"
+            print(f"{size:>9} {label:>12} {build_s:>9.2f} {recall(found, truth, args.k):>10.3f} "
+                  f"{np.percentile(lat, 50):>8.2f} {np.percentile(lat, 99):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -47,16 +47,42 @@ function App() {
   // ==========================================
   // 2. EFEKTY I POBIERANIE DANYCH
   // ==========================================
+  // Strumień SSE zamiast odpytywania: zdarzenia i KPI przychodzą z serwera,
+  // dane aktywnej zakładki odświeżamy po każdym ticku symulacji
+  const activeTabRef = useRef(activeTab)
+  useEffect(() => { activeTabRef.current = activeTab; refreshActiveTab(true) }, [activeTab])
+
   useEffect(() => {
-    const interval = setInterval(() => {
-        fetchSimulationStatus()
-        if (activeTab === 'market') fetchProducts()
-        if (activeTab === 'orders') fetchOrders()
-        if (activeTab === 'analytics') { fetchAnalyticsDashboard(); fetchHistory(); }
-        if (activeTab === 'forecast') fetchPredictions()
-    }, 2000) 
-    return () => clearInterval(interval)
-  }, [activeTab])
+    fetchSimulationStatus()
+    const source = new EventSource(`${API_URL}/simulation/stream`)
+    source.addEventListener('event', (e) => {
+        const ev = JSON.parse(e.data)
+        setSimulationStatus(prev => ({ ...prev, events: [ev, ...prev.events].slice(0, 20) }))
+    })
+    source.addEventListener('kpi', (e) => {
+        const kpi = JSON.parse(e.data)
+        setSimulationStatus(prev => ({ ...prev, current_date: kpi.date }))
+        refreshActiveTab()
+    })
+    source.addEventListener('status', (e) => {
+        const st = JSON.parse(e.data)
+        setSimulationStatus(prev => ({ ...prev, is_running: st.is_running, current_date: st.current_date }))
+    })
+    source.addEventListener('reset', () => fetchSimulationStatus())
+    return () => source.close()
+  }, [])
+
+  const lastRefreshRef = useRef(0)
+  const refreshActiveTab = (force = false) => {
+    // Fast-forward wysyła setki punktów KPI naraz - odświeżamy najwyżej raz na sekundę
+    if (!force && Date.now() - lastRefreshRef.current < 1000) return
+    lastRefreshRef.current = Date.now()
+    const tab = activeTabRef.current
+    if (tab === 'market') fetchProducts()
+    if (tab === 'orders') fetchOrders()
+    if (tab === 'analytics') { fetchAnalyticsDashboard(); fetchHistory(); }
+    if (tab === 'forecast') fetchPredictions()
+  }
 
   useEffect(() => { if (activeTab === 'scenarios') fetchScenarios() }, [delayDays, demandSpike, activeTab])
 
@@ -70,7 +96,7 @@ function App() {
   }
   const fetchPredictions = async () => { try { const res = await axios.get(`${API_URL}/analytics/predictions`); setPredictions(res.data) } catch (e) {} }
   const fetchAnalyticsDashboard = async () => { try { const res = await axios.get(`${API_URL}/analytics/dashboard`); setAnalyticsData(res.data) } catch (e) {} }
-  const fetchScenarios = async () => { try { const res = await axios.get(`${API_URL}/analytics/what-if?delay_days=${delayDays}&demand_spike=${demandSpike}`); setScenarios(res.data) } catch (e) {} }
+  const fetchScenarios = async () => { try { const res = await axios.get(`${API_URL}/analytics/what-if?delay_days=${delayDays}&demand_spike=${demandSpike}`); setScenarios(res.data.days) } catch (e) {} }
   const fetchSimulationStatus = async () => { try { const res = await axios.get(`${API_URL}/simulation/status`); setSimulationStatus(res.data) } catch (e) {} }
 
   const handleSendMessage = async (e) => {
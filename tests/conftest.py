@@ -0,0 +1,40 @@
+import random
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app import models, database
+
+START = datetime(2026, 3, 1, 12, 0)
+
+
+@pytest.fixture
+def db_factory(tmp_path, monkeypatch):
+    """Pusta baza SQLite w pliku tymczasowym podpięta pod app.database (jak procurement.db w repo)."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'procurement.db'}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "SessionLocal", factory)
+    yield factory
+    engine.dispose()
+
+
+@pytest.fixture
+def seeded(db_factory):
+    """Kilka produktów z niskim zapasem (tick zamawia) i historia dostarczonych zamówień."""
+    rng = random.Random(7)
+    db = db_factory()
+    db.add(models.Supplier(id=1, name="Dostawca", contact_email="d@example.com"))
+    for pid in range(1, 9):
+        db.add(models.Product(id=pid, name=f"Produkt {pid}", category="Test", unit_cost=10.0 * pid,
+                              current_stock=2, average_daily_consumption=5.0, lead_time_days=3, supplier_id=1))
+    for i in range(40):
+        pid = 1 + i % 8
+        quantity = rng.randint(10, 40)
+        db.add(models.Order(id=f"HIST-{i:03d}", product_id=pid, supplier_id=1, quantity=quantity,
+                            total_price=quantity * 10.0 * pid, status="delivered", order_type="KOSZT",
+                            created_at=START - timedelta(days=40 - i), estimated_delivery=START - timedelta(days=37 - i)))
+    db.commit()
+    db.close()
+    return db_factory
@@ -0,0 +1,49 @@
+import threading
+import time
+import zlib
+import numpy as np
+from app import models
+from app.services import ai_search as ai_search_module
+from app.services.ai_search import AISearchService
+from app.services.embedding_cache import EmbeddingCache
+
+
+class FakeModel:
+    """Deterministyczne wektory z tekstu; `gate` wstrzymuje kodowanie (wolny model)."""
+
+    def __init__(self):
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def encode(self, texts, convert_to_numpy=True):
+        self.gate.wait(10)
+        vectors = np.array([[zlib.crc32(f"{t.lower()}:{i}".encode()) % 997 + 1 for i in range(16)] for t in texts],
+                           dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_product_commit_does_not_wait_for_encoding(seeded, tmp_path, monkeypatch):
+    service = AISearchService()
+    service.model = FakeModel()
+    service.embedding_cache = EmbeddingCache("fake", str(tmp_path / "embeddings"))
+    monkeypatch.setattr(ai_search_module, "ai_search", service)
+    db = seeded()
+    try:
+        service.index_products(db.query(models.Product).all())
+        service.model.gate.clear()
+
+        db.add(models.Product(id=100, name="Wiertarka udarowa", category="Narzędzia", unit_cost=250.0,
+                              current_stock=5, average_daily_consumption=1.0, lead_time_days=2, supplier_id=1))
+        started = time.perf_counter()
+        db.commit()
+        assert time.perf_counter() - started < 5
+        assert 100 not in service._rows
+
+        service.model.gate.set()
+        service.wait_for_changes()
+        assert 100 in service._rows
+        assert service.index_stats()["pending_changes"] == 0
+        assert [e.id for e in service.search("Wiertarka udarowa Narzędzia", top_k=1)] == [100]
+    finally:
+        service.model.gate.set()
+        db.close()
@@ -0,0 +1,38 @@
+import multiprocessing
+import zlib
+import numpy as np
+import pytest
+from app.services.embedding_cache import EmbeddingCache, fcntl
+
+DIM = 8
+
+
+def fake_encode(texts: list) -> np.ndarray:
+    return np.array([[zlib.crc32(f"{t}:{i}".encode()) % 1000 for i in range(DIM)] for t in texts], dtype=np.float32)
+
+
+def _worker(directory: str, prefix: str, rounds: int):
+    cache = EmbeddingCache("test-model", directory)
+    for r in range(rounds):
+        cache.embed([f"{prefix}-{r}-{i}" for i in range(5)], fake_encode, complete=False)
+
+
+@pytest.mark.skipif(fcntl is None, reason="blokady plików tylko na POSIX")
+def test_concurrent_appends_from_several_processes(tmp_path):
+    context = multiprocessing.get_context("fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+    workers = [context.Process(target=_worker, args=(str(tmp_path), prefix, 20)) for prefix in ("a", "b", "c")]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+        assert worker.exitcode == 0
+
+    texts = [f"{prefix}-{r}-{i}" for prefix in ("a", "b", "c") for r in range(20) for i in range(5)]
+    cache = EmbeddingCache("test-model", str(tmp_path))
+
+    def no_encode(texts):
+        raise AssertionError(f"brak w magazynie: {texts[:3]}")
+
+    vectors = cache.embed(texts, no_encode, complete=False)
+    np.testing.assert_array_equal(vectors, fake_encode(texts))
+    assert cache.stats()["rows"] == len(texts)
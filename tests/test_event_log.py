@@ -0,0 +1,57 @@
+import asyncio
+from app.services.event_log import EventLog
+
+
+def _ids(entries) -> list:
+    return [e["id"] for e in entries]
+
+
+def _log(count: int, maxlen: int = 1000) -> EventLog:
+    log = EventLog(maxlen)
+    for i in range(count):
+        log.append("event", {"n": i})
+    return log
+
+
+def test_resume_from_cursor():
+    log = _log(5)
+    entries, gap = log.since(3)
+    assert _ids(entries) == [4, 5] and not gap
+    assert log.since(5) == ([], False)
+
+
+def test_cursor_older_than_buffer_is_gap():
+    log = _log(10, maxlen=4)
+    entries, gap = log.since(2)
+    assert _ids(entries) == [7, 8, 9, 10] and gap
+
+
+def test_cursor_ahead_of_log_is_gap():
+    # Restart bez migawki: klient wraca z Last-Event-ID z poprzedniego uruchomienia
+    log = _log(3)
+    entries, gap = log.since(500)
+    assert gap and _ids(entries) == [1, 2, 3]
+    assert EventLog().since(500) == ([], True)
+
+
+def test_restore_continues_numbering():
+    snapshot = _log(8, maxlen=5).export()
+    log = _log(20, maxlen=5)
+    log.restore(snapshot)
+    assert log.last_id == 8
+    assert log.append("event", {}) == 9
+    assert _ids(log.since(7)[0]) == [8, 9]
+
+
+def test_wait_and_since_agree_after_restore():
+    log = EventLog()
+    log.restore(_log(3).export())
+
+    async def scenario():
+        assert not await log.wait(log.last_id, timeout=0.01)
+        log.append("event", {})
+        assert await log.wait(3, timeout=0.01)
+        return log.since(3)
+
+    entries, gap = asyncio.run(scenario())
+    assert _ids(entries) == [4] and not gap
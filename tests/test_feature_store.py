@@ -0,0 +1,68 @@
+from sqlalchemy import func
+from app import models
+from app.services import simulator as simulator_module
+from app.services.feature_store import FeatureStore
+from app.services.simulation_engine import DayCycleEngine
+from app.services.simulator import LogisticsSimulator
+from app.services.sim_snapshot import SnapshotStore
+from tests.conftest import START
+
+
+def _stats(db) -> dict:
+    return {(r.scope, r.key): r.count for r in db.query(models.OrderFeatureStat)}
+
+
+def test_first_tick_bootstraps_empty_stats_in_tick_transaction(seeded, tmp_path, monkeypatch):
+    store = FeatureStore()
+    monkeypatch.setattr(simulator_module, "feature_store", store)
+    sim = LogisticsSimulator()
+    sim.engine = DayCycleEngine(detector=None)
+    sim.snapshots = SnapshotStore(str(tmp_path / "snapshots"))
+    sim.current_date = START
+
+    db = seeded()
+    try:
+        sim.run_day_cycle(db)
+        new_orders = db.query(func.count(models.Order.id)).filter(models.Order.id.notlike("HIST-%")).scalar()
+        assert new_orders > 0
+        # Statystyki = pełna historia (40 zamówień + nowe z ticku), każde zamówienie policzone raz
+        stats = _stats(db)
+        assert stats[("supplier", 1)] == 40 + new_orders
+        assert sum(n for (scope, _), n in stats.items() if scope == "product") == 40 + new_orders
+    finally:
+        db.close()
+    assert store.ready
+
+
+def test_record_in_open_write_transaction(seeded):
+    store = FeatureStore()
+    db = seeded()
+    try:
+        db.add(models.Order(id="API-1", product_id=1, supplier_id=1, quantity=20, total_price=200.0,
+                            status="ordered", created_at=START))
+        store.record(db, [{"product_id": 1, "supplier_id": 1, "quantity": 20, "total_price": 200.0}])
+        db.commit()
+        assert _stats(db)[("product", 1)] == 6
+        # Kolejne zamówienie - przyrostowo, bez ponownego przeliczenia
+        db.add(models.Order(id="API-2", product_id=1, supplier_id=1, quantity=30, total_price=300.0,
+                            status="ordered", created_at=START))
+        store.record(db, [{"product_id": 1, "supplier_id": 1, "quantity": 30, "total_price": 300.0}])
+        db.commit()
+        assert _stats(db)[("product", 1)] == 7
+    finally:
+        db.close()
+
+
+def test_rollback_after_bootstrap_reloads(seeded):
+    store = FeatureStore()
+    db = seeded()
+    try:
+        db.add(models.Order(id="API-1", product_id=2, supplier_id=1, quantity=20, total_price=400.0,
+                            status="ordered", created_at=START))
+        store.record(db, [{"product_id": 2, "supplier_id": 1, "quantity": 20, "total_price": 400.0}])
+        db.rollback()
+        store.invalidate()
+        assert _stats(db) == {}
+        assert store.get("product", 2)["count"] == 5
+    finally:
+        db.close()
@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+from app.services.forest_eval import CompiledForest
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"max_features": 0.5},
+    {"bootstrap": True},
+    {"max_samples": 64},
+], ids=["default", "max_features", "bootstrap", "max_samples_int"])
+def test_matches_isolation_forest(params):
+    rng = np.random.default_rng(42)
+    X_train = rng.normal(size=(600, 5)) * [1, 10, 100, 0.1, 5]
+    X = np.vstack([rng.normal(size=(400, 5)) * [1, 10, 100, 0.1, 5], rng.uniform(-500, 500, size=(100, 5))])
+    model = IsolationForest(n_estimators=50, random_state=0, **params).fit(X_train)
+    compiled = CompiledForest.from_sklearn(model)
+
+    assert np.array_equal(compiled.score_samples(X), model.score_samples(X))
+    assert np.array_equal(compiled.decision_function(X), model.decision_function(X))
+    assert np.array_equal(compiled.predict(X), model.predict(X))
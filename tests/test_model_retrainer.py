@@ -0,0 +1,34 @@
+import time
+import numpy as np
+from app.services.anomaly_detector import AnomalyDetector, feature_matrix, fit_model, training_metadata
+from app.services.model_registry import ModelRegistry
+from app.services.model_retrainer import ModelRetrainer, STALE_FEATURES
+
+
+def _training_set():
+    rng = np.random.default_rng(0)
+    quantity = rng.integers(5, 50, 200)
+    return feature_matrix(quantity, quantity * rng.uniform(18, 22, 200))
+
+
+def test_model_on_old_features_is_retrained_despite_pin(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "models"))
+    X = _training_set()
+    old = dict(training_metadata(X, time.perf_counter()))
+    del old["feature_version"]
+    registry.activate(registry.save(fit_model(X), old), pinned=True)
+
+    detector = AnomalyDetector(registry)
+    assert detector.stale_features
+    retrainer = ModelRetrainer(detector)
+    assert retrainer._due(delivered=0) == STALE_FEATURES
+
+
+def test_current_model_is_not_stale(tmp_path):
+    registry = ModelRegistry(str(tmp_path / "models"))
+    X = _training_set()
+    registry.activate(registry.save(fit_model(X), training_metadata(X, time.perf_counter())))
+
+    detector = AnomalyDetector(registry)
+    assert not detector.stale_features
+    assert ModelRetrainer(detector)._due(delivered=0) is None
@@ -0,0 +1,79 @@
+import pytest
+from app import models
+from app.services import product_search
+from app.services.product_search import (
+    RRF_K, hybrid_search, decode_cursor, encode_id_cursor, decode_id_cursor, ensure_fts, keyword_ranking
+)
+
+KEYWORD = [5, 3, 9, 1, 7]
+SEMANTIC = [3, 8, 5, 2, 6, 4]
+
+
+@pytest.fixture
+def rankings(monkeypatch):
+    monkeypatch.setattr(product_search, "_fts_available", True)
+    monkeypatch.setattr(product_search, "keyword_ranking", lambda db, query, category, depth: KEYWORD[:depth])
+    monkeypatch.setattr(product_search, "semantic_ranking", lambda query, category, depth: SEMANTIC[:depth])
+
+
+def _expected() -> list:
+    fused = {}
+    for ranking in (KEYWORD, SEMANTIC):
+        for rank, pid in enumerate(ranking):
+            fused[pid] = fused.get(pid, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(fused, key=lambda pid: (-round(fused[pid], 12), pid))
+
+
+def test_rrf_prefers_products_found_by_both_rankings(rankings):
+    ids, next_cursor = hybrid_search(None, "zapytanie", limit=20)
+    assert ids == _expected()
+    assert ids[:2] == [3, 5]
+    assert next_cursor is None
+
+
+def test_cursor_pages_cover_ranking_once(rankings):
+    pages, cursor = [], None
+    while True:
+        ids, cursor = hybrid_search(None, "zapytanie", limit=3, cursor=cursor)
+        pages.append(ids)
+        if cursor is None:
+            break
+    assert [pid for page in pages for pid in page] == _expected()
+    assert all(len(page) == 3 for page in pages[:-1])
+
+
+def test_cursor_breaks_score_ties_by_id(monkeypatch):
+    # 1 i 2 na tej samej pozycji w dwóch rankingach - równy wynik RRF, kolejność po id
+    monkeypatch.setattr(product_search, "_fts_available", True)
+    monkeypatch.setattr(product_search, "keyword_ranking", lambda db, query, category, depth: [2, 1])
+    monkeypatch.setattr(product_search, "semantic_ranking", lambda query, category, depth: [1, 2])
+    first, cursor = hybrid_search(None, "zapytanie", limit=1)
+    second, last = hybrid_search(None, "zapytanie", limit=1, cursor=cursor)
+    assert (first, second, last) == ([1], [2], None)
+    assert decode_cursor(cursor)[1] == 1
+
+
+@pytest.mark.parametrize("decode", [decode_cursor, decode_id_cursor])
+def test_invalid_cursor(decode):
+    with pytest.raises(ValueError):
+        decode("nie-kursor")
+
+
+def test_id_cursor_round_trip():
+    assert decode_id_cursor(encode_id_cursor(1234)) == 1234
+
+
+def test_keyword_ranking_folds_polish_letters(seeded, monkeypatch):
+    monkeypatch.setattr(product_search, "_fts_available", False)
+    db = seeded()
+    try:
+        db.add(models.Product(id=50, name="Łożysko kulkowe", category="Części", current_stock=1, supplier_id=1))
+        db.add(models.Product(id=51, name="Śruba M8", category="Części", current_stock=1, supplier_id=1))
+        db.commit()
+        assert ensure_fts(seeded.kw["bind"])
+        # Bez ogonków i z prefiksem (ostatnie słowo)
+        assert keyword_ranking(db, "lozysko", None, 10) == [50]
+        assert keyword_ranking(db, "sru", "Części", 10) == [51]
+        assert keyword_ranking(db, "sruba", "Test", 10) == []
+    finally:
+        db.close()
@@ -0,0 +1,50 @@
+import pickle
+import time
+import numpy as np
+from app import database, models
+from app.services import anomaly_detector as detector_module
+from app.services.anomaly_detector import AnomalyDetector, fit_model, training_metadata
+from app.services.feature_store import FeatureStore
+from app.services.model_registry import ModelRegistry
+from app.services.scenarios import ScenarioBranch, run_branch
+from app.services.simulator import LogisticsSimulator
+from app.services.sim_snapshot import SnapshotStore
+from tests.conftest import START
+
+
+def test_branch_uses_detached_detector_without_database(seeded, tmp_path, monkeypatch):
+    monkeypatch.setattr(detector_module, "feature_store", FeatureStore())
+    rng = np.random.default_rng(0)
+    quantity = rng.integers(5, 50, 300)
+    X = detector_module.feature_matrix(quantity, quantity * 20.0, rng.integers(1, 9, 300), per_product=True)
+    registry = ModelRegistry(str(tmp_path / "models"))
+    detector = AnomalyDetector(registry)
+    detector.activate(registry.save(fit_model(X), training_metadata(X, time.perf_counter())))
+
+    sim = LogisticsSimulator()
+    sim.snapshots = SnapshotStore(str(tmp_path / "snapshots"))
+    sim.current_date = START
+    db = seeded()
+    try:
+        snapshot = sim.fork(db)
+        detached = pickle.loads(pickle.dumps(detector.detached()))
+        stats_rows = db.query(models.OrderFeatureStat).count()
+    finally:
+        db.close()
+
+    def no_database():
+        raise AssertionError("gałąź scenariusza sięgnęła do bazy")
+    monkeypatch.setattr(database, "SessionLocal", no_database)
+
+    result = run_branch(snapshot, ScenarioBranch("bazowy"), days=10, seed=1, detector=detached)
+    assert len(result["series"]) == 10
+    assert detached.features is not None and detached.features.get("product", 1)["count"] == 5
+
+    again = run_branch(snapshot, ScenarioBranch("bazowy"), days=10, seed=1, detector=detached)
+    assert again["totals"] == result["totals"]
+
+    db = seeded()
+    try:
+        assert db.query(models.OrderFeatureStat).count() == stats_rows
+    finally:
+        db.close()
@@ -0,0 +1,68 @@
+import os
+from datetime import timedelta
+import pytest
+from app.services.simulator import LogisticsSimulator
+from app.services.sim_snapshot import SimulationSnapshot, SnapshotStore
+from tests.conftest import START
+
+
+@pytest.fixture
+def snapshot(seeded):
+    sim = LogisticsSimulator()
+    sim.current_date = START
+    sim.rng.seed(3)
+    sim.log_event("Start", "info")
+    db = seeded()
+    try:
+        return sim.fork(db)
+    finally:
+        db.close()
+
+
+def _save_series(store: SnapshotStore, snapshot: SimulationSnapshot, count: int):
+    for i in range(count):
+        snapshot.created_at = START + timedelta(seconds=i)
+        snapshot.tick = i
+        store.save(snapshot)
+
+
+@pytest.mark.parametrize("keep, expected", [(2, 2), (1, 1), (0, 1), (-3, 1)])
+def test_prune_keeps_newest(snapshot, tmp_path, keep, expected):
+    store = SnapshotStore(str(tmp_path / "snapshots"), keep=keep)
+    _save_series(store, snapshot, 4)
+    files = sorted(os.listdir(store.directory))
+    assert len(files) == expected
+    assert files[-1].endswith(f"_{3:08d}.npz")
+
+
+def test_restore_round_trip_without_catalog(snapshot, tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    store.save(snapshot)
+    restored = store.latest()
+    assert restored.current_date == snapshot.current_date
+    assert restored.rng_state == snapshot.rng_state
+    assert restored.events == snapshot.events
+    assert restored.schedule.keys() == snapshot.schedule.keys()
+    # Stany produktów po restarcie pochodzą z bazy - plik nie niesie katalogu
+    assert restored.catalog is None
+    with pytest.raises(ValueError):
+        restored.fork()
+
+    [info] = store.list()
+    assert info == dict(snapshot.info(), file=info["file"])
+    assert info["products"] == 8
+
+
+def test_restored_state_continues_simulator(snapshot, seeded, tmp_path):
+    store = SnapshotStore(str(tmp_path / "snapshots"))
+    store.save(snapshot)
+    sim = LogisticsSimulator()
+    sim.snapshots = store
+    db = seeded()
+    try:
+        sim._restore_state(db)
+    finally:
+        db.close()
+    assert sim.current_date == START
+    assert sim.rng.getstate() == snapshot.rng_state
+    assert sim.event_log.last_id == len(snapshot.events)
@@ -0,0 +1,149 @@
+import threading
+import pytest
+from sqlalchemy import func
+from app import models
+from app.services import kpi_rollups
+from app.services import simulator as simulator_module
+from app.services import simulation_engine
+from app.services.feature_store import FeatureStore
+from app.services.simulation_engine import DayCycleEngine
+from app.services.simulator import LogisticsSimulator
+from app.services.sim_snapshot import SnapshotStore
+from tests.conftest import START
+
+
+@pytest.fixture
+def sim(seeded, tmp_path, monkeypatch):
+    monkeypatch.setattr(simulator_module, "feature_store", FeatureStore())
+    monkeypatch.setattr(kpi_rollups, "_available", False)
+    kpi_rollups.ensure_rollups(seeded.kw["bind"])
+    sim = LogisticsSimulator()
+    sim.engine = DayCycleEngine(detector=None)
+    sim.snapshots = SnapshotStore(str(tmp_path / "snapshots"))
+    sim.current_date = START
+    sim.rng.seed(11)
+    return sim
+
+
+def _state(db) -> dict:
+    orders = db.query(func.count(models.Order.id)).scalar()
+    stock = dict(db.query(models.Product.id, models.Product.current_stock))
+    return {"orders": orders, "stock": stock}
+
+
+def test_fast_forward_failure_publishes_nothing_and_reruns_identically(sim, seeded, monkeypatch):
+    rng_state = sim.rng.getstate()
+    last_id = sim.event_log.last_id
+    attempted = []
+    step = sim.engine.step
+
+    def recording_step(*args, **kwargs):
+        result = step(*args, **kwargs)
+        attempted.append(result.summary())
+        return result
+
+    def failing_write_back(*args, **kwargs):
+        raise RuntimeError("zapis przerwany")
+
+    monkeypatch.setattr(sim.engine, "step", recording_step)
+    monkeypatch.setattr(simulator_module, "write_back", failing_write_back)
+    db = seeded()
+    try:
+        before = _state(db)
+        with pytest.raises(RuntimeError):
+            sim.fast_forward(db, 5)
+        # Ani zdarzeń, ani KPI z nieutrwalonych dni; data i RNG jak przed przebiegiem
+        assert sim.event_log.last_id == last_id
+        assert sim.current_date == START
+        assert sim.rng.getstate() == rng_state
+        assert _state(db) == before
+
+        monkeypatch.setattr(simulator_module, "write_back", simulation_engine.write_back)
+        retried = sim.fast_forward(db, 5)
+        assert retried == attempted[:5]
+        assert sim.event_log.last_id > last_id
+        assert _state(db)["orders"] > before["orders"]
+    finally:
+        db.close()
+
+
+def test_fast_forward_keeps_concurrent_stock_edit(sim, seeded, monkeypatch):
+    step = sim.engine.step
+    edited = []
+
+    def step_with_edit(*args, **kwargs):
+        result = step(*args, **kwargs)
+        if not edited:
+            # Edycja stanu przez API (osobna sesja) w trakcie fast-forward
+            other = seeded()
+            other.query(models.Product).filter(models.Product.id == 1).update(
+                {models.Product.current_stock: models.Product.current_stock + 100})
+            other.commit()
+            other.close()
+            edited.append(True)
+        return result
+
+    monkeypatch.setattr(sim.engine, "step", step_with_edit)
+    loaded = []
+    from_db = simulation_engine.CatalogArrays.from_db
+    monkeypatch.setattr(simulator_module.CatalogArrays, "from_db",
+                        staticmethod(lambda db: loaded.append(from_db(db)) or loaded[-1]))
+    db = seeded()
+    try:
+        sim.fast_forward(db, 3)
+        catalog = loaded[0]
+        simulated = int(catalog.stock[catalog.index[1]])
+        assert db.get(models.Product, 1).current_stock == simulated + 100
+        # KPI magazynu przeliczone z tabeli - obejmują też edycję z API
+        totals = kpi_rollups.read_totals(db)
+        value = db.query(func.sum(models.Product.current_stock * models.Product.unit_cost)).scalar()
+        assert totals.total("inventory", "value") == pytest.approx(value)
+        assert totals.count("inventory", "bulk") == 0
+    finally:
+        db.close()
+
+
+def test_track_order_does_not_wait_for_fast_forward(sim, seeded, monkeypatch):
+    step = sim.engine.step
+    in_step, release = threading.Event(), threading.Event()
+
+    def slow_step(*args, **kwargs):
+        in_step.set()
+        release.wait(5)
+        return step(*args, **kwargs)
+
+    monkeypatch.setattr(sim.engine, "step", slow_step)
+    db = seeded()
+    worker = threading.Thread(target=sim.fast_forward, args=(db, 1))
+    worker.start()
+    try:
+        assert in_step.wait(5)
+        order = models.Order(id="API-1", product_id=1, supplier_id=1, quantity=10, status="ordered",
+                             estimated_delivery=START)
+        tracker = threading.Thread(target=sim.track_order, args=(order,))
+        tracker.start()
+        tracker.join(1)
+        assert not tracker.is_alive()
+    finally:
+        release.set()
+        worker.join(10)
+        db.close()
+
+
+def test_order_payment_terms_follow_contract(sim, seeded):
+    db = seeded()
+    try:
+        db.add(models.Contract(id=1, product_id=1, supplier_id=1, price=9.0, payment_terms_days=None))
+        db.add(models.Contract(id=2, product_id=2, supplier_id=1, price=19.0, payment_terms_days=45))
+        db.flush()
+        db.query(models.Contract).filter(models.Contract.id == 1).update({models.Contract.payment_terms_days: None})
+        db.commit()
+        sim.run_day_cycle(db)
+        terms = dict(db.query(models.Order.product_id, models.Order.payment_terms_days)
+                     .filter(models.Order.id.notlike("HIST-%")))
+    finally:
+        db.close()
+    # Kontrakt bez terminu - domyślne 30 dni z kolumny (jak insert ORM z None), bez kontraktu - 14 dni
+    assert terms[1] == 30
+    assert terms[2] == 45
+    assert terms[3] == 14